@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Benchmark: discord_bot.py end to end, offline.
+
+The unmodified bot runs against bench/discord_stub.py (via bench/run_bot.py)
+and a fake container (bench/fakes/pct) with a fake server process, while
+bench/fake_server.py appends traffic to its server_output.log. Phases:
+
+  idle      the bot's own background cost: processes, API calls, RSS
+  steady    log traffic at --rate lines/s: log-write-to-Discord latency
+  flood     --flood-lines as fast as possible: events delivered per second
+  status    --status-runs sequential `!status` commands: command latency
+
+Each phase reports the bot's RSS (with its children) before and after,
+processes created, fake pct/tmux calls and Discord API requests. Latencies
+are wall clock: the log write, the stub receiving the message.
+
+Usage: bench/bench_bot.py [--rate N] [--seconds S] [--flood-lines N] [--status-runs N]
+                          [--log server_output.log] [--api-latency-ms MS] [--perf] [--output FILE]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+import urllib.request
+
+import benchlib
+import discord_stub
+import fake_server
+from benchlib import log
+
+CT_ID = "105"
+READY_TIMEOUT = 60
+DRAIN_SECONDS = 15 # How long to wait for the bot to catch up after a phase
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def scrape(port, metric):
+    """Sum of `metric` over all series on the bot's /metrics endpoint, or None."""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as resp:
+            text = resp.read().decode()
+    except OSError:
+        return None
+    values = [float(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+              if line.startswith(metric) and not line.startswith("#")]
+    return sum(values) if values else None
+
+
+class Bot:
+    def __init__(self, sandbox, stub, args):
+        self.sandbox = sandbox
+        self.stub = stub
+        self.metrics_port = free_port()
+        self.proc = None
+        self.state_dir = os.path.join(sandbox.root, "state")
+        self.registry = os.path.join(sandbox.root, "servers.json")
+        with open(self.registry, 'w') as f:
+            json.dump([{'name': "bench", 'ct_id': CT_ID, 'channel': discord_stub.LOG_CHANNEL_ID,
+                        'state': self.state_dir}], f)
+        self.env = sandbox.env(
+            DISCORD_BOT_TOKEN="bench", DISCORD_USER_ID=discord_stub.ADMIN_USER_ID,
+            BOT_SERVERS_FILE=self.registry, BENCH_DISCORD_URL=stub.base_url,
+            PUBLIC_IP_URL=f"{stub.base_url}/ip", METRICS_PORT=self.metrics_port, BOT_PERF="1" if args.perf else "0",
+            DISCORD_WEBHOOK_URL=benchlib.webhook_url(stub),
+            TERRARIA_NOTIFY_SOCKET=os.path.join(sandbox.root, "notify.sock"))
+
+    async def start(self):
+        self.output = open(os.path.join(self.sandbox.root, "bot.log"), 'wb')
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(benchlib.BENCH_DIR, "run_bot.py"),
+            env=self.env, stdout=self.output, stderr=self.output)
+        ready = asyncio.ensure_future(self.stub.ready.wait())
+        exited = asyncio.ensure_future(self.proc.wait())
+        await asyncio.wait([ready, exited], timeout=READY_TIMEOUT, return_when=asyncio.FIRST_COMPLETED)
+        exited.cancel()
+        if not ready.done():
+            ready.cancel()
+            raise SystemExit(f"the bot did not log in to the stub (see {self.output.name})")
+
+    def rss_kb(self):
+        """RSS of the bot plus its children (exec channels, console writer)."""
+        pids = [self.proc.pid] + benchlib.descendants(self.proc.pid)
+        return sum(benchlib.rss_kb(pid) or 0 for pid in pids)
+
+    async def stop(self):
+        if self.proc is None:
+            return
+        children = benchlib.descendants(self.proc.pid)
+        if self.proc.returncode is None:
+            self.proc.terminate()
+            try:
+                await asyncio.wait_for(self.proc.wait(), 15)
+            except asyncio.TimeoutError:
+                self.proc.kill()
+                await self.proc.wait()
+        for pid in children:
+            try:
+                os.kill(pid, 15)
+            except OSError:
+                pass
+        self.output.close()
+
+
+class Phase:
+    """Counters around one benchmark phase."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    def __enter__(self):
+        stub = self.bot.stub
+        self.bot.sandbox.calls()
+        self.requests = dict(stub.requests)
+        self.messages = len(stub.sent)
+        self.rss = self.bot.rss_kb()
+        self.pid = benchlib.last_pid()
+        self.lines = scrape(self.bot.metrics_port, "terraria_log_lines_total")
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.started
+        return False
+
+    def report(self, **extra):
+        stub = self.bot.stub
+        requests = {key: count - self.requests.get(key, 0) for key, count in stub.requests.items()
+                    if count != self.requests.get(key, 0)}
+        rss = self.bot.rss_kb()
+        lines = scrape(self.bot.metrics_port, "terraria_log_lines_total")
+        result = {
+            'seconds': round(self.seconds, 2),
+            'rss_kb_before': self.rss,
+            'rss_kb_after': rss,
+            'rss_kb_growth': rss - self.rss,
+            'processes_created': benchlib.pids_created(self.pid, benchlib.last_pid()),
+            'calls': self.bot.sandbox.calls(),
+            'discord_requests': dict(sorted(requests.items())),
+            'discord_messages': len(stub.sent) - self.messages,
+        }
+        if lines is not None and self.lines is not None:
+            result['log_lines_processed'] = int(lines - self.lines)
+        result.update(extra)
+        return result
+
+
+def read_record(path):
+    written = {}
+    with open(path) as f:
+        for line in f:
+            seq, at = line.split()
+            written[int(seq)] = float(at)
+    return written
+
+
+async def drain(stub, seqs, timeout=DRAIN_SECONDS):
+    """Waits until every tag in `seqs` reached the stub (or `timeout`)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not all(seq in stub.tag_times for seq in seqs):
+        await asyncio.sleep(0.1)
+
+
+async def replay_phase(bot, server_dir, source, rate, lines=None, seconds=None, name="replay"):
+    stub = bot.stub
+    record = os.path.join(bot.sandbox.root, f"{name}.tags")
+    stub.tag_times.clear()
+    with Phase(bot) as phase:
+        written, tagged, took = await asyncio.to_thread(fake_server.replay, server_dir, source, rate,
+                                                        lines, seconds, record)
+        sent = read_record(record)
+        await drain(stub, sent)
+    arrived = {seq: stub.tag_times[seq] for seq in sent if seq in stub.tag_times}
+    latencies = [arrived[seq] - sent[seq] for seq in arrived]
+    span = (max(arrived.values()) - min(sent.values())) if arrived else 0
+    return phase.report(
+        lines_written=written,
+        write_seconds=round(took, 2),
+        events_written=tagged,
+        events_delivered=len(arrived),
+        events_per_second=round(len(arrived) / span, 1) if span > 0 else None,
+        log_to_discord=benchlib.latency_stats(latencies),
+    )
+
+
+async def status_phase(bot, runs):
+    stub = bot.stub
+    latencies, failures = [], 0
+    with Phase(bot) as phase:
+        for _ in range(runs):
+            reply = stub.next_message(discord_stub.COMMAND_CHANNEL_ID)
+            sent_at = await stub.send_command("!status")
+            try:
+                message = await asyncio.wait_for(reply, 30)
+                latencies.append(message.at - sent_at)
+            except asyncio.TimeoutError:
+                failures += 1
+    return phase.report(timeouts=failures, status=benchlib.latency_stats(latencies))
+
+
+async def run(args):
+    benchlib.check_environment()
+    sandbox = benchlib.Sandbox(args.keep)
+    sandbox.container(CT_ID)
+    server_dir = sandbox.server_dir(CT_ID)
+    stub = await discord_stub.DiscordStub(api_latency=args.api_latency_ms / 1000).start()
+    env = sandbox.env()
+    server = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(benchlib.BENCH_DIR, "fake_server.py"), 'serve', server_dir, env=env)
+    bot = Bot(sandbox, stub, args)
+    results = {'rate': args.rate, 'api_latency_ms': args.api_latency_ms, 'source': args.log or "synthetic"}
+    try:
+        log("starting the bot")
+        started = time.perf_counter()
+        await bot.start()
+        results['startup_seconds'] = round(time.perf_counter() - started, 2)
+        await asyncio.sleep(args.settle) # Initial status refresh, dashboard, log follower catching up
+        results['rss_kb_start'] = bot.rss_kb()
+
+        log(f"idle: {args.idle}s")
+        with Phase(bot) as phase:
+            await asyncio.sleep(args.idle)
+        results['idle'] = phase.report()
+
+        source = fake_server.recorded_lines(args.log) if args.log else fake_server.synthetic_lines(args.seed)
+        log(f"steady: {args.rate} lines/s for {args.seconds}s")
+        results['steady'] = await replay_phase(bot, server_dir, source, args.rate, seconds=args.seconds,
+                                               name="steady")
+        log(f"flood: {args.flood_lines} lines")
+        results['flood'] = await replay_phase(bot, server_dir, source, 0, lines=args.flood_lines, name="flood")
+        log(f"status: {args.status_runs} commands")
+        results['status'] = await status_phase(bot, args.status_runs)
+
+        results['rss_kb_end'] = bot.rss_kb()
+        results['discord'] = stub.summary()
+    finally:
+        await bot.stop()
+        if server.returncode is None:
+            server.terminate()
+            await server.wait()
+        benchlib.kill_matching(bot.env['TERRARIA_NOTIFY_SOCKET'])
+        await stub.close()
+        sandbox.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark discord_bot.py against a Discord stub and a fake container.")
+    parser.add_argument('--log', help="recorded server_output.log to replay (default: synthetic traffic)")
+    parser.add_argument('--rate', type=float, default=20, help="steady-phase log lines per second")
+    parser.add_argument('--seconds', type=float, default=30, help="steady-phase duration")
+    parser.add_argument('--flood-lines', type=int, default=5000)
+    parser.add_argument('--status-runs', type=int, default=20)
+    parser.add_argument('--idle', type=float, default=15, help="idle-phase duration")
+    parser.add_argument('--settle', type=float, default=5, help="seconds between the bot's login and the first phase")
+    parser.add_argument('--api-latency-ms', type=float, default=0, help="delay added to every Discord API reply")
+    parser.add_argument('--perf', action='store_true', help="run the bot with BOT_PERF=1")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep', help="sandbox directory to use and keep (default: a temporary one)")
+    parser.add_argument('--output', help="also write the JSON results to this file")
+    args = parser.parse_args()
+    benchlib.emit(asyncio.run(run(args)), args.output)
+
+
+if __name__ == '__main__':
+    main()
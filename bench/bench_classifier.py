@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: log event classification throughput.
+
+Compares the old per-line if/elif chain from log_monitor_task (as it was,
+and grown to cover every event kind) with the compiled LogClassifier over a
+log corpus.
+
+Usage: bench/bench_classifier.py [server_output.log] [--lines N] [--repeat R]
+Without a log file, a synthetic corpus with a realistic event mix is used.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from bot_events import LogClassifier  # noqa: E402
+
+PLAYERS = ["Guide", "Merlin", "Ana Clara", "xX_Slayer_Xx", "Bob"]
+
+
+def synthetic_corpus(n, seed=1):
+    rnd = random.Random(seed)
+    templates = [
+        (30, lambda p: f"<{p}> anyone got spare {rnd.choice(['bars', 'potions', 'wood'])}?"),
+        (5, lambda p: f"192.168.1.{rnd.randint(2, 250)}:{rnd.randint(1024, 65000)} {p} has joined."),
+        (5, lambda p: f"{p} has left."),
+        (8, lambda p: f"{p} was slain by {rnd.choice(['Zombie', 'Eye of Cthulhu', 'Skeletron'])}."),
+        (4, lambda p: f"{rnd.uniform(0, 100):.1f}% - {rnd.choice(['Adding sand', 'Growing trees', 'Settling liquids'])}"),
+        (3, lambda p: f"Saving world data: {rnd.randint(0, 100)}%"),
+        (45, lambda p: rnd.choice([
+            f"{p} is connecting...", "Resetting game objects 42%", "Loading world data: 87%",
+            ": ", "Terraria Server v1.4.4.9", f"{rnd.randint(1, 9)} players connected.",
+        ])),
+    ]
+    weights = [w for w, _ in templates]
+    makers = [m for _, m in templates]
+    return [rnd.choices(makers, weights)[0](rnd.choice(PLAYERS)) for _ in range(n)]
+
+
+def legacy_classify(line):
+    """The original log_monitor_task chain, minus the Discord calls."""
+    if "has joined." in line:
+        match = re.search(r'(?:\d+\.\d+\.\d+\.\d+:\d+\s+)?(.+) has joined\.', line)
+        return ('join', match.group(1).strip()) if match else None
+    elif "has left." in line:
+        match = re.search(r'(?:\d+\.\d+\.\d+\.\d+:\d+\s+)?(.+) has left\.', line)
+        return ('leave', match.group(1).strip()) if match else None
+    elif line.startswith("<") and "> " in line:
+        parts = line.split("> ", 1)
+        return ('chat', parts[0][1:]) if len(parts) == 2 else None
+    elif any(x in line for x in [" was slain by ", " fell ", " drowned ", " burned ", " died "]):
+        return ('death', line)
+    elif "% - " in line:
+        return ('worldgen', line)
+    return None
+
+
+EXTRA_CHECKS = [
+    ('save_completed', ["Backing up world file", "Validating world save: 100%"]),
+    ('save_started', ["Saving world data"]),
+    ('server_started', ["Listening on port", "Server started"]),
+    ('server_starting', ["Setting up"]),
+    ('server_stopped', ["Server shut down"]),
+    ('crash', ["Address already in use", "OutOfMemory", "System.IO.IOException",
+               "Unhandled Exception", "LoadWorld", "ReadAllBytes"]),
+]
+
+
+def legacy_classify_all(line):
+    """The same chain grown to cover every kind the rule table knows about."""
+    event = legacy_classify(line)
+    if event is not None:
+        return event
+    for kind, needles in EXTRA_CHECKS:
+        if any(x in line for x in needles):
+            return (kind, line)
+    return None
+
+
+def run(fn, lines, repeat):
+    best = float('inf')
+    hits = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hits = sum(1 for line in lines if fn(line) is not None)
+        best = min(best, time.perf_counter() - start)
+    return {'seconds': round(best, 4), 'lines_per_sec': int(len(lines) / best), 'events': hits}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('log', nargs='?', help="recorded server_output.log")
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.log:
+        with open(args.log, encoding='utf-8', errors='ignore') as f:
+            lines = [line.strip() for line in f]
+    else:
+        lines = synthetic_corpus(args.lines)
+
+    classifier = LogClassifier()
+    results = {
+        'corpus': args.log or f"synthetic:{len(lines)}",
+        'lines': len(lines),
+        'legacy_chain': run(legacy_classify, lines, args.repeat),
+        'legacy_chain_all_kinds': run(legacy_classify_all, lines, args.repeat),
+        'compiled_classifier': run(classifier.classify, lines, args.repeat),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
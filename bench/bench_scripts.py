@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Benchmark: monitor_health.sh and backup_terraria.sh against a fake container.
+
+Runs each script the way cron does, with bench/fakes first on PATH (pct,
+tmux, systemctl), a fake server process (bench/fake_server.py) and the Discord
+stub receiving the webhook notifications. Per run: wall time, exit code, peak
+RSS and CPU time of the script and everything it waited for, fake command
+calls, processes created and webhook messages delivered.
+
+Usage: bench/bench_scripts.py [--runs N] [--world-mb MB] [--keep DIR] [--output FILE]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import benchlib
+from benchlib import SCRIPTS_DIR, log
+
+CT_ID = "105"
+NOTIFY_SETTLE = 2.5 # bot_notify.py batches for 1s before posting
+
+
+def run_script(sandbox, stub, argv, env):
+    """Runs one script to completion; returns its measurements."""
+    sandbox.calls() # Only count this run's calls
+    webhooks = len(stub.webhooks)
+    pid_before = benchlib.last_pid()
+    started = time.perf_counter()
+    proc = subprocess.Popen(argv, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = proc.stdout.read()
+    _, status, usage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - started
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    time.sleep(NOTIFY_SETTLE)
+    result = {
+        'rc': proc.returncode,
+        'seconds': round(seconds, 3),
+        'max_rss_kb': usage.ru_maxrss,
+        'cpu_user_s': round(usage.ru_utime, 3),
+        'cpu_sys_s': round(usage.ru_stime, 3),
+        'processes_created': benchlib.pids_created(pid_before, benchlib.last_pid()),
+        'calls': sandbox.calls(),
+        'webhook_messages': len(stub.webhooks) - webhooks,
+    }
+    if proc.returncode != 0:
+        result['output_tail'] = output.decode(errors='replace').splitlines()[-10:]
+    return result
+
+
+def summarise(runs):
+    """The first run plus the median of every numeric field over all runs."""
+    if len(runs) == 1:
+        return runs[0]
+    summary = dict(runs[0])
+    for key, value in runs[0].items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            values = sorted(run[key] for run in runs if run.get(key) is not None)
+            summary[key] = values[len(values) // 2] if values else None
+    summary['runs'] = len(runs)
+    summary['rc'] = max(run['rc'] for run in runs)
+    return summary
+
+
+def repo_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark monitor_health.sh and backup_terraria.sh offline.")
+    parser.add_argument('--runs', type=int, default=3, help="runs per scenario (median reported)")
+    parser.add_argument('--world-mb', type=int, default=16, help="size of the fake world file")
+    parser.add_argument('--keep', help="sandbox directory to use and keep (default: a temporary one)")
+    parser.add_argument('--output', help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    benchlib.check_environment()
+    sandbox = benchlib.Sandbox(args.keep)
+    sandbox.container(CT_ID, world_mb=args.world_mb)
+    server_dir = sandbox.server_dir(CT_ID)
+    repo = os.path.join(sandbox.root, "backups")
+    notify_socket = os.path.join(sandbox.root, "notify.sock")
+    server = None
+    results = {'ct_id': CT_ID, 'world_mb': args.world_mb, 'runs': args.runs}
+    try:
+        with benchlib.StubThread() as stub:
+            env = sandbox.env(DISCORD_WEBHOOK_URL=benchlib.webhook_url(stub), TERRARIA_NOTIFY_SOCKET=notify_socket,
+                              FLEET_STATE_FILE=os.path.join(sandbox.root, "fleet_health.json"))
+            server = subprocess.Popen([sys.executable, os.path.join(benchlib.BENCH_DIR, "fake_server.py"),
+                                       'serve', server_dir], env=env)
+            time.sleep(0.5)
+
+            health = os.path.join(SCRIPTS_DIR, "monitor_health.sh")
+            backup = os.path.join(SCRIPTS_DIR, "backup_terraria.sh")
+            scenarios = [
+                ('monitor_health_report', [health, CT_ID, '--report'], {}),
+                ('monitor_health_alert', [health, CT_ID, '--alert'], {}),
+                ('backup_hot', [backup, CT_ID, repo, "7"], {'BACKUP_MODE': 'hot'}),
+                ('backup_cold', [backup, CT_ID, repo, "7"], {'BACKUP_MODE': 'cold'}),
+            ]
+            for name, argv, extra in scenarios:
+                log(f"{name}: {args.runs} run(s)")
+                runs = [run_script(sandbox, stub, argv, dict(env, **extra)) for _ in range(args.runs)]
+                results[name] = summarise(runs)
+            results['backup_repo_bytes'] = repo_size(repo)
+            results['webhook_messages'] = len(stub.webhooks)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(10)
+        benchlib.kill_matching(notify_socket) # The notifier daemon notify.sh started
+        sandbox.close()
+    results['bench_rusage_max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    benchlib.emit(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
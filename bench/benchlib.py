@@ -0,0 +1,217 @@
+"""Shared pieces of the offline benchmarks (bench_bot.py, bench_scripts.py).
+
+A sandbox directory holds one fake container per CT ID (see fakes/pct):
+
+  ROOT/ct/<CT>/opt/terraria      serverconfig.txt, server_output.log
+  ROOT/ct/<CT>/home/terraria     .local/share/Terraria/Worlds/Bench.wld
+  ROOT/ct/<CT>/var/tmp           hot backup staging
+  ROOT/calls.log                 one line per fake pct/tmux/systemctl call
+
+Nothing outside ROOT is written, so a run needs no Proxmox host, no Terraria
+server and no Discord account. Fake pct uses a mount namespace: run as root
+or with unprivileged user namespaces enabled.
+"""
+import asyncio
+import collections
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+from discord_stub import DiscordStub
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+SCRIPTS_DIR = os.path.join(REPO_DIR, "scripts")
+FAKES_DIR = os.path.join(BENCH_DIR, "fakes")
+WORLD_NAME = "Bench"
+WORLDS_SUBDIR = "home/terraria/.local/share/Terraria/Worlds"
+
+
+class Sandbox:
+    def __init__(self, root=None, keep=False):
+        self.keep = keep or root is not None
+        self.root = root or tempfile.mkdtemp(prefix="terraria-bench-")
+        os.makedirs(os.path.join(self.root, "ct"), exist_ok=True)
+        self.calls_file = os.path.join(self.root, "calls.log")
+        open(self.calls_file, 'a').close()
+        self._calls_seen = 0
+
+    def container(self, ct_id, world_mb=8, port=7777):
+        """Creates (or reuses) fake container `ct_id`; returns its directory."""
+        ct = os.path.join(self.root, "ct", str(ct_id))
+        server_dir = os.path.join(ct, "opt", "terraria")
+        worlds = os.path.join(ct, WORLDS_SUBDIR)
+        for path in (server_dir, worlds, os.path.join(ct, "var", "tmp")):
+            os.makedirs(path, exist_ok=True)
+        world_path = f"/{WORLDS_SUBDIR}/{WORLD_NAME}.wld"
+        with open(os.path.join(server_dir, "serverconfig.txt"), 'w') as f:
+            f.write(f"world={world_path}\nworldpath=/{WORLDS_SUBDIR}\nport={port}\nmaxplayers=8\n")
+        open(os.path.join(server_dir, "server_output.log"), 'a').close()
+        world = os.path.join(worlds, f"{WORLD_NAME}.wld")
+        if not os.path.exists(world) or os.path.getsize(world) != world_mb * 1024 * 1024:
+            write_world(world, world_mb)
+        return ct
+
+    def server_dir(self, ct_id):
+        return os.path.join(self.root, "ct", str(ct_id), "opt", "terraria")
+
+    def env(self, **extra):
+        """Environment for the code under test: fakes first on PATH, calls logged."""
+        env = dict(os.environ)
+        env['PATH'] = f"{FAKES_DIR}:{env.get('PATH', '/usr/bin:/bin')}"
+        env['BENCH_ROOT'] = self.root
+        env['BENCH_CALLS'] = self.calls_file
+        env['PYTHONUNBUFFERED'] = "1"
+        env.update({k: str(v) for k, v in extra.items()})
+        return env
+
+    def calls(self):
+        """Fake command calls since the previous calls() ({"pct exec": n, ...})."""
+        with open(self.calls_file) as f:
+            lines = f.read().splitlines()
+        new, self._calls_seen = lines[self._calls_seen:], len(lines)
+        return dict(collections.Counter(new))
+
+    def close(self):
+        if not self.keep:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+
+def write_world(path, size_mb):
+    """A world-sized file: half random (incompressible) blocks, half zero runs."""
+    block = 64 * 1024
+    with open(path, 'wb') as f:
+        for i in range(size_mb * 1024 * 1024 // block):
+            f.write(os.urandom(block) if i % 2 == 0 else bytes(block))
+
+
+def last_pid():
+    """Last PID the kernel handed out; its growth approximates processes (and threads) created."""
+    with open("/proc/loadavg") as f:
+        return int(f.read().split()[-1])
+
+
+def pids_created(before, after):
+    return after - before if after >= before else None # None: the PID counter wrapped
+
+
+def rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def descendants(pid):
+    """PIDs of every live process below `pid`."""
+    children = collections.defaultdict(list)
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children[ppid].append(int(name))
+    found, todo = [], [pid]
+    while todo:
+        for child in children.get(todo.pop(), []):
+            found.append(child)
+            todo.append(child)
+    return found
+
+
+def kill_matching(text, sig=signal.SIGTERM):
+    """Signals every process whose command line contains `text` (e.g. a sandbox path)."""
+    killed = 0
+    for name in os.listdir("/proc"):
+        if not name.isdigit() or int(name) == os.getpid():
+            continue
+        try:
+            with open(f"/proc/{name}/cmdline", 'rb') as f:
+                cmdline = f.read().replace(b"\0", b" ").decode(errors='replace')
+        except OSError:
+            continue
+        if text in cmdline:
+            try:
+                os.kill(int(name), sig)
+                killed += 1
+            except OSError:
+                pass
+    return killed
+
+
+def latency_stats(values):
+    """count/mean/p50/p95/p99/max of `values` (seconds), reported in milliseconds."""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+
+    def pct(q):
+        return ordered[min(len(ordered) - 1, max(0, -(-len(ordered) * q // 100) - 1))]
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2),
+        'p50_ms': round(pct(50) * 1000, 2),
+        'p95_ms': round(pct(95) * 1000, 2),
+        'p99_ms': round(pct(99) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2),
+    }
+
+
+def check_environment():
+    """Exits with a hint when fake pct cannot create its mount namespace."""
+    if shutil.which("unshare") is None:
+        raise SystemExit("bench: unshare (util-linux) is required by fakes/pct")
+    probe = os.system("unshare --mount true 2>/dev/null" if os.geteuid() == 0
+                      else "unshare --mount --map-root-user true 2>/dev/null")
+    if probe != 0:
+        raise SystemExit("bench: cannot create a mount namespace (run as root or enable user namespaces)")
+
+
+def webhook_url(stub):
+    return f"{stub.base_url}/api/webhooks/1/bench"
+
+
+def emit(results, path=None):
+    text = json.dumps(results, indent=2, sort_keys=False)
+    if path:
+        with open(path, 'w') as f:
+            f.write(text + "\n")
+    print(text)
+
+
+def log(message):
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", file=sys.stderr, flush=True)
+
+
+class StubThread:
+    """A DiscordStub on its own event loop thread, for benchmarks that run blocking subprocesses."""
+
+    def __init__(self, **kwargs):
+        self.loop = asyncio.new_event_loop()
+        self.stub = DiscordStub(**kwargs)
+        self.thread = threading.Thread(target=self.loop.run_forever, name="discord-stub", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.stub.start(), self.loop).result(10)
+        return self.stub
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self.stub.close(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        return False
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""Local stand-in for Discord's HTTP API and gateway, for the offline benchmarks.
+
+Implements just what discord_bot.py and the webhook scripts use: login, the
+gateway handshake (HELLO, IDENTIFY, READY, GUILD_CREATE for one guild with
+a few text channels, heartbeats), MESSAGE_CREATE injection to run commands,
+and the message endpoints (send, edit, delete, fetch, typing, reactions).
+Incoming webhook posts (/api/webhooks/<id>/<token>) are accepted too, and
+/ip answers like ipify, so the bot never needs the internet.
+
+Every message the bot sends is timestamped on arrival, and the "#<seq>" tags
+bench/fake_server.py puts in log lines are extracted from it, so the
+benchmarks can compute log-to-Discord latency. `api_latency` delays every
+REST reply to mimic the round trip to the real API.
+
+discord.py is pointed at the stub by bench/run_bot.py. Standalone:
+  discord_stub.py [--port 8780]   (prints what it receives)
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import re
+import time
+
+from aiohttp import web, WSMsgType
+
+GUILD_ID = 900000000000000001
+BOT_USER_ID = 900000000000000002
+ADMIN_USER_ID = 900000000000000003
+APP_ID = 900000000000000004
+LOG_CHANNEL_ID = 900000000000000010
+COMMAND_CHANNEL_ID = 900000000000000011
+HEARTBEAT_MS = 41250
+TAG_RE = re.compile(r'#(\d+)')
+
+
+def _now_iso():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _user(user_id, name, bot=False):
+    return {'id': str(user_id), 'username': name, 'global_name': name, 'discriminator': "0",
+            'avatar': None, 'bot': bot, 'flags': 0, 'public_flags': 0}
+
+
+def _json(data, status=200):
+    # discord.py only decodes bodies typed exactly "application/json" (no charset)
+    return web.Response(body=json.dumps(data).encode(), status=status, content_type='application/json')
+
+
+class Sent:
+    """One message the bot posted (or a webhook delivered)."""
+    __slots__ = ('at', 'channel_id', 'content', 'embeds', 'tags')
+
+    def __init__(self, channel_id, content, embeds):
+        self.at = time.time()
+        self.channel_id = channel_id
+        self.content = content or ""
+        self.embeds = embeds or []
+        text = [self.content] + [json.dumps(embed) for embed in self.embeds]
+        self.tags = [int(t) for t in TAG_RE.findall(" ".join(text))]
+
+
+class DiscordStub:
+    def __init__(self, host="127.0.0.1", port=0, api_latency=0.0, verbose=False):
+        self.host = host
+        self.port = port
+        self.api_latency = api_latency
+        self.verbose = verbose
+        self.channels = {LOG_CHANNEL_ID: "terraria-log", COMMAND_CHANNEL_ID: "bot-commands"}
+        self.bot_user = _user(BOT_USER_ID, "BenchBot", bot=True)
+        self.admin_user = _user(ADMIN_USER_ID, "bench-admin")
+        self.ids = itertools.count(910000000000000000)
+        self.runner = None
+        self.sockets = set()
+        self.sequence = 0
+        self.ready = None # Set once the bot has identified and received its guild
+        self.sent = [] # [Sent] in arrival order
+        self.tag_times = {} # seq -> first arrival time
+        self.webhooks = []
+        self.requests = {} # "METHOD route" -> count
+        self.edits = 0
+        self.presence_updates = 0
+        self._waiters = [] # (channel_id, future) for the next message in a channel
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    # --- Lifecycle ---
+
+    async def start(self):
+        self.ready = asyncio.Event()
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_get("/gateway", self._gateway)
+        app.router.add_route("*", "/api/{path:.*}", self._rest)
+        app.router.add_get("/ip", lambda request: web.Response(text="203.0.113.7")) # For PUBLIC_IP_URL
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.port = self.runner.addresses[0][1] # The real port when 0 was asked for
+        return self
+
+    async def close(self):
+        for ws in list(self.sockets):
+            await ws.close()
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    # --- Gateway ---
+
+    async def _dispatch(self, ws, event, data):
+        self.sequence += 1
+        await ws.send_str(json.dumps({'op': 0, 't': event, 's': self.sequence, 'd': data}))
+
+    def _guild(self):
+        channels = [{'id': str(cid), 'type': 0, 'name': name, 'position': i, 'permission_overwrites': [],
+                     'nsfw': False, 'parent_id': None, 'topic': None, 'last_message_id': None,
+                     'rate_limit_per_user': 0, 'guild_id': str(GUILD_ID)}
+                    for i, (cid, name) in enumerate(self.channels.items())]
+        everyone = {'id': str(GUILD_ID), 'name': "@everyone", 'permissions': "2248473465835073", 'position': 0,
+                    'color': 0, 'hoist': False, 'managed': False, 'mentionable': False, 'flags': 0}
+        members = [{'user': user, 'roles': [], 'joined_at': _now_iso(), 'deaf': False, 'mute': False, 'flags': 0}
+                   for user in (self.bot_user, self.admin_user)]
+        return {
+            'id': str(GUILD_ID), 'name': "Bench", 'icon': None, 'owner_id': str(ADMIN_USER_ID),
+            'afk_timeout': 300, 'verification_level': 0, 'default_message_notifications': 0,
+            'explicit_content_filter': 0, 'roles': [everyone], 'emojis': [], 'stickers': [], 'features': [],
+            'mfa_level': 0, 'system_channel_flags': 0, 'premium_tier': 0, 'nsfw_level': 0,
+            'preferred_locale': "en-US", 'member_count': len(members), 'large': False, 'unavailable': False,
+            'joined_at': _now_iso(), 'members': members, 'channels': channels, 'threads': [],
+            'voice_states': [], 'presences': [], 'stage_instances': [], 'guild_scheduled_events': [],
+        }
+
+    async def _gateway(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        self.sockets.add(ws)
+        await ws.send_str(json.dumps({'op': 10, 'd': {'heartbeat_interval': HEARTBEAT_MS}}))
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                payload = json.loads(msg.data)
+                op = payload.get('op')
+                if op == 1: # Heartbeat
+                    await ws.send_str(json.dumps({'op': 11}))
+                elif op == 2: # Identify
+                    await self._dispatch(ws, 'READY', {
+                        'v': 10, 'user': self.bot_user, 'guilds': [{'id': str(GUILD_ID), 'unavailable': True}],
+                        'session_id': "bench", 'resume_gateway_url': f"ws://{self.host}:{self.port}/gateway",
+                        'application': {'id': str(APP_ID), 'flags': 0}, 'private_channels': [],
+                        'relationships': [], 'session_type': "normal", 'shard': [0, 1],
+                    })
+                    await self._dispatch(ws, 'GUILD_CREATE', self._guild())
+                    self.ready.set()
+                elif op == 3: # Presence update
+                    self.presence_updates += 1
+        finally:
+            self.sockets.discard(ws)
+        return ws
+
+    async def send_command(self, content, channel_id=COMMAND_CHANNEL_ID):
+        """Types `content` in a channel as the admin user; returns the send time."""
+        message = self._message(next(self.ids), channel_id, content, [], self.admin_user)
+        message['member'] = {'roles': [], 'joined_at': _now_iso(), 'deaf': False, 'mute': False, 'flags': 0}
+        sent_at = time.time()
+        for ws in list(self.sockets):
+            await self._dispatch(ws, 'MESSAGE_CREATE', message)
+        return sent_at
+
+    def next_message(self, channel_id):
+        """Future resolving to the next Sent in `channel_id`."""
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append((channel_id, fut))
+        return fut
+
+    # --- REST ---
+
+    def _message(self, message_id, channel_id, content, embeds, author):
+        return {
+            'id': str(message_id), 'channel_id': str(channel_id), 'guild_id': str(GUILD_ID), 'author': author,
+            'content': content or "", 'timestamp': _now_iso(), 'edited_timestamp': None, 'tts': False,
+            'mention_everyone': False, 'mentions': [], 'mention_roles': [], 'attachments': [],
+            'embeds': embeds or [], 'pinned': False, 'type': 0, 'flags': 0, 'components': [],
+        }
+
+    async def _payload(self, request):
+        if request.content_type.startswith('multipart/'):
+            # Messages with files: the JSON part is "payload_json"
+            reader = await request.multipart()
+            payload = {}
+            async for part in reader:
+                if part.name == 'payload_json':
+                    payload = json.loads(await part.text())
+                else:
+                    await part.read()
+            return payload
+        if request.can_read_body:
+            try:
+                return await request.json()
+            except ValueError:
+                return {}
+        return {}
+
+    def _record(self, sent):
+        self.sent.append(sent)
+        for seq in sent.tags:
+            self.tag_times.setdefault(seq, sent.at)
+        for waiter in list(self._waiters):
+            channel_id, fut = waiter
+            if channel_id == sent.channel_id:
+                self._waiters.remove(waiter)
+                if not fut.done():
+                    fut.set_result(sent)
+        if self.verbose:
+            print(f"[{sent.channel_id}] {sent.content[:120]!r} +{len(sent.embeds)} embed(s)")
+
+    async def _rest(self, request):
+        path = "/" + request.match_info['path']
+        path = re.sub(r'^/v\d+', '', path)
+        route = re.sub(r'/\d+', '/{id}', path)
+        key = f"{request.method} {route}"
+        self.requests[key] = self.requests.get(key, 0) + 1
+        payload = await self._payload(request) if request.method in ('POST', 'PATCH', 'PUT') else {}
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+
+        parts = path.strip("/").split("/")
+        if key == "GET /users/@me":
+            return _json(self.bot_user)
+        if key == "GET /oauth2/applications/@me":
+            return _json({'id': str(APP_ID), 'name': "BenchBot", 'icon': None, 'description': "",
+                          'bot_public': False, 'bot_require_code_grant': False, 'owner': self.admin_user,
+                          'verify_key': "", 'flags': 0})
+        if key in ("GET /gateway/bot", "GET /gateway"):
+            return _json({'url': f"ws://{self.host}:{self.port}/gateway", 'shards': 1,
+                                      'session_start_limit': {'total': 1000, 'remaining': 1000,
+                                                              'reset_after': 0, 'max_concurrency': 1}})
+        if parts[0] == 'webhooks' and request.method == 'POST':
+            self.webhooks.append(Sent(None, payload.get('content'), payload.get('embeds')))
+            return web.Response(status=204)
+        if parts[0] == 'channels' and len(parts) >= 3:
+            channel_id = int(parts[1])
+            if parts[2] == 'typing':
+                return web.Response(status=204)
+            if parts[2] == 'messages':
+                if len(parts) == 3 and request.method == 'POST':
+                    self._record(Sent(channel_id, payload.get('content'), payload.get('embeds')))
+                    return _json(self._message(next(self.ids), channel_id, payload.get('content'),
+                                                           payload.get('embeds'), self.bot_user))
+                if len(parts) == 4 and request.method == 'PATCH':
+                    self.edits += 1
+                    return _json(self._message(parts[3], channel_id, payload.get('content'),
+                                                           payload.get('embeds'), self.bot_user))
+                if len(parts) == 4 and request.method == 'GET':
+                    return _json(self._message(parts[3], channel_id, "", [], self.bot_user))
+                if request.method in ('DELETE', 'PUT'): # Deletes and reactions
+                    return web.Response(status=204)
+        return _json({'message': f"Unknown route {key}", 'code': 0}, status=404)
+
+    def summary(self):
+        return {
+            'messages': len(self.sent),
+            'edits': self.edits,
+            'webhook_messages': len(self.webhooks),
+            'presence_updates': self.presence_updates,
+            'requests': dict(sorted(self.requests.items())),
+        }
+
+
+async def _serve(args):
+    stub = await DiscordStub(port=args.port, api_latency=args.api_latency_ms / 1000, verbose=True).start()
+    print(f"Discord stub on {stub.base_url} (webhook: {stub.base_url}/api/webhooks/1/bench)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stub.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Discord API/gateway stub.")
+    parser.add_argument('--port', type=int, default=8780)
+    parser.add_argument('--api-latency-ms', type=float, default=0)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Fake Terraria server and server_output.log traffic generator.
+
+  fake_server.py serve DIR
+      Plays the server process for the status probes (its command line
+      contains "TerrariaServer.bin.x86_64"), writes the startup lines to DIR/server_output.log
+      and keeps the console marker that bench/fakes/tmux checks. Runs until
+      SIGTERM, then logs a shutdown.
+
+  fake_server.py replay DIR [LOG] [--rate N] [--lines N | --duration S] [--record FILE]
+      Appends traffic to DIR/server_output.log at N lines/s (0: as fast as
+      possible): lines of a recorded LOG, looped, or a synthetic mix of chat,
+      joins, leaves, deaths and console noise. Every line that the bot posts
+      to Discord is tagged with "#<seq>" and, with --record, "<seq> <time>"
+      is written for it, so a Discord stub can measure write-to-post latency.
+"""
+import argparse
+import os
+import random
+import signal
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from bot_events import LogClassifier  # noqa: E402
+
+PROCESS_MARKER = "TerrariaServer.bin.x86_64"
+POSTED_KINDS = ('chat', 'join', 'leave', 'death') # Event kinds the bot relays to Discord
+PLAYERS = ["Guide", "Merlin", "Ana Clara", "xX_Slayer_Xx", "Bob"]
+STARTUP = [
+    "Terraria Server v1.4.4.9",
+    "Loading world data: 100%",
+    "Settling liquids: 100%",
+    "Resetting game objects 100%",
+    "Listening on port 7777",
+    "Type 'help' for a list of commands.",
+    "Server started",
+]
+TICK = 0.01
+
+
+def log_path(server_dir):
+    return os.path.join(server_dir, "server_output.log")
+
+
+def append(server_dir, lines):
+    # One write per batch, like the tmux pipe-pane the real log comes from
+    with open(log_path(server_dir), 'a', encoding='utf-8') as f:
+        f.write("".join(f"{line}\n" for line in lines))
+
+
+def synthetic_lines(seed=1):
+    rnd = random.Random(seed)
+    templates = [
+        (30, lambda p: f"<{p}> anyone got spare {rnd.choice(['bars', 'potions', 'wood'])}?"),
+        (5, lambda p: f"192.168.1.{rnd.randint(2, 250)}:{rnd.randint(1024, 65000)} {p} has joined."),
+        (5, lambda p: f"{p} has left."),
+        (8, lambda p: f"{p} was slain by {rnd.choice(['Zombie', 'Eye of Cthulhu', 'Skeletron'])}."),
+        (52, lambda p: rnd.choice([
+            f"{p} is connecting...", "Resetting game objects 42%", "Saving world data: 87%",
+            ": ", f"{rnd.randint(1, 9)} players connected.", "Backing up world file",
+        ])),
+    ]
+    weights = [w for w, _ in templates]
+    makers = [m for _, m in templates]
+    while True:
+        yield rnd.choices(makers, weights)[0](rnd.choice(PLAYERS))
+
+
+def recorded_lines(path):
+    with open(path, encoding='utf-8', errors='ignore') as f:
+        lines = [line.rstrip("\n") for line in f if line.strip()]
+    if not lines:
+        raise SystemExit(f"{path}: no lines to replay")
+    while True:
+        yield from lines
+
+
+def tag(classifier, line, seq):
+    """The line with "#seq" where it survives into the bot's Discord message, or None."""
+    event = classifier.classify(line)
+    if event is None or event.kind not in POSTED_KINDS:
+        return None
+    if event.kind in ('join', 'leave'):
+        # The player name is what gets posted
+        suffix = " has joined." if event.kind == 'join' else " has left."
+        return line[:-len(suffix)] + f" #{seq}" + suffix if line.endswith(suffix) else None
+    return f"{line} #{seq}"
+
+
+def replay(server_dir, source, rate=0, count=None, duration=None, record=None):
+    """Appends lines from `source`; returns (lines written, tagged lines, seconds)."""
+    classifier = LogClassifier()
+    out = open(record, 'w') if record else None
+    written = tagged = 0
+    started = time.monotonic()
+    try:
+        while True:
+            elapsed = time.monotonic() - started
+            if duration is not None and elapsed >= duration:
+                break
+            if count is not None and written >= count:
+                break
+            due = 1000 if rate <= 0 else int(rate * elapsed) + 1 - written
+            if count is not None:
+                due = min(due, count - written)
+            if due <= 0:
+                time.sleep(TICK)
+                continue
+            batch, seqs = [], []
+            for _ in range(due):
+                line = next(source)
+                marked = tag(classifier, line, tagged + 1)
+                if marked is not None:
+                    tagged += 1
+                    seqs.append(tagged)
+                    line = marked
+                batch.append(line)
+            append(server_dir, batch)
+            now = time.time()
+            if out is not None:
+                out.write("".join(f"{seq} {now:.6f}\n" for seq in seqs))
+            written += len(batch)
+    finally:
+        if out is not None:
+            out.close()
+    return written, tagged, time.monotonic() - started
+
+
+def serve(server_dir):
+    marker = os.path.join(server_dir, ".bench_console")
+    open(marker, 'w').close()
+    append(server_dir, STARTUP)
+    stop = []
+    signal.signal(signal.SIGTERM, lambda *_: stop.append(True))
+    try:
+        while not stop:
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        append(server_dir, ["Saving world data: 100%", "Server shut down"])
+        try:
+            os.unlink(marker)
+        except FileNotFoundError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Terraria server and log traffic generator.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('serve', help="play the server process until SIGTERM")
+    p.add_argument('dir', help="server directory (holds server_output.log)")
+    p.add_argument('name', nargs='?', default=PROCESS_MARKER, help=argparse.SUPPRESS)
+    p = sub.add_parser('replay', help="append log traffic")
+    p.add_argument('dir', help="server directory (holds server_output.log)")
+    p.add_argument('log', nargs='?', help="recorded server_output.log to replay (default: synthetic)")
+    p.add_argument('--rate', type=float, default=20, help="lines per second, 0 for as fast as possible")
+    p.add_argument('--lines', type=int, help="stop after this many lines")
+    p.add_argument('--duration', type=float, help="stop after this many seconds")
+    p.add_argument('--record', help="write '<seq> <unix time>' for every tagged line")
+    p.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        if PROCESS_MARKER not in sys.argv:
+            # The status probe greps command lines: make sure ours matches
+            os.execv(sys.executable, [sys.executable, os.path.abspath(__file__), 'serve', args.dir, PROCESS_MARKER])
+        serve(args.dir)
+        return
+    if args.lines is None and args.duration is None:
+        parser.error("replay needs --lines or --duration")
+    source = recorded_lines(args.log) if args.log else synthetic_lines(args.seed)
+    written, tagged, seconds = replay(args.dir, source, args.rate, args.lines, args.duration, args.record)
+    print(f"{written} lines ({tagged} tagged) in {seconds:.2f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
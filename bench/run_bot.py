@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""Runs scripts/discord_bot.py against bench/discord_stub.py instead of Discord.
+
+The bot itself is unchanged: only discord.py's API base URL and gateway URL
+are pointed at BENCH_DISCORD_URL (e.g. http://127.0.0.1:8780) before the bot
+module runs as __main__.
+"""
+import os
+import runpy
+import sys
+
+import discord.gateway
+import discord.http
+import yarl
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+
+def main():
+    base = os.environ.get('BENCH_DISCORD_URL')
+    if not base:
+        raise SystemExit("BENCH_DISCORD_URL is not set (the Discord stub's address)")
+    discord.http.Route.BASE = f"{base}/api/v10"
+    discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(base.replace("http", "ws", 1) + "/gateway")
+    sys.path.insert(0, SCRIPTS_DIR)
+    sys.argv = [os.path.join(SCRIPTS_DIR, "discord_bot.py")]
+    runpy.run_path(sys.argv[0], run_name='__main__')
+
+
+if __name__ == '__main__':
+    main()
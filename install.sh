@@ -318,7 +318,7 @@ notify_install() {
   local script_dir
   script_dir="$(dirname "$0")"
   
-  if [ -x "$script_dir/scripts/discord_webhook.sh" ] && [ -n "${DISCORD_URL:-}" ]; then
+  if [ -x "$script_dir/scripts/notify.sh" ] && [ -n "${DISCORD_URL:-}" ]; then
     local args=(--title "$title" --desc "$msg" --status "$status" --url "$DISCORD_URL")
     args+=(--field "CT ID:$CT_ID")
     
@@ -327,7 +327,7 @@ notify_install() {
     ip=$(pct exec "$CT_ID" -- ip -4 a s eth0 2>/dev/null | grep inet | awk '{print $2}' | cut -d/ -f1 | head -n1 || echo "Unknown")
     args+=(--field "Server Address:$ip")
     
-    "$script_dir/scripts/discord_webhook.sh" "${args[@]}" || true
+    "$script_dir/scripts/notify.sh" "${args[@]}" || true
   fi
 }
 
@@ -491,6 +491,20 @@ fi
 echo "Pushing game files to container..."
 pct push "$CT_ID" "$SOURCE_ZIP" "/tmp/terraria_installer.zip"
 
+# Bot support modules (scripts/bot_*.py) live next to discord_bot.py.
+# They are pushed as files; only the main script fits in an env var.
+# The log writer (bot_logstore.py) and the notifier (bot_notify.py) are used
+# by launch.sh, so they always go.
+BOT_MODULES=""
+for mod in "$PROJECT_DIR"/scripts/bot_*.py; do
+    [ -f "$mod" ] || continue
+    case "$(basename "$mod")" in bot_logstore.py|bot_notify.py) always=1 ;; *) always="" ;; esac
+    if [ -n "$BOT_CODE" ] || [ -n "$always" ]; then
+        pct push "$CT_ID" "$mod" "/tmp/$(basename "$mod")"
+        BOT_MODULES="$BOT_MODULES $(basename "$mod")"
+    fi
+done
+
 UPLOADED_WORLD_NAME=""
 if [ -n "${LOCAL_WORLD_PATH:-}" ]; then
     if [ ! -f "$LOCAL_WORLD_PATH" ]; then
@@ -521,6 +535,7 @@ pct exec "$CT_ID" -- env \
   BOT_TOKEN="$BOT_TOKEN" \
   BOT_USER_ID="$BOT_USER_ID" \
   BOT_CODE="$BOT_CODE" \
+  BOT_MODULES="$BOT_MODULES" \
   PRIORITY="$PRIORITY" \
   UPNP="$UPNP" \
   LANGUAGE="$LANGUAGE" \
@@ -652,6 +667,16 @@ notify() {
     [ -z "$wname" ] && wname="Unknown"
     [ -z "$port" ] && port="7777"
 
+    # Resident notifier: batched, deduplicated, one kept-alive connection.
+    # Skipped by notify_final: see below.
+    if [ -z "${NOTIFY_DIRECT:-}" ] && [ -f "$DIR/bot_notify.py" ]; then
+        local status=info
+        case "$color" in 15158332) status=error ;; 3066993) status=success ;; esac
+        python3 "$DIR/bot_notify.py" send --url "$url" --title "$1" --desc "$3" --status "$status" \
+            --field "Server IP:$ip" --field "Port:$port" --field "World:$wname" \
+            --footer "Terraria Server Status • Proxmox" 2>/dev/null && return
+    fi
+
     # JSON Payload (Rich Embed)
     local json=$(cat <<J
 {
@@ -671,7 +696,14 @@ notify() {
 }
 J
 )
-    curl -s -H "Content-Type: application/json" -d "$json" "$url" >/dev/null || true
+    curl -s --max-time 10 --retry 2 -H "Content-Type: application/json" -d "$json" "$url" >/dev/null || true
+}
+
+# Last words before exiting: the daemon forked by notify() lives in this
+# service's cgroup and is killed with it, taking any queued or retried message
+# along. Post directly and wait for Discord's answer instead.
+notify_final() {
+    NOTIFY_DIRECT=1 notify "$@"
 }
 
 # Sanity Check: World Existence
@@ -739,8 +771,14 @@ tmux kill-session -t "$TMUX_SESSION" 2>/dev/null || true
         echo "$BOT_PID" > "$DIR/bot.pid"
     fi
 
-# Setup Logging: Pipe the tmux output to the log file immediately
-tmux pipe-pane -o -t "$TMUX_SESSION" "cat >> $LOG_FILE"
+# Setup Logging: Pipe the tmux output to the log file immediately.
+# bot_logstore.py indexes it by time and rotates it into compressed segments
+# (logs/); plain `cat` takes over if it is missing or dies.
+if [ -f "$DIR/bot_logstore.py" ]; then
+    tmux pipe-pane -o -t "$TMUX_SESSION" "python3 $DIR/bot_logstore.py write $LOG_FILE || cat >> $LOG_FILE"
+else
+    tmux pipe-pane -o -t "$TMUX_SESSION" "cat >> $LOG_FILE"
+fi
 
 # Wait Loop: Monitor tmux session existence
 # We use a loop here because launch.sh must remain running for systemd/supervisor to track it.
@@ -765,10 +803,10 @@ LAST_LOGS=$(tail -n 10 "$DIR/server_output.log" | sed 's/^[[:space:]]*//' | cut
 if [ $EXIT_CODE -eq 0 ]; then
     # If exit 0, check if it was a "Menu Exit" (Failure to load)
     if echo "$LAST_LOGS" | grep -qiE "(choose world|select world|enter world name)"; then
-        notify "Boot Error: Missing World" 15158332 "Server dropped to menu. It cannot find the configured world file.\n\n**Action:** Check paths in 'serverconfig.txt' or run restore."
+        notify_final "Boot Error: Missing World" 15158332 "Server dropped to menu. It cannot find the configured world file.\n\n**Action:** Check paths in 'serverconfig.txt' or run restore."
         exit 1
     else
-        notify "Server Stopped" 15158332 "Server shut down normally."
+        notify_final "Server Stopped" 15158332 "Server shut down normally."
     fi
 else
     # Analyze Crash Reason
@@ -796,7 +834,7 @@ else
         ERROR_DESC="Error reading 'serverconfig.txt'. Check for typos or invalid parameters."
     fi
 
-    notify "$ERROR_TITLE" 15158332 "$ERROR_DESC"
+    notify_final "$ERROR_TITLE" 15158332 "$ERROR_DESC"
 fi
 
 sleep 2
@@ -811,6 +849,9 @@ LAUNCH
         # Dump the env var directly to file to avoid heredoc expansion issues
         printenv BOT_CODE > /opt/terraria/discord_bot.py
     fi
+    for mod in $BOT_MODULES; do
+        mv -f "/tmp/$mod" "/opt/terraria/$mod"
+    done
     
     # Finalize Bot Installation (Inside Container)
     if [ -n "$BOT_TOKEN" ]; then
@@ -818,6 +859,9 @@ LAUNCH
         python3 -m venv /opt/terraria/.bot_venv
         /opt/terraria/.bot_venv/bin/pip install discord.py --quiet
         chown -R terraria:terraria /opt/terraria/.bot_venv /opt/terraria/discord_bot.py
+        for mod in $BOT_MODULES; do
+            chown terraria:terraria "/opt/terraria/$mod"
+        done
     fi
     
     
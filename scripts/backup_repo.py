@@ -0,0 +1,692 @@
+#!/usr/bin/env python3
+"""Content-addressed, deduplicated backup repository for Terraria containers.
+
+A backup streams an uncompressed tar of the container's directories from
+`pct exec`, splits every file into content-defined chunks (boundaries depend
+only on the bytes around them, so an edit in the middle of a world, even one
+that shifts everything after it, only changes the chunks around the edit)
+and stores each chunk once under its SHA-256, compressed on a thread pool.
+A snapshot is just a small gzip'd JSON manifest listing files and chunk ids
+(plus, for each .wld, the world's name, seed, difficulty and progress read
+from its header while it was chunked).
+Files whose size and mtime match the previous snapshot reuse its chunk list
+without being re-chunked, so hourly snapshots only cost the changed bytes.
+
+With --hot the server keeps running: the world is saved through the console,
+a checksum-verified copy of the Worlds directory is staged in the container
+(see bot_backup.py) and that copy is archived in place of the live files.
+
+Restores are random access: the manifest says which chunks make up each file,
+so `restore --only MyWorld` decompresses just that world's chunks, however
+large the snapshot. Ownership travels in the tar headers (applied by tar at
+extraction, no recursive chown), every chunk is checked against its SHA-256 as
+it is read and every restored file is re-hashed inside the container.
+
+Retention keeps the newest N snapshots per container; garbage collection then
+deletes every chunk no remaining manifest references.
+
+Layout:
+  REPO/chunks/ab/abcdef...   one chunk: 1 codec byte ('Z' zlib, 'R' raw) + data
+  REPO/snapshots/terraria-<CT>-<YYYYmmddTHHMMSS>.json.gz
+  REPO/catalog.db            snapshot index (see bot_catalog.py): listing,
+                             retention and restore selection never open manifests
+
+Usage:
+  ./backup_repo.py backup CT_ID REPO [--hot] [--keep N]
+  ./backup_repo.py list REPO [--ct CT_ID]
+  ./backup_repo.py find REPO --ct CT_ID [--before TIME]
+  ./backup_repo.py gc REPO [--ct CT_ID --keep N]
+  ./backup_repo.py restore REPO SNAPSHOT CT_ID [--only WORLD_OR_PATH ...]
+"""
+import argparse
+import asyncio
+import datetime
+import fnmatch
+import collections
+import concurrent.futures
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import time
+import zlib
+
+from bot_catalog import BackupCatalog, BackupEntry, world_names
+from bot_backup import STAGE_DIR, SAVE_TIMEOUT, is_save_completed, snapshot_script, worlds_dir
+from bot_config import parse_config
+from bot_exec import ExecChannel, ExecUnavailable
+from bot_logs import ChannelLogSource, capture_output
+from bot_world import parse_world_header
+
+CONFIG_FILE = "/opt/terraria/serverconfig.txt"
+LOG_FILE = "/opt/terraria/server_output.log"
+DEFAULT_PATHS = ("/opt/terraria", "/home/terraria")
+
+# Content-defined chunking: candidate boundaries are occurrences of ANCHOR (found
+# with bytes.find, at C speed); one is taken when the CRC-32 of the WINDOW bytes
+# before it is zero under MASK. Chunks are never shorter than MIN_CHUNK nor
+# longer than MAX_CHUNK (average ~768 KiB on incompressible data).
+MIN_CHUNK = 256 * 1024
+MAX_CHUNK = 4 * 1024 * 1024
+ANCHOR = 0x5A
+WINDOW = 48
+MASK = (1 << 11) - 1
+MAX_CANDIDATES = 16384 # Bounds the work on degenerate data (long runs of ANCHOR)
+READ_SIZE = 8 * 1024 * 1024
+
+CODEC_ZLIB = b'Z'
+CODEC_RAW = b'R'
+ZLIB_LEVEL = 6
+
+
+def find_cut(buf, end):
+    """Length of the first chunk in buf[:end] (end itself if no boundary is found)."""
+    if end <= MIN_CHUNK:
+        return end
+    limit = min(end, MAX_CHUNK)
+    view = memoryview(buf)
+    i = buf.find(ANCHOR, MIN_CHUNK, limit)
+    for _ in range(MAX_CANDIDATES):
+        if i < 0:
+            break
+        if not zlib.crc32(view[i - WINDOW:i]) & MASK:
+            return i
+        i = buf.find(ANCHOR, i + 1, limit)
+    return limit
+
+
+def iter_chunks(f):
+    """Yields content-defined chunks (bytes) read from file object `f`."""
+    buf = bytearray()
+    eof = False
+    while True:
+        while not eof and len(buf) < MAX_CHUNK:
+            data = f.read(READ_SIZE)
+            if not data:
+                eof = True
+            buf += data
+        if not buf:
+            return
+        if eof and len(buf) <= MIN_CHUNK:
+            yield bytes(buf)
+            return
+        cut = find_cut(buf, len(buf))
+        yield bytes(buf[:cut])
+        del buf[:cut]
+
+
+def renamed(path, rename):
+    """Maps `path` through the {old_prefix: new_prefix} table (first match wins)."""
+    for old, new in (rename or {}).items():
+        if path == old or path.startswith(old + '/'):
+            return new + path[len(old):]
+    return path
+
+
+def encode_chunk(data):
+    packed = zlib.compress(data, ZLIB_LEVEL)
+    if len(packed) >= len(data) * 0.95:
+        return CODEC_RAW + data
+    return CODEC_ZLIB + packed
+
+
+def decode_chunk(blob):
+    codec, payload = blob[:1], blob[1:]
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    if codec == CODEC_RAW:
+        return payload
+    raise ValueError(f"unknown chunk codec {codec!r}")
+
+
+class Repository:
+    def __init__(self, path):
+        self.path = path
+        self.chunk_dir = os.path.join(path, "chunks")
+        self.snapshot_dir = os.path.join(path, "snapshots")
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        self.catalog = BackupCatalog(os.path.join(path, "catalog.db"))
+        if not self.catalog.totals(kind='snapshot')[0]:
+            self.reindex()
+
+    # --- Chunks ---
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+
+    def has_chunk(self, digest):
+        return os.path.exists(self.chunk_path(digest))
+
+    def _write_chunk(self, digest, data):
+        """Compresses and stores one chunk (runs on the worker pool). Returns stored bytes."""
+        blob = encode_chunk(data)
+        path = self.chunk_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp, path)
+        return len(blob)
+
+    def read_chunk(self, digest, verify=True):
+        with open(self.chunk_path(digest), 'rb') as f:
+            data = decode_chunk(f.read())
+        if verify and hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"chunk {digest} is corrupt")
+        return data
+
+    # --- Snapshots ---
+
+    def snapshot_path(self, name):
+        return os.path.join(self.snapshot_dir, f"{name}.json.gz")
+
+    def snapshots(self, ct_id=None):
+        """Snapshot names on disk, oldest first (names sort by timestamp).
+
+        Garbage collection marks from these files, never from the catalog, so
+        a stale index can't cause live chunks to be deleted.
+        """
+        prefix = f"terraria-{ct_id}-" if ct_id is not None else "terraria-"
+        names = [n[:-len(".json.gz")] for n in os.listdir(self.snapshot_dir)
+                 if n.startswith(prefix) and n.endswith(".json.gz")]
+        return sorted(names, key=lambda n: n.rsplit('-', 1)[1])
+
+    def load(self, name):
+        with gzip.open(self.snapshot_path(name), 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, manifest):
+        path = self.snapshot_path(manifest['name'])
+        tmp = f"{path}.tmp"
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            json.dump(manifest, f, separators=(',', ':'))
+        os.replace(tmp, path)
+        self.catalog.add(self.catalog_entry(manifest))
+
+    def catalog_entry(self, manifest):
+        path = self.snapshot_path(manifest['name'])
+        with open(path, 'rb') as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        stats = manifest.get('stats', {})
+        return BackupEntry(
+            name=manifest['name'], kind='snapshot', created=manifest['created'],
+            ct_id=manifest['ct_id'], path=path,
+            size=stats.get('logical_bytes', 0),
+            # What this snapshot added to the repository (new chunks only)
+            stored=stats.get('stored_bytes', 0),
+            checksum=checksum,
+            worlds=world_names(e['path'] for e in manifest['files'] if e['type'] == 'file'),
+            mode=manifest.get('mode', 'cold'))
+
+    def reindex(self):
+        """Rebuilds the catalog from the manifests on disk."""
+        self.catalog.remove([e.name for e in self.catalog.list(kind='snapshot')])
+        for name in self.snapshots():
+            self.catalog.add(self.catalog_entry(self.load(name)))
+
+    def drop(self, name):
+        os.remove(self.snapshot_path(name))
+        self.catalog.remove([name])
+
+    # --- Backup ---
+
+    def backup(self, ct_id, stream, workers=None, rename=None, mode='cold'):
+        """Ingests a tar stream and writes a snapshot manifest. Returns the manifest.
+
+        `rename` maps path prefixes in the stream to the paths recorded (a staged
+        copy is stored under the directory it was copied from).
+        """
+        started = time.monotonic()
+        previous = {}
+        last = self.catalog.latest(kind='snapshot', ct_id=ct_id)
+        if last is not None:
+            for entry in self.load(last.name)['files']:
+                if entry['type'] == 'file':
+                    previous[entry['path']] = entry
+
+        workers = workers or os.cpu_count() or 2
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        in_flight = collections.deque()
+        scheduled = set()
+        stats = collections.Counter()
+        files = []
+
+        def store(digest, data):
+            if digest in scheduled or self.has_chunk(digest):
+                return
+            scheduled.add(digest)
+            in_flight.append(pool.submit(self._write_chunk, digest, data))
+            stats['chunks_new'] += 1
+            # Bound memory: at most a couple of pending chunks per worker
+            while len(in_flight) > 2 * workers:
+                stats['stored_bytes'] += in_flight.popleft().result()
+
+        try:
+            with tarfile.open(fileobj=stream, mode='r|') as tar:
+                for member in tar:
+                    entry = {
+                        'path': renamed('/' + member.name.lstrip('/'), rename),
+                        'mode': member.mode,
+                        'uid': member.uid,
+                        'gid': member.gid,
+                        'uname': member.uname,
+                        'gname': member.gname,
+                        'mtime': int(member.mtime),
+                    }
+                    if member.isdir():
+                        entry['type'] = 'dir'
+                    elif member.issym() or member.islnk():
+                        entry['type'] = 'symlink' if member.issym() else 'hardlink'
+                        entry['linkname'] = member.linkname
+                        if member.islnk():
+                            # Hard link targets are member names, so they move with renames too
+                            entry['linkname'] = renamed('/' + member.linkname.lstrip('/'), rename)
+                    elif member.isreg():
+                        entry['type'] = 'file'
+                        entry['size'] = member.size
+                        stats['logical_bytes'] += member.size
+                        old = previous.get(entry['path'])
+                        if (old and old['size'] == member.size and old['mtime'] == entry['mtime']
+                                and all(self.has_chunk(d) for d in old['chunks'])):
+                            # Unchanged since the last snapshot: skip chunking and hashing
+                            entry['chunks'] = old['chunks']
+                            for key in ('sha256', 'world'):
+                                if key in old:
+                                    entry[key] = old[key]
+                            stats['files_reused'] += 1
+                        else:
+                            entry['chunks'] = []
+                            whole = hashlib.sha256() # Verified in the container after a restore
+                            for chunk in iter_chunks(tar.extractfile(member)):
+                                digest = hashlib.sha256(chunk).hexdigest()
+                                entry['chunks'].append(digest)
+                                whole.update(chunk)
+                                store(digest, chunk)
+                                if len(entry['chunks']) == 1 and entry['path'].endswith(".wld"):
+                                    # The first chunk (>= MIN_CHUNK) holds the whole world header
+                                    try:
+                                        entry['world'] = parse_world_header(chunk).to_dict()
+                                    except ValueError:
+                                        pass
+                            entry['sha256'] = whole.hexdigest()
+                        stats['chunks'] += len(entry['chunks'])
+                    else:
+                        continue # Devices, fifos: nothing to back up here
+                    files.append(entry)
+            while in_flight:
+                stats['stored_bytes'] += in_flight.popleft().result()
+        finally:
+            pool.shutdown(wait=True)
+
+        manifest = {
+            'name': f"terraria-{ct_id}-{time.strftime('%Y%m%dT%H%M%S')}",
+            'ct_id': str(ct_id),
+            'created': int(time.time()),
+            'mode': mode,
+            'duration': round(time.monotonic() - started, 2),
+            'stats': dict(stats),
+            'files': files,
+        }
+        self.save(manifest)
+        return manifest
+
+    # --- Retention ---
+
+    def gc(self, ct_id=None, keep=None):
+        """Drops all but the newest `keep` snapshots of `ct_id`, then unreferenced chunks.
+
+        Returns (snapshots_removed, chunks_removed, bytes_freed).
+        """
+        removed = 0
+        if ct_id is not None and keep is not None:
+            for entry in self.catalog.expired(keep, kind='snapshot', ct_id=ct_id):
+                self.drop(entry.name)
+                removed += 1
+
+        live = set()
+        for name in self.snapshots():
+            for entry in self.load(name)['files']:
+                live.update(entry.get('chunks', ()))
+
+        chunks_removed = freed = 0
+        for sub in os.listdir(self.chunk_dir):
+            subdir = os.path.join(self.chunk_dir, sub)
+            for digest in os.listdir(subdir):
+                if digest in live:
+                    continue
+                path = os.path.join(subdir, digest)
+                # Includes leftovers of interrupted writes (*.tmp)
+                freed += os.path.getsize(path)
+                os.remove(path)
+                chunks_removed += 1
+        return removed, chunks_removed, freed
+
+    # --- Restore ---
+
+    def write_tar(self, entries, out, workers=None):
+        """Writes manifest entries as an uncompressed tar stream on `out`.
+
+        Chunks are read, verified and decompressed ahead of the writer on a
+        thread pool, so the stream into the container never waits on them.
+        """
+        workers = workers or os.cpu_count() or 2
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool, \
+                tarfile.open(fileobj=out, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+            for entry in entries:
+                info = tarfile.TarInfo(entry['path'].lstrip('/'))
+                info.mode = entry['mode']
+                # Owner names and ids go in the header: tar (running as root in the
+                # container) applies them as it extracts each file.
+                info.uid, info.gid = entry['uid'], entry['gid']
+                info.uname, info.gname = entry['uname'], entry['gname']
+                info.mtime = entry['mtime']
+                if entry['type'] == 'dir':
+                    info.type = tarfile.DIRTYPE
+                    tar.addfile(info)
+                elif entry['type'] in ('symlink', 'hardlink'):
+                    info.type = tarfile.SYMTYPE if entry['type'] == 'symlink' else tarfile.LNKTYPE
+                    info.linkname = entry['linkname']
+                    if entry['type'] == 'hardlink':
+                        info.linkname = info.linkname.lstrip('/')
+                    tar.addfile(info)
+                else:
+                    info.size = entry['size']
+                    tar.addfile(info, _ChunkReader(self, entry['chunks'], pool, ahead=2 * workers))
+
+
+def select_entries(manifest, patterns):
+    """Entries matching any pattern, plus the directories above them.
+
+    A pattern containing '/' matches full paths (fnmatch, or everything below a
+    matching directory); otherwise it matches file names, and a bare world name
+    also matches "<name>.wld". Without patterns the whole snapshot is selected.
+    """
+    files = manifest['files']
+    if not patterns:
+        return files
+
+    def matches(path):
+        name = os.path.basename(path)
+        for pattern in patterns:
+            if '/' in pattern:
+                pattern = '/' + pattern.strip('/')
+                if fnmatch.fnmatchcase(path, pattern) or path.startswith(pattern + '/'):
+                    return True
+            elif fnmatch.fnmatchcase(name, pattern) or name == pattern + ".wld":
+                return True
+        return False
+
+    wanted = {e['path'] for e in files if matches(e['path'])}
+    # Hard links need their target in the same stream
+    wanted.update(e['linkname'] for e in files if e['type'] == 'hardlink' and e['path'] in wanted)
+    # Parent directories carry their recorded owner and mode too
+    for path in list(wanted):
+        parent = os.path.dirname(path)
+        while parent not in ('/', '') and parent not in wanted:
+            wanted.add(parent)
+            parent = os.path.dirname(parent)
+    return [e for e in files if e['path'] in wanted]
+
+
+class _ChunkReader:
+    """File-like object over a list of chunks, for tarfile.addfile().
+
+    Keeps up to `ahead` chunk reads in flight on `pool`.
+    """
+
+    def __init__(self, repo, digests, pool, ahead=4):
+        self.repo = repo
+        self.digests = collections.deque(digests)
+        self.pool = pool
+        self.ahead = ahead
+        self.pending = collections.deque()
+        self.buf = b""
+
+    def _fill(self):
+        while self.digests and len(self.pending) < self.ahead:
+            self.pending.append(self.pool.submit(self.repo.read_chunk, self.digests.popleft()))
+
+    def read(self, size=-1):
+        self._fill()
+        while self.pending and (size < 0 or len(self.buf) < size):
+            self.buf += self.pending.popleft().result()
+            self._fill()
+        if size < 0:
+            size = len(self.buf)
+        data, self.buf = self.buf[:size], self.buf[size:]
+        return data
+
+
+def human(n):
+    for unit in ("B", "K", "M", "G"):
+        if abs(n) < 1024:
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}T"
+
+
+class HotBackupUnavailable(Exception):
+    pass
+
+
+async def _pct(ct_id, *argv, timeout=30):
+    proc = await asyncio.create_subprocess_exec(
+        'pct', 'exec', ct_id, '--', *argv,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+    try:
+        return await asyncio.wait_for(proc.wait(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return -1
+
+
+async def stage_worlds(ct_id, timeout=SAVE_TIMEOUT):
+    """Saves the running world and stages a verified copy of it at STAGE_DIR.
+
+    Returns the live Worlds directory the copy stands in for, or None when the
+    server is not running (its files are not changing, so nothing is staged).
+    Raises HotBackupUnavailable if the save or the copy cannot be confirmed.
+    """
+    if await _pct(ct_id, 'tmux', 'has-session', '-t', 'terraria') != 0:
+        return None
+
+    async def send_save():
+        rc = await _pct(ct_id, 'tmux', 'send-keys', '-t', 'terraria', 'save', 'Enter')
+        return "" if rc == 0 else f"tmux send-keys failed with exit code {rc}"
+
+    channel = ExecChannel(ct_id)
+    try:
+        try:
+            files, _ = await channel.probe([CONFIG_FILE])
+        except ExecUnavailable as e:
+            raise HotBackupUnavailable(f"exec channel unavailable: {e}")
+        src = worlds_dir(parse_config(files.get(CONFIG_FILE)))
+
+        error, lines = await capture_output(ChannelLogSource(channel, LOG_FILE), send_save,
+                                            until=is_save_completed, quiet=timeout, idle=timeout,
+                                            timeout=timeout)
+        if error or not any(is_save_completed(line) for line in lines):
+            raise HotBackupUnavailable(error or f"save not confirmed in the log within {timeout}s")
+
+        rc, out, err = await channel.run(snapshot_script(src, STAGE_DIR), timeout=timeout)
+        if rc != 0:
+            raise HotBackupUnavailable(err.strip() or f"world copy failed with exit code {rc}")
+        worlds, kib = (out.split() + ["?", "?"])[:2]
+        print(f"Staged {worlds} verified world file(s) from {src} ({kib} KiB)", file=sys.stderr)
+        return src
+    finally:
+        await channel.close()
+
+
+def cmd_backup(args):
+    repo = Repository(args.repo)
+    paths, options, rename, mode = list(args.paths), [], None, 'cold'
+    if args.hot:
+        # The exec channel reports progress on stdout, which carries the snapshot name
+        with contextlib.redirect_stdout(sys.stderr):
+            try:
+                src = asyncio.run(stage_worlds(args.ct_id))
+            except HotBackupUnavailable as e:
+                raise SystemExit(f"Hot backup unavailable for CT {args.ct_id}: {e}")
+        mode = 'offline'
+        if src is not None:
+            # Archive the staged copy in place of the live Worlds directory
+            paths.append(STAGE_DIR)
+            options.append(f"--exclude={src}")
+            rename = {STAGE_DIR: src}
+            mode = 'hot'
+
+    proc = subprocess.Popen(['pct', 'exec', args.ct_id, '--', 'tar', '-cf', '-', *options, *paths],
+                            stdout=subprocess.PIPE)
+    try:
+        manifest = repo.backup(args.ct_id, proc.stdout, workers=args.workers, rename=rename, mode=mode)
+    finally:
+        proc.stdout.close()
+        rc = proc.wait()
+        if mode == 'hot':
+            subprocess.run(['pct', 'exec', args.ct_id, '--', 'rm', '-rf', STAGE_DIR],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if rc not in (0, 1): # GNU tar exits 1 when a file changed while being read
+        repo.drop(manifest['name'])
+        raise SystemExit(f"tar in CT {args.ct_id} failed with exit code {rc}")
+
+    stats = manifest['stats']
+    print(f"Snapshot {manifest['name']}: {human(stats.get('logical_bytes', 0))} in {len(manifest['files'])} entries, "
+          f"{stats.get('chunks_new', 0)} new chunks ({human(stats.get('stored_bytes', 0))} stored), "
+          f"{stats.get('files_reused', 0)} unchanged files, {manifest['duration']}s ({mode})", file=sys.stderr)
+    if args.keep is not None:
+        removed, chunks, freed = repo.gc(args.ct_id, args.keep)
+        if removed or chunks:
+            print(f"Rotated {removed} snapshot(s), freed {chunks} chunk(s) / {human(freed)}", file=sys.stderr)
+    print(manifest['name'])
+
+
+def parse_time(text):
+    """Unix time from 'YYYY-mm-dd[THH:MM[:SS]]' (local time), or a plain unix time."""
+    if text.isdigit():
+        return int(text)
+    return int(datetime.datetime.fromisoformat(text).timestamp())
+
+
+def cmd_list(args):
+    repo = Repository(args.repo)
+    for e in repo.catalog.list(kind='snapshot', ct_id=args.ct):
+        ratio = f"{e.ratio:.1f}x" if e.ratio else "-"
+        print(f"{e.name}  {human(e.size):>8}  +{human(e.stored):<8} {ratio:>8}  {e.mode:<7}  {','.join(e.worlds)}")
+
+
+def cmd_find(args):
+    try:
+        before = parse_time(args.before) if args.before else None
+    except ValueError:
+        raise SystemExit(f"Invalid time: {args.before}")
+    entry = Repository(args.repo).catalog.latest(kind='snapshot', ct_id=args.ct, before=before)
+    if entry is None:
+        raise SystemExit(f"No snapshot of CT {args.ct}" + (f" at or before {args.before}" if before else ""))
+    print(entry.name)
+
+
+def cmd_gc(args):
+    removed, chunks, freed = Repository(args.repo).gc(args.ct, args.keep)
+    print(f"Removed {removed} snapshot(s), {chunks} chunk(s), freed {human(freed)}")
+
+
+def verify_in_container(ct_id, entries):
+    """Re-hashes restored files inside the container. Returns the paths that differ."""
+    expected = [(e['sha256'], e['path']) for e in entries if e['type'] == 'file' and 'sha256' in e]
+    if not expected:
+        return []
+    listing = "".join(f"{digest}  {path}\n" for digest, path in expected)
+    proc = subprocess.run(['pct', 'exec', ct_id, '--', 'sha256sum', '-c', '-'],
+                          input=listing.encode(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    ok = {line[:-len(": OK")] for line in proc.stdout.decode(errors='replace').splitlines()
+          if line.endswith(": OK")}
+    return [path for _, path in expected if path not in ok]
+
+
+def cmd_restore(args):
+    started = time.monotonic()
+    repo = Repository(args.repo)
+    entry = repo.catalog.get(args.snapshot)
+    if entry is not None and entry.checksum:
+        with open(repo.snapshot_path(args.snapshot), 'rb') as f:
+            if hashlib.sha256(f.read()).hexdigest() != entry.checksum:
+                raise SystemExit(f"Manifest of {args.snapshot} does not match its catalog checksum")
+    manifest = repo.load(args.snapshot)
+    entries = select_entries(manifest, args.only)
+    files = [e for e in entries if e['type'] == 'file']
+    if args.only and not files:
+        raise SystemExit(f"Nothing in {args.snapshot} matches: {' '.join(args.only)}")
+
+    proc = subprocess.Popen(['pct', 'exec', args.ct_id, '--', 'tar', '-xf', '-', '-C', '/'],
+                            stdin=subprocess.PIPE)
+    try:
+        repo.write_tar(entries, proc.stdin)
+    except BrokenPipeError:
+        pass # tar exited early; its exit code below says why
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+    if proc.wait() != 0:
+        raise SystemExit(f"tar in CT {args.ct_id} failed with exit code {proc.returncode}")
+
+    bad = verify_in_container(args.ct_id, files)
+    if bad:
+        raise SystemExit(f"Verification failed for {len(bad)} restored file(s): {', '.join(bad[:5])}")
+    size = sum(e['size'] for e in files)
+    print(f"Restored {len(files)} file(s), {human(size)} from {args.snapshot} to CT {args.ct_id}, "
+          f"verified, in {time.monotonic() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicated backup repository for Terraria containers.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('backup', help="snapshot a container into the repository")
+    p.add_argument('ct_id')
+    p.add_argument('repo')
+    p.add_argument('--keep', type=int, help="keep only the newest N snapshots of this container")
+    p.add_argument('--hot', action='store_true', help="save through the console and archive a staged copy, without stopping the server")
+    p.add_argument('--workers', type=int, help="compression threads (default: CPU count)")
+    p.add_argument('--paths', nargs='+', default=list(DEFAULT_PATHS))
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser('list', help="list snapshots")
+    p.add_argument('repo')
+    p.add_argument('--ct')
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser('find', help="print the newest snapshot (at or before a time)")
+    p.add_argument('repo')
+    p.add_argument('--ct', required=True)
+    p.add_argument('--before', help="YYYY-mm-dd[THH:MM] or unix time")
+    p.set_defaults(func=cmd_find)
+
+    p = sub.add_parser('gc', help="apply retention and delete unreferenced chunks")
+    p.add_argument('repo')
+    p.add_argument('--ct')
+    p.add_argument('--keep', type=int)
+    p.set_defaults(func=cmd_gc)
+
+    p = sub.add_parser('restore', help="extract a snapshot into a container")
+    p.add_argument('repo')
+    p.add_argument('snapshot')
+    p.add_argument('ct_id')
+    p.add_argument('--only', action='append', metavar='WORLD_OR_PATH',
+                   help="restore only matching worlds/files (repeatable), e.g. --only MyWorld")
+    p.set_defaults(func=cmd_restore)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,42 +3,49 @@ set -euo pipefail
 
 # Enhanced Backup Script for Terraria Proxmox LXC
 # Backs up configuration, binaries, AND world files.
-
-CT_ID=${1:?Usage: $0 CT_ID [dest_dir]}
+#
+# Backups go into a deduplicated chunk repository (see backup_repo.py): each run
+# only stores the chunks that changed since the previous snapshot, and KEEP is
+# applied by dropping old snapshots and garbage-collecting unreferenced chunks.
+#
+# BACKUP_MODE=hot (default) keeps the server running: the world is saved through
+# the console, a checksum-verified copy of it is archived instead of the live
+# files, and the service is only stopped if that cannot be confirmed.
+# BACKUP_MODE=cold always stops the service for the archive run.
+
+CT_ID=${1:?Usage: $0 CT_ID [dest_dir] [keep]}
 DEST_DIR=${2:-./backups}
 KEEP=${3:-7}
+BACKUP_MODE=${BACKUP_MODE:-hot}
 
 START_TIME=$(date +%s)
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
 # Helper for notifications
 notify_backup() {
   local status="$1"
   local title="$2"
   local msg="$3"
-  local file_path="${4:-}"
+  local snapshot="${4:-}"
   
-  local script_dir
-  script_dir="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
-  if [ -x "$script_dir/discord_webhook.sh" ]; then
+  if [ -x "$SCRIPT_DIR/notify.sh" ]; then
     local args=(--title "$title" --desc "$msg" --status "$status")
     
-    if [ "$status" == "success" ] && [ -n "$file_path" ]; then
+    if [ "$status" == "success" ] && [ -n "$snapshot" ]; then
       local size
-      local filename
       local end_time
       local duration
 
-      size=$(du -h "$file_path" | cut -f1)
-      filename=$(basename "$file_path")
+      size=$(du -sh "$DEST_DIR" | cut -f1)
       end_time=$(date +%s)
       duration=$((end_time - START_TIME))
       
-      args+=(--field "File:$filename")
-      args+=(--field "Size:$size")
+      args+=(--field "Snapshot:$snapshot")
+      args+=(--field "Repository Size:$size")
       args+=(--field "Duration:${duration}s")
     fi
     
-    "$script_dir/discord_webhook.sh" "${args[@]}" || true
+    "$SCRIPT_DIR/notify.sh" "${args[@]}" || true
   fi
 }
 
@@ -46,8 +53,6 @@ notify_backup() {
 trap 'notify_backup "error" "Backup Failed" "Backup for CT $CT_ID encountered an unexpected error."; exit 1' ERR
 
 mkdir -p "$DEST_DIR"
-TIMESTAMP=$(date +%Y%m%dT%H%M%S)
-OUT="$DEST_DIR/terraria-${CT_ID}-${TIMESTAMP}.tar.gz"
 
 if ! command -v pct >/dev/null 2>&1; then
   echo "pct not found; run this on the Proxmox host" >&2
@@ -57,36 +62,38 @@ fi
 echo "--- Starting Backup for Container $CT_ID ---"
 # notify_backup "info" "Backup Started" "Initiating backup process for CT $CT_ID..."
 
-# 1. Stop Service (to ensure world consistency)
-echo "Stopping Terraria service..."
-pct exec "$CT_ID" -- bash -c "systemctl stop terraria || supervisorctl stop terraria || rc-service terraria stop || true"
-
-# 2. Create Archive
-# We backup /opt/terraria (binaries/config) and /home/terraria (worlds/saves)
-echo "Archiving /opt/terraria and /home/terraria..."
-pct exec "$CT_ID" -- tar -czf - /opt/terraria /home/terraria > "$OUT"
-
-# 3. Start Service
-echo "Restarting Terraria service..."
-pct exec "$CT_ID" -- bash -c "systemctl start terraria || supervisorctl start terraria || rc-service terraria start || true"
-
-echo "Backup saved to: $OUT"
-
-# 4. Rotate Backups
-mapfile -t BACKUPS < <(
-  find "$DEST_DIR" -maxdepth 1 -type f -name "terraria-${CT_ID}-*.tar.gz" -printf '%T@ %p\n' \
-    | sort -rn \
-    | cut -d' ' -f2-
-)
-
-COUNT=${#BACKUPS[@]}
-if [ "$COUNT" -gt "$KEEP" ]; then
-  echo "Rotating backups (keeping $KEEP)..."
-  for old_backup in "${BACKUPS[@]:KEEP}"; do
-    rm -f -- "$old_backup"
-  done
+# 1. Hot snapshot: save in-game, archive a verified copy, no downtime
+SNAPSHOT=""
+if [ "$BACKUP_MODE" = "hot" ]; then
+  echo "Saving world and archiving a verified copy (server stays online)..."
+  if ! SNAPSHOT=$(python3 "$SCRIPT_DIR/backup_repo.py" backup "$CT_ID" "$DEST_DIR" --hot); then
+    echo "Hot backup not possible; falling back to stopping the service."
+    SNAPSHOT=""
+  fi
+fi
+
+if [ -z "$SNAPSHOT" ]; then
+  # 2. Stop Service (to ensure world consistency)
+  echo "Stopping Terraria service..."
+  pct exec "$CT_ID" -- bash -c "systemctl stop terraria || supervisorctl stop terraria || rc-service terraria stop || true"
+
+  # 3. Snapshot into the chunk repository
+  # We backup /opt/terraria (binaries/config) and /home/terraria (worlds/saves).
+  # Unchanged files are not re-chunked and unchanged chunks are not stored again.
+  echo "Archiving /opt/terraria and /home/terraria..."
+  SNAPSHOT=$(python3 "$SCRIPT_DIR/backup_repo.py" backup "$CT_ID" "$DEST_DIR")
+
+  # 4. Start Service
+  echo "Restarting Terraria service..."
+  pct exec "$CT_ID" -- bash -c "systemctl start terraria || supervisorctl start terraria || rc-service terraria start || true"
 fi
 
-notify_backup "success" "Backup Complete" "The world backup was successfully completed and rotated." "$OUT"
+echo "Backup saved to: $DEST_DIR (snapshot $SNAPSHOT)"
+
+# 5. Rotate Backups (drop old snapshots, then chunks nothing references anymore)
+echo "Rotating backups (keeping $KEEP)..."
+python3 "$SCRIPT_DIR/backup_repo.py" gc "$DEST_DIR" --ct "$CT_ID" --keep "$KEEP"
+
+notify_backup "success" "Backup Complete" "The world backup was successfully completed and rotated." "$SNAPSHOT"
 
 echo "--- Backup Complete ---"
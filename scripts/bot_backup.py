@@ -0,0 +1,57 @@
+"""Hot (online) world snapshots, shared by the bot's !backup and backup_repo.py.
+
+Instead of stopping the server for the whole archive run, a hot backup
+  1. types `save` into the console and waits for the save-completed log line,
+  2. copies the Worlds directory to a staging directory (a reflink where the
+     filesystem supports it, so the copy is instant),
+  3. verifies every .wld copy against the SHA-256 of the live file, retrying
+     when an autosave raced the copy,
+and only then compresses the staged copy, while the server keeps running.
+"""
+import os
+import shlex
+
+from bot_events import LogClassifier
+
+WORLDS_DIR = "/home/terraria/.local/share/Terraria/Worlds"
+STAGE_DIR = "/var/tmp/terraria-hot-backup"
+SAVE_TIMEOUT = 120 # Large worlds can take a while to save
+COPY_ATTEMPTS = 3
+
+_EVENTS = LogClassifier()
+
+
+def is_save_completed(line):
+    event = _EVENTS.classify(line)
+    return event is not None and event.kind == 'save_completed'
+
+
+def worlds_dir(config):
+    """Directory holding the configured world (serverconfig.txt `world=`)."""
+    return os.path.dirname(config.world) if config.world else WORLDS_DIR
+
+
+def snapshot_script(src, stage=STAGE_DIR, attempts=COPY_ATTEMPTS):
+    """Shell script copying `src` to `stage` with every .wld verified by checksum.
+
+    Prints "<worlds> <KiB>" on success. Exits 2 if `src` is missing and 1 if the
+    world files kept changing during every attempt.
+    """
+    src, stage, sums = shlex.quote(src), shlex.quote(stage), shlex.quote(f"{stage}.sha256")
+    return f"""
+[ -d {src} ] || {{ echo "World directory not found: "{src} >&2; exit 2; }}
+for _ in $(seq {attempts}); do
+  rm -rf {stage}
+  cp -a --reflink=auto {src} {stage} 2>/dev/null || {{ rm -rf {stage}; cp -a {src} {stage} || exit 1; }}
+  (cd {src} && find . -maxdepth 1 -type f -name '*.wld' -exec sha256sum {{}} +) > {sums}
+  if [ ! -s {sums} ] || (cd {stage} && sha256sum -c {sums} >/dev/null 2>&1); then
+    echo "$(wc -l < {sums}) $(du -sk {stage} | cut -f1)"
+    rm -f {sums}
+    exit 0
+  fi
+  sleep 2
+done
+rm -rf {stage} {sums}
+echo "World files kept changing during the copy" >&2
+exit 1
+"""
@@ -0,0 +1,135 @@
+"""Backup catalog: one SQLite row per backup, written when the backup is made.
+
+Listing, totals, retention and restore selection are index queries instead of
+`du`/`ls`/`find | sort` over the backup directory, so they stay instant no
+matter how many backups are kept. Rows record what a backup holds (worlds,
+logical size) as well as what it costs on disk (stored bytes, checksum).
+
+Used for the chunk repository's snapshots (backup_repo.py, kind 'snapshot')
+and for the bot's !backup archives (kind 'archive').
+"""
+import json
+import os
+import sqlite3
+from dataclasses import dataclass, field
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    name     TEXT PRIMARY KEY,
+    kind     TEXT NOT NULL,
+    ct_id    TEXT NOT NULL DEFAULT '',
+    created  INTEGER NOT NULL,
+    path     TEXT NOT NULL DEFAULT '',
+    size     INTEGER NOT NULL DEFAULT 0,
+    stored   INTEGER NOT NULL DEFAULT 0,
+    checksum TEXT NOT NULL DEFAULT '',
+    worlds   TEXT NOT NULL DEFAULT '[]',
+    mode     TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS backups_by_time ON backups (kind, ct_id, created);
+"""
+COLUMNS = ('name', 'kind', 'ct_id', 'created', 'path', 'size', 'stored', 'checksum', 'worlds', 'mode')
+
+
+@dataclass
+class BackupEntry:
+    """One backup. `size` is the data backed up, `stored` what it takes on disk."""
+    name: str
+    kind: str
+    created: int
+    ct_id: str = ""
+    path: str = ""
+    size: int = 0
+    stored: int = 0
+    checksum: str = ""
+    worlds: list = field(default_factory=list)
+    mode: str = ""
+
+    @property
+    def ratio(self):
+        """Compression ratio (data backed up per byte stored); None if unknown."""
+        return self.size / self.stored if self.stored else None
+
+    def _row(self):
+        return (self.name, self.kind, str(self.ct_id or ""), int(self.created), self.path,
+                int(self.size), int(self.stored), self.checksum, json.dumps(self.worlds), self.mode)
+
+    @classmethod
+    def _from_row(cls, row):
+        values = dict(zip(COLUMNS, row))
+        values['worlds'] = json.loads(values['worlds'] or "[]")
+        return cls(**values)
+
+
+def world_names(paths):
+    """World names (file name without .wld) among `paths`."""
+    return sorted({os.path.basename(p)[:-4] for p in paths if p.endswith(".wld")})
+
+
+class BackupCatalog:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def _where(self, kind=None, ct_id=None, before=None):
+        clauses, args = [], []
+        if kind is not None:
+            clauses.append("kind = ?")
+            args.append(kind)
+        if ct_id is not None:
+            clauses.append("ct_id = ?")
+            args.append(str(ct_id))
+        if before is not None:
+            clauses.append("created <= ?")
+            args.append(int(before))
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+    def add(self, entry):
+        with self.db:
+            self.db.execute(f"INSERT OR REPLACE INTO backups ({', '.join(COLUMNS)}) "
+                            f"VALUES ({', '.join('?' * len(COLUMNS))})", entry._row())
+
+    def remove(self, names):
+        with self.db:
+            self.db.executemany("DELETE FROM backups WHERE name = ?", [(n,) for n in names])
+
+    def get(self, name):
+        row = self.db.execute(f"SELECT {', '.join(COLUMNS)} FROM backups WHERE name = ?", (name,)).fetchone()
+        return BackupEntry._from_row(row) if row else None
+
+    def list(self, kind=None, ct_id=None, limit=None):
+        """Backups, newest first."""
+        where, args = self._where(kind, ct_id)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM backups{where} ORDER BY created DESC, name DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        return [BackupEntry._from_row(row) for row in self.db.execute(sql, args)]
+
+    def latest(self, kind=None, ct_id=None, before=None):
+        """Newest backup (at or before `before`, a unix time), or None."""
+        where, args = self._where(kind, ct_id, before)
+        row = self.db.execute(f"SELECT {', '.join(COLUMNS)} FROM backups{where} "
+                              "ORDER BY created DESC, name DESC LIMIT 1", args).fetchone()
+        return BackupEntry._from_row(row) if row else None
+
+    def expired(self, keep, kind=None, ct_id=None):
+        """Backups beyond the newest `keep`, i.e. the ones retention should delete."""
+        where, args = self._where(kind, ct_id)
+        rows = self.db.execute(f"SELECT {', '.join(COLUMNS)} FROM backups{where} "
+                               "ORDER BY created DESC, name DESC LIMIT -1 OFFSET ?",
+                               args + [max(int(keep), 0)])
+        return [BackupEntry._from_row(row) for row in rows]
+
+    def totals(self, kind=None, ct_id=None):
+        """(count, size, stored) over the matching backups."""
+        where, args = self._where(kind, ct_id)
+        count, size, stored = self.db.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored), 0) FROM backups{where}", args).fetchone()
+        return count, size, stored
+
+    def close(self):
+        self.db.close()
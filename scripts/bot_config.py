@@ -0,0 +1,149 @@
+"""Parsed, change-invalidated view of serverconfig.txt.
+
+The file only changes when someone edits it or re-runs install.sh, so the
+parsed result is cached and reused until the file's signature (mtime, size,
+inode) changes. In Host Mode the signature check runs inside the container
+over the exec channel and the text is only transferred when it changed.
+"""
+import asyncio
+import os
+from dataclasses import dataclass, field
+
+from bot_exec import ExecUnavailable
+
+DEFAULT_PORT = 7777
+
+
+def _int(value, default=None):
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return default
+
+
+@dataclass
+class ServerConfig:
+    """Typed serverconfig.txt. Every key is kept in `raw`; common ones are typed."""
+    world: str = ""
+    worldpath: str = ""
+    worldname: str = ""
+    port: int = DEFAULT_PORT
+    maxplayers: int = 8
+    autocreate: int = None
+    difficulty: int = None
+    seed: str = ""
+    password: str = ""
+    motd: str = ""
+    banlist: str = ""
+    language: str = ""
+    secure: bool = False
+    upnp: bool = False
+    priority: int = None
+    npcstream: int = None
+    raw: dict = field(default_factory=dict)
+
+    @property
+    def world_name(self):
+        """World name as shown to users: the .wld file name without extension."""
+        if not self.world:
+            return "Unknown"
+        name = os.path.basename(self.world)
+        return name[:-4] if name.endswith(".wld") else name
+
+    def get(self, key, default=None):
+        return self.raw.get(key, default)
+
+
+def parse_config(text):
+    raw = {}
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        # launch.sh tolerates whitespace around '=', so do we
+        raw[key.strip().lower()] = value.strip()
+
+    return ServerConfig(
+        world=raw.get('world', ""),
+        worldpath=raw.get('worldpath', ""),
+        worldname=raw.get('worldname', ""),
+        port=_int(raw.get('port'), DEFAULT_PORT),
+        maxplayers=_int(raw.get('maxplayers'), 8),
+        autocreate=_int(raw.get('autocreate')),
+        difficulty=_int(raw.get('difficulty')),
+        seed=raw.get('seed', ""),
+        password=raw.get('password', ""),
+        motd=raw.get('motd', ""),
+        banlist=raw.get('banlist', ""),
+        language=raw.get('language', ""),
+        secure=raw.get('secure') == '1',
+        upnp=raw.get('upnp') == '1',
+        priority=_int(raw.get('priority')),
+        npcstream=_int(raw.get('npcstream')),
+        raw=raw,
+    )
+
+
+def load_config(path):
+    """Synchronous one-shot parse, for scripts that don't need the cache."""
+    with open(path, errors='replace') as f:
+        return parse_config(f.read())
+
+
+class ConfigCache:
+    """Caches the parsed config until the file signature changes.
+
+    Reads locally when `channel` is None, otherwise through the exec channel;
+    `fallback` (an async shell runner) is used with plain `cat` if the channel
+    is unavailable. A missing file yields a default ServerConfig.
+    """
+
+    def __init__(self, path, channel=None, fallback=None):
+        self.path = path
+        self.channel = channel
+        self.fallback = fallback
+        self._sig = None
+        self._config = None
+
+    def _store(self, sig, text):
+        self._sig = sig
+        self._config = parse_config(text)
+        return self._config
+
+    def _get_local(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._sig = None
+            return ServerConfig()
+        sig = [st.st_mtime_ns, st.st_size, st.st_ino]
+        if sig == self._sig and self._config is not None:
+            return self._config
+        with open(self.path, errors='replace') as f:
+            return self._store(sig, f.read())
+
+    async def get(self):
+        if self.channel is None:
+            return self._get_local()
+        try:
+            sig, text = await self.channel.read_if_changed(self.path, since=self._sig)
+        except (ExecUnavailable, ConnectionError, asyncio.TimeoutError):
+            if self.fallback is None:
+                raise
+            # No signature available: parse fresh, don't trust the cache
+            text = await self.fallback(f"cat {self.path}")
+            if not text or "No such file" in text:
+                return ServerConfig()
+            self._sig = None
+            return parse_config(text)
+        except OSError:
+            # Missing or unreadable inside the container
+            self._sig = None
+            return ServerConfig()
+        if text is None and self._config is not None:
+            return self._config
+        return self._store(sig, text or "")
+
+    def invalidate(self):
+        self._sig = None
@@ -0,0 +1,272 @@
+"""Ordered console writer for the Terraria tmux session.
+
+Instead of forking `tmux send-keys` for every chat line or command, one
+`tmux -C` (control mode) client stays attached to the server's session.
+Lines are queued, written in order (a burst goes out in a single write) and
+each one is acknowledged by tmux's %begin/%end reply, so callers know it was
+typed. Per-user rate limits keep one chatty Discord user from flooding the
+console. If the control client cannot be started, `fallback(text)` (the old
+send-keys path) is used so commands still go through.
+"""
+import asyncio
+import time
+from collections import deque
+
+
+class ConsoleUnavailable(Exception):
+    """The control-mode client could not be started."""
+
+
+class ConsoleRateLimited(Exception):
+    """The user sent too many lines in the rate window."""
+
+
+class ConsoleBusy(Exception):
+    """The queue of lines waiting for tmux is full."""
+
+
+class ConsoleError(Exception):
+    """tmux (or the fallback) rejected the line."""
+
+
+def tmux_quote(text):
+    # Single quotes are literal in tmux's command parser; splice in "'" for quotes
+    return "'" + text.replace("'", "'\"'\"'") + "'"
+
+
+class ConsoleWriter:
+    """Queues console lines for the `target` tmux session.
+
+    `argv` starts the control client, e.g. ['tmux', '-C', 'attach-session',
+    '-t', 'terraria'], prefixed with `pct exec <CT> --` in Host Mode.
+    `rate` is (lines, seconds) allowed per user; lines without a user are
+    never limited.
+    """
+
+    def __init__(self, argv, target='terraria', fallback=None, rate=(5, 10.0), batch_max=20,
+                 ack_timeout=5, spawn_timeout=5, retry_delay=5, queue_max=200):
+        self.argv = list(argv)
+        self.target = target
+        self.fallback = fallback
+        self.rate = rate
+        self.batch_max = batch_max
+        self.ack_timeout = ack_timeout
+        self.spawn_timeout = spawn_timeout
+        self.retry_delay = retry_delay
+        self.queue_max = queue_max
+        self._proc = None
+        self._reader = None
+        self._writer_task = None
+        self._queue = None
+        self._acks = deque() # [future, blocks still expected, error text] per written line
+        self._block = None # Output lines of the %begin block being read
+        self._down_until = 0.0
+        self._sent = {} # user -> deque of send times
+        self.lines_sent = 0
+        self.batches_sent = 0
+        self.fallback_used = 0
+
+    # --- Public API ---
+
+    def submit(self, text, user=None):
+        """Queue a line without waiting; returns a future resolved on ack.
+        Raises ConsoleBusy while `queue_max` lines are still waiting for tmux."""
+        if any(c in text for c in "\r\n"):
+            raise ValueError("console lines cannot contain newlines")
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.queue_max)
+            self._writer_task = asyncio.create_task(self._write_loop())
+        if self._queue.full():
+            # Checked before the rate limit so a rejected line doesn't use up the user's quota
+            raise ConsoleBusy(f"{self.queue_max} lines already waiting for the console")
+        self._check_rate(user)
+        fut = asyncio.get_running_loop().create_future()
+        # Fire-and-forget callers may never look at the result
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._queue.put_nowait((text, fut))
+        return fut
+
+    async def send(self, text, user=None):
+        """Queue a line and wait until tmux has typed it (raises ConsoleError)."""
+        await self.submit(text, user)
+
+    async def close(self):
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            self._writer_task = None
+        self._queue = None
+        await self._kill()
+
+    def _check_rate(self, user):
+        if user is None or not self.rate:
+            return
+        limit, window = self.rate
+        now = time.monotonic()
+        times = self._sent.setdefault(user, deque())
+        while times and now - times[0] > window:
+            times.popleft()
+        if len(times) >= limit:
+            raise ConsoleRateLimited(f"max {limit} lines per {window:g}s")
+        times.append(now)
+
+    # --- Control client ---
+
+    async def _kill(self):
+        proc, self._proc = self._proc, None
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        if proc is not None and proc.returncode is None:
+            try:
+                proc.stdin.close()
+                await asyncio.wait_for(proc.wait(), 2)
+            except Exception:
+                proc.kill()
+        self._fail_pending(ConnectionError("tmux control client closed"))
+
+    def _fail_pending(self, exc):
+        while self._acks:
+            fut = self._acks.popleft()[0]
+            if fut is not None and not fut.done():
+                fut.set_exception(exc)
+
+    async def _spawn(self):
+        proc = await asyncio.create_subprocess_exec(
+            *self.argv,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        # Attached once tmux reports the session; a failed attach ends in %error/%exit
+        output = []
+        try:
+            while True:
+                line = await asyncio.wait_for(proc.stdout.readline(), self.spawn_timeout)
+                if not line:
+                    break
+                line = line.decode(errors='replace').rstrip('\n')
+                if line.startswith('%session-changed'):
+                    self._proc = proc
+                    self._reader = asyncio.create_task(self._read_loop(proc))
+                    # Don't stream pane output to us (tmux >= 3.2; older versions ignore it)
+                    self._acks.append([None, 1, None])
+                    proc.stdin.write(b"refresh-client -f no-output\n")
+                    return
+                if line.startswith('%error') or line.startswith('%exit'):
+                    break
+                if not line.startswith('%'):
+                    output.append(line)
+        except asyncio.TimeoutError:
+            output.append("timed out waiting for tmux")
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+        raise ConsoleUnavailable("; ".join(output) or f"tmux exited with {proc.returncode}")
+
+    async def _ensure(self):
+        if self._proc is not None and self._proc.returncode is None:
+            return
+        if self._proc is not None:
+            await self._kill()
+        if time.monotonic() < self._down_until:
+            raise ConsoleUnavailable("tmux control client recently failed")
+        try:
+            await self._spawn()
+        except (OSError, ConsoleUnavailable) as e:
+            self._down_until = time.monotonic() + self.retry_delay
+            print(f"Console control mode unavailable, using send-keys: {e}")
+            raise ConsoleUnavailable(str(e))
+
+    async def _read_loop(self, proc):
+        try:
+            while True:
+                line = await proc.stdout.readline()
+                if not line:
+                    break
+                line = line.decode(errors='replace').rstrip('\n')
+                if line.startswith('%begin'):
+                    self._block = []
+                elif line.startswith('%end') or line.startswith('%error'):
+                    output, self._block = self._block or [], None
+                    # flags == 1: reply to a command we sent (not tmux's own)
+                    if not line.endswith(' 1') or not self._acks:
+                        continue
+                    ack = self._acks[0]
+                    if line.startswith('%error'):
+                        ack[2] = " ".join(output) or "tmux error"
+                    ack[1] -= 1
+                    if ack[1] == 0:
+                        self._acks.popleft()
+                        fut, _, error = ack
+                        if fut is not None and not fut.done():
+                            if error:
+                                fut.set_exception(ConsoleError(error))
+                            else:
+                                fut.set_result(None)
+                elif self._block is not None:
+                    self._block.append(line)
+                # Other notifications (%output, %window-*, %exit...) are ignored
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            print(f"Console reader error: {e}")
+        if self._proc is proc:
+            self._proc = None
+            self._reader = None
+        self._fail_pending(ConnectionError("tmux control client closed"))
+
+    # --- Writer ---
+
+    async def _write_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            # Under flood, everything already queued goes out in one write
+            while len(batch) < self.batch_max and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            batch = [(text, fut) for text, fut in batch if not fut.cancelled()]
+            try:
+                await self._ensure()
+            except ConsoleUnavailable as e:
+                await self._write_fallback(batch, e)
+                continue
+
+            target = tmux_quote(self.target)
+            payload = []
+            for text, fut in batch:
+                # Literal text ('--' so a leading '-' isn't a flag), then Enter: two replies
+                payload.append(f"send-keys -t {target} -l -- {tmux_quote(text)}\n")
+                payload.append(f"send-keys -t {target} Enter\n")
+                self._acks.append([fut, 2, None])
+            try:
+                self._proc.stdin.write("".join(payload).encode())
+                await self._proc.stdin.drain()
+            except Exception as e:
+                print(f"Console write failed: {e}")
+                await self._kill()
+                continue
+            self.lines_sent += len(batch)
+            self.batches_sent += 1
+            # Keep order and backpressure: wait for this batch's acks
+            try:
+                await asyncio.wait_for(asyncio.gather(*(fut for _, fut in batch), return_exceptions=True), self.ack_timeout)
+            except asyncio.TimeoutError:
+                print("Console ack timeout, reconnecting.")
+                await self._kill()
+
+    async def _write_fallback(self, batch, reason):
+        for text, fut in batch:
+            if self.fallback is None:
+                if not fut.done():
+                    fut.set_exception(ConsoleUnavailable(str(reason)))
+                continue
+            self.fallback_used += 1
+            try:
+                error = await self.fallback(text)
+            except Exception as e:
+                error = str(e)
+            if fut.done():
+                continue
+            if error:
+                fut.set_exception(ConsoleError(error))
+            else:
+                fut.set_result(None)
@@ -0,0 +1,137 @@
+"""Single-pass log event classifier.
+
+Event rules are declared in a table and compiled into one combined regex of
+their trigger literals, so each server_output.log line is scanned once
+instead of walking a chain of `in` checks and per-event re.search calls.
+Only when a trigger hits is that rule's own pattern run to extract fields.
+Matching lines become typed LogEvents dispatched to subscribed handlers.
+
+The leftmost trigger wins (ties go to table order). Chat triggers on a
+leading '<', so a player typing "X has joined." never produces a fake join.
+"""
+import re
+import time
+
+_IP_PREFIX = r'(?:\d+\.\d+\.\d+\.\d+:\d+\s+)?'
+
+# (kind, trigger, field pattern or None). Triggers are literals or flat
+# `a|b` alternations of literals (a leading '^' pins them to line start); the
+# field pattern is matched from the start of the line and its named groups
+# become LogEvent.fields.
+DEFAULT_RULES = [
+    ('chat', r'^<', r'<(?P<player>[^>]+)> (?P<message>.*)'),
+    ('join', r' has joined\.', _IP_PREFIX + r'(?P<player>.+) has joined\.'),
+    ('leave', r' has left\.', _IP_PREFIX + r'(?P<player>.+) has left\.'),
+    ('death', r' was slain by | fell | drowned | burned | died ',
+        r'(?P<player>.+?) (?:was slain by|fell|drowned|burned|died) '),
+    ('worldgen', r'% - ', r'.*?(?P<percent>\d+(?:\.\d+)?)% - (?P<step>.*)'),
+    ('save_completed', r'Backing up world file|Validating world save: 100%', None),
+    ('save_started', r'Saving world data', None),
+    ('server_started', r'Listening on port|Server started', r'.*?(?:Listening on port (?P<port>\d+)|Server started)'),
+    ('server_starting', r'Setting up', None),
+    ('server_stopped', r'Server shut down', None),
+    ('crash', r'Address already in use|OutOfMemory|System\.IO\.IOException|Unhandled Exception'
+              r'|LoadWorld|ReadAllBytes',
+        r'.*?(?P<reason>Address already in use|OutOfMemory|System\.IO\.IOException'
+        r'|Unhandled Exception|LoadWorld|ReadAllBytes)'),
+]
+
+
+class LogEvent:
+    """A classified log line. Fields are extracted lazily from the rule's match."""
+    __slots__ = ('kind', 'line', 'at', '_match', '_fields')
+
+    def __init__(self, kind, line, match=None, at=None):
+        self.kind = kind
+        self.line = line
+        self.at = time.time() if at is None else at
+        self._match = match
+        self._fields = None
+
+    @property
+    def fields(self):
+        if self._fields is None:
+            groups = self._match.groupdict() if self._match is not None else {}
+            self._fields = {k: v.strip() for k, v in groups.items() if v is not None}
+        return self._fields
+
+    def get(self, key, default=None):
+        return self.fields.get(key, default)
+
+    def __repr__(self):
+        return f"LogEvent(kind={self.kind!r}, fields={self.fields!r})"
+
+
+class LogClassifier:
+    """Compiles a rule table into one trigger scan and dispatches typed events."""
+
+    def __init__(self, rules=DEFAULT_RULES):
+        self.rules = []
+        self._trigger_res = []
+        prefix, anywhere = [], []
+        for kind, trigger, pattern in rules:
+            self.rules.append((kind, re.compile(pattern) if pattern else None))
+            self._trigger_res.append(re.compile(trigger))
+            # Line-start triggers are checked with one match() at position 0;
+            # the rest form a flat literal alternation that sre scans quickly.
+            (prefix if trigger.startswith('^') else anywhere).append(trigger)
+        self._prefix = re.compile("|".join(prefix)) if prefix else None
+        self._anywhere = re.compile("|".join(anywhere)) if anywhere else None
+        self._rule_for = {} # matched trigger text -> rule index
+        self._handlers = {}
+
+    def _rule_index(self, text):
+        # Plain (non-capturing) alternation is much faster than named groups,
+        # so the rule is recovered from the matched text, memoised.
+        idx = self._rule_for.get(text)
+        if idx is None:
+            idx = next(i for i, r in enumerate(self._trigger_res) if r.fullmatch(text))
+            if len(self._rule_for) < 4096:
+                self._rule_for[text] = idx
+        return idx
+
+    def _event(self, idx, line, at):
+        kind, pattern = self.rules[idx]
+        if pattern is None:
+            return LogEvent(kind, line, at=at)
+        fm = pattern.match(line)
+        return LogEvent(kind, line, fm, at) if fm is not None else None
+
+    def classify(self, line, at=None):
+        """The LogEvent for `line`, or None. `at` is when the line was written
+        (default: now), which matters for lines replayed from a backlog."""
+        if self._prefix is not None:
+            m = self._prefix.match(line)
+            if m is not None:
+                event = self._event(self._rule_index(m.group()), line, at)
+                if event is not None:
+                    return event
+        pos = 0
+        while self._anywhere is not None:
+            m = self._anywhere.search(line, pos)
+            if m is None:
+                return None
+            event = self._event(self._rule_index(m.group()), line, at)
+            if event is not None:
+                return event
+            # Trigger without a valid event (e.g. bare " has joined."): keep scanning
+            pos = m.start() + 1
+        return None
+
+    def subscribe(self, kind, handler):
+        """Register an async handler for an event kind ('*' receives every event)."""
+        self._handlers.setdefault(kind, []).append(handler)
+        return handler
+
+    def on(self, kind):
+        """Decorator form of subscribe()."""
+        return lambda handler: self.subscribe(kind, handler)
+
+    async def dispatch(self, line, *args, at=None):
+        """Classifies `line` and awaits its handlers as handler(*args, event)."""
+        event = self.classify(line, at)
+        if event is None:
+            return None
+        for handler in self._handlers.get(event.kind, []) + self._handlers.get('*', []):
+            await handler(*args, event)
+        return event
@@ -0,0 +1,400 @@
+"""Persistent exec channel into a Proxmox container.
+
+Instead of forking `pct exec <CT> -- bash -c ...` for every command, one
+long-lived `pct exec` runs a tiny Python agent inside the container. Requests
+and replies are newline-delimited JSON frames tagged with a request id, so
+several commands can be in flight at once over the same channel.
+"""
+import asyncio
+import base64
+import itertools
+import json
+import time
+
+# Agent executed inside the container (python3 -c). Reads one JSON request per
+# line from stdin, runs each in its own thread and writes tagged replies.
+AGENT_CODE = r'''
+import base64, bisect, json, os, subprocess, sys, threading
+lock = threading.Lock()
+def reply(msg):
+    data = json.dumps(msg) + "\n"
+    with lock:
+        sys.stdout.write(data)
+        sys.stdout.flush()
+def op_sh(req):
+    p = subprocess.run(["bash", "-c", req["cmd"]], stdin=subprocess.DEVNULL,
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                       timeout=req.get("timeout"))
+    return {"rc": p.returncode, "out": p.stdout.decode("utf-8", "replace"),
+            "err": p.stderr.decode("utf-8", "replace")}
+def op_probe(req):
+    # Read files and scan the process table without forking anything.
+    files = {}
+    for path in req.get("paths", []):
+        try:
+            with open(path, errors="replace") as f:
+                files[path] = f.read()
+        except OSError:
+            files[path] = None
+    pids = []
+    pattern = req.get("pattern")
+    for name in (os.listdir("/proc") if pattern else []):
+        if not name.isdigit() or int(name) == os.getpid():
+            continue
+        try:
+            with open("/proc/%s/cmdline" % name, "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode("utf-8", "replace")
+        except OSError:
+            continue
+        if pattern in cmdline:
+            pids.append(int(name))
+    for pid in (pids if req.get("procstat") else []):
+        path = "/proc/%d/stat" % pid
+        try:
+            with open(path) as f:
+                files[path] = f.read()
+        except OSError:
+            pass
+    for path in req.get("statvfs", []):
+        try:
+            st = os.statvfs(path)
+            files["statvfs:" + path] = "%d %d %d %d" % (st.f_frsize, st.f_blocks, st.f_bfree, st.f_bavail)
+        except OSError:
+            files["statvfs:" + path] = None
+    return {"rc": 0, "files": files, "pids": pids}
+def op_readstat(req):
+    # Return the file signature, plus its text only if it differs from "since".
+    try:
+        st = os.stat(req["path"])
+    except OSError as e:
+        return {"rc": 1, "out": "", "err": str(e)}
+    sig = [st.st_mtime_ns, st.st_size, st.st_ino]
+    res = {"rc": 0, "sig": sig}
+    if sig != req.get("since"):
+        with open(req["path"], errors="replace") as f:
+            res["text"] = f.read()
+    return res
+tails = {} # (path, handle) -> {"f", "idx", ...} kept open by op_tail, so a rotated file can be drained first
+tails_lock = threading.Lock()
+def tail_open(path):
+    # The log plus the "<time> <offset>" index bot_logstore keeps next to it, opened together.
+    t = {"f": open(path, "rb"), "idx": None, "rest": b"", "offsets": [], "times": []}
+    tail_index(t, path)
+    return t
+def tail_index(t, path=None):
+    # Read what the index gained; "path" (live log only) retries opening a missing one.
+    if t["idx"] is None and path is not None:
+        try:
+            t["idx"] = open(path + ".idx", "rb")
+        except OSError:
+            return
+    idx = t["idx"]
+    if idx is None:
+        return
+    if os.fstat(idx.fileno()).st_size < idx.tell():
+        idx.seek(0)
+        t["rest"], t["offsets"], t["times"] = b"", [], []
+    data = t["rest"] + idx.read()
+    cut = data.rfind(b"\n") + 1
+    t["rest"] = data[cut:]
+    for line in data[:cut].split(b"\n"):
+        parts = line.split()
+        try:
+            at, offset = float(parts[0]), int(parts[1])
+        except (IndexError, ValueError):
+            continue
+        if not t["offsets"] or offset > t["offsets"][-1]:
+            t["offsets"].append(offset)
+            t["times"].append(at)
+def tail_marks(t, start, end):
+    # Index entries covering start..end: the last one at or before start, then each one before end.
+    i = max(bisect.bisect_right(t["offsets"], start) - 1, 0)
+    j = bisect.bisect_left(t["offsets"], end, i)
+    return [[at, o] for at, o in zip(t["times"][i:j], t["offsets"][i:j])]
+def tail_close(t):
+    t["f"].close()
+    if t["idx"] is not None:
+        t["idx"].close()
+def op_tail(req):
+    # Read up to "max" bytes from "offset"; restart at 0 if the inode changed or the file shrank.
+    # Bytes still unread in a rotated file (the inode "ino" we hold open) are returned first.
+    # Each reader passes its own "handle", so one reader moving on never closes another's old file.
+    key, ino, size = (req["path"], req.get("handle")), req.get("ino"), req.get("max", 1048576)
+    path, offset = req["path"], req.get("offset") or 0
+    with tails_lock:
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        t = tails.get(key)
+        if t is not None and ino is not None and os.fstat(t["f"].fileno()).st_ino == ino and (st is None or st.st_ino != ino):
+            data = os.pread(t["f"].fileno(), size, offset)
+            if data:
+                tail_index(t)
+                return {"rc": 0, "ino": ino, "size": offset + len(data), "start": offset,
+                        "mtime": os.fstat(t["f"].fileno()).st_mtime, "marks": tail_marks(t, offset, offset + len(data)),
+                        "data": base64.b64encode(data).decode("ascii")}
+        if st is None:
+            if t is not None:
+                tail_close(t)
+                del tails[key]
+            return {"rc": 1, "out": "", "err": "%s: no such file" % path}
+        if t is None or os.fstat(t["f"].fileno()).st_ino != st.st_ino:
+            if t is not None:
+                tail_close(t)
+            try:
+                t = tails[key] = tail_open(path)
+            except OSError as e:
+                tails.pop(key, None)
+                return {"rc": 1, "out": "", "err": str(e)}
+        else:
+            tail_index(t, path)
+        st = os.fstat(t["f"].fileno())
+        if st.st_ino != ino or st.st_size < offset:
+            offset = 0
+        data = os.pread(t["f"].fileno(), size, offset)
+        marks = tail_marks(t, offset, offset + len(data))
+    return {"rc": 0, "ino": st.st_ino, "size": st.st_size, "start": offset, "mtime": st.st_mtime, "marks": marks,
+            "data": base64.b64encode(data).decode("ascii")}
+def op_untail(req):
+    # The reader is done: release the files op_tail kept open for it.
+    with tails_lock:
+        t = tails.pop((req["path"], req.get("handle")), None)
+    if t is not None:
+        tail_close(t)
+    return {"rc": 0}
+def op_heads(req):
+    # Signature of each file in "paths" (plus "dir" entries ending in "suffix"), and
+    # its first "max" bytes only when the signature differs from since[path].
+    paths = list(req.get("paths", []))
+    if req.get("dir"):
+        try:
+            names = sorted(os.listdir(req["dir"]))
+        except OSError:
+            names = []
+        paths += [os.path.join(req["dir"], n) for n in names if n.endswith(req.get("suffix", ""))]
+    since = req.get("since") or {}
+    files = {}
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                sig = [st.st_mtime_ns, st.st_size, st.st_ino]
+                head = None
+                if sig != since.get(path):
+                    head = base64.b64encode(f.read(req.get("max", 65536))).decode("ascii")
+        except OSError:
+            continue
+        files[path] = [sig, head]
+    return {"rc": 0, "files": files}
+OPS = {"sh": op_sh, "probe": op_probe, "readstat": op_readstat, "tail": op_tail, "untail": op_untail,
+       "heads": op_heads}
+def handle(req):
+    try:
+        res = OPS[req.get("op", "sh")](req)
+    except Exception as e:
+        res = {"rc": -1, "out": "", "err": "%s: %s" % (type(e).__name__, e)}
+    res["id"] = req["id"]
+    reply(res)
+reply({"ready": True})
+for line in sys.stdin:
+    if line.strip():
+        threading.Thread(target=handle, args=(json.loads(line),), daemon=True).start()
+'''
+
+# StreamReader line limit; replies carry whole command outputs.
+MAX_FRAME = 16 * 1024 * 1024
+
+
+class ExecUnavailable(Exception):
+    """Raised when the channel cannot be (re)established; callers should fall back."""
+
+
+class ExecChannel:
+    """Multiplexed request/response channel to one container.
+
+    The agent is spawned lazily on the first request and respawned after it
+    exits (e.g. container restart). If spawning fails, the channel reports
+    ExecUnavailable for `retry_delay` seconds before trying again.
+    """
+
+    def __init__(self, ct_id, retry_delay=30, spawn_timeout=10, observe=None):
+        self.ct_id = str(ct_id)
+        self.retry_delay = retry_delay
+        self.spawn_timeout = spawn_timeout
+        self.observe = observe # observe(op, seconds) after every request, for latency stats
+        self._proc = None
+        self._reader = None
+        self._pending = {}
+        self._ids = itertools.count(1)
+        # Locks are created on first use so they bind to the running loop.
+        self._spawn_lock = None
+        self._write_lock = None
+        self._down_until = 0.0
+
+    @property
+    def connected(self):
+        return self._proc is not None and self._proc.returncode is None
+
+    async def _spawn(self):
+        proc = await asyncio.create_subprocess_exec(
+            'pct', 'exec', self.ct_id, '--', 'python3', '-u', '-c', AGENT_CODE,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=MAX_FRAME,
+        )
+        try:
+            hello = await asyncio.wait_for(proc.stdout.readline(), self.spawn_timeout)
+            if not json.loads(hello or b'{}').get('ready'):
+                raise ConnectionError("agent did not report ready")
+        except Exception:
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+            raise
+        self._proc = proc
+        self._reader = asyncio.create_task(self._read_loop(proc))
+        print(f"Exec channel to CT {self.ct_id} established.")
+
+    async def _ensure(self):
+        if self.connected:
+            return
+        if self._spawn_lock is None:
+            self._spawn_lock = asyncio.Lock()
+            self._write_lock = asyncio.Lock()
+        async with self._spawn_lock:
+            if self.connected:
+                return
+            if time.monotonic() < self._down_until:
+                raise ExecUnavailable(f"exec channel to CT {self.ct_id} is down")
+            try:
+                await self._spawn()
+            except Exception as e:
+                self._down_until = time.monotonic() + self.retry_delay
+                print(f"Exec channel to CT {self.ct_id} unavailable: {e}")
+                raise ExecUnavailable(str(e)) from e
+
+    async def _read_loop(self, proc):
+        try:
+            while True:
+                line = await proc.stdout.readline()
+                if not line:
+                    break
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                fut = self._pending.pop(msg.get('id'), None)
+                if fut and not fut.done():
+                    fut.set_result(msg)
+        finally:
+            if self._proc is proc:
+                self._proc = None
+            # Fail everything still in flight; the next request reconnects.
+            pending, self._pending = self._pending, {}
+            for fut in pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("exec channel closed"))
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+
+    async def request(self, op, timeout=None, **fields):
+        """Send one framed request and wait for its tagged reply."""
+        started = time.perf_counter()
+        await self._ensure()
+        req_id = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[req_id] = fut
+        frame = dict(fields, id=req_id, op=op)
+        if timeout:
+            frame['timeout'] = timeout
+        try:
+            try:
+                async with self._write_lock:
+                    self._proc.stdin.write(json.dumps(frame).encode() + b'\n')
+                    await self._proc.stdin.drain()
+            except (AttributeError, ConnectionError) as e:
+                # Never sent, so the caller may safely retry another way.
+                raise ExecUnavailable(str(e)) from e
+            # Agent enforces the timeout; allow a little slack for the reply.
+            return await asyncio.wait_for(fut, timeout + 5 if timeout else None)
+        finally:
+            self._pending.pop(req_id, None)
+            if self.observe is not None:
+                self.observe(op, time.perf_counter() - started)
+
+    async def run(self, command, timeout=None):
+        """Run a shell command in the container. Returns (returncode, stdout, stderr)."""
+        msg = await self.request('sh', timeout=timeout, cmd=command)
+        return msg.get('rc', -1), msg.get('out', ''), msg.get('err', '')
+
+    async def probe(self, paths, pattern=None, procstat=False, statvfs=(), timeout=10):
+        """Read files and find processes whose cmdline contains `pattern`, in one round trip.
+
+        Returns (files, pids) where files maps each path to its text (None if unreadable).
+        With `procstat`, files also holds /proc/<pid>/stat of every matched pid; each
+        `statvfs` path adds a "statvfs:<path>" entry: "frsize blocks bfree bavail".
+        """
+        msg = await self.request('probe', timeout=timeout, paths=list(paths), pattern=pattern,
+                                 procstat=procstat, statvfs=list(statvfs))
+        if msg.get('rc') != 0:
+            raise RuntimeError(msg.get('err') or "probe failed")
+        return msg.get('files', {}), msg.get('pids', [])
+
+    async def read_if_changed(self, path, since=None, timeout=10):
+        """Returns (signature, text); text is None when the signature still equals `since`.
+
+        Raises OSError when the file cannot be stat'ed.
+        """
+        msg = await self.request('readstat', timeout=timeout, path=path, since=since)
+        if msg.get('rc') != 0:
+            raise OSError(msg.get('err') or f"cannot stat {path}")
+        return msg.get('sig'), msg.get('text')
+
+    async def tail(self, path, ino, offset, max_bytes, timeout=10, handle=None):
+        """Read a chunk of a growing file. Returns (ino, size, start, data, mtime, marks) or None if missing.
+
+        `start` is 0 instead of `offset` when the file was replaced or truncated.
+        The agent keeps the file open per (path, `handle`), so after a rotation
+        the rest of the old file (inode `ino`) is returned before the new one is
+        started. Readers of the same path need distinct handles; untail()
+        releases one. `marks` are the [(time, offset)] entries of the file's
+        bot_logstore index (`path`.idx) covering the chunk.
+        """
+        msg = await self.request('tail', timeout=timeout, path=path, ino=ino, offset=offset, max=max_bytes,
+                                 handle=handle)
+        if msg.get('rc') != 0:
+            return None
+        return (msg['ino'], msg['size'], msg['start'], base64.b64decode(msg.get('data', '')), msg.get('mtime'),
+                [tuple(m) for m in msg.get('marks', [])])
+
+    async def untail(self, path, handle=None, timeout=10):
+        await self.request('untail', timeout=timeout, path=path, handle=handle)
+
+    async def heads(self, paths=(), directory=None, suffix="", since=None, max_bytes=65536, timeout=10):
+        """Signatures and leading bytes of several files in one round trip.
+
+        Returns {path: (sig, head)} for every existing file in `paths` and in
+        `directory` (names ending in `suffix`). `head` is None when the file's
+        signature equals since[path], so unchanged files cost no transfer.
+        """
+        msg = await self.request('heads', timeout=timeout, paths=list(paths), dir=directory,
+                                 suffix=suffix, since=since or {}, max=max_bytes)
+        if msg.get('rc') != 0:
+            raise ExecUnavailable(msg.get('err', 'heads failed'))
+        return {path: (sig, base64.b64decode(head) if head is not None else None)
+                for path, (sig, head) in msg.get('files', {}).items()}
+
+    async def close(self):
+        proc = self._proc
+        self._proc = None
+        if proc and proc.returncode is None:
+            proc.stdin.close()
+            try:
+                await asyncio.wait_for(proc.wait(), 2)
+            except asyncio.TimeoutError:
+                proc.kill()
+        if self._reader:
+            await asyncio.gather(self._reader, return_exceptions=True)
@@ -0,0 +1,162 @@
+"""Prometheus / OpenMetrics endpoint for the bot's servers.
+
+`GET /metrics` is answered from state the bot already keeps: the status
+snapshot the background refresher collects and counters bumped by the log
+follower. A scrape never runs a shell command or touches a container, and
+the rendered text is reused until something changes, so scraping every few
+seconds costs a dictionary lookup.
+
+Exported per server (label `server`):
+  terraria_up                           1 if the server process is running
+  terraria_players                      connected players
+  terraria_server_starts_total          server starts seen in the log
+  terraria_server_rss_bytes             resident memory of the server process
+  terraria_server_cpu_seconds_total     CPU time of the server process
+  terraria_memory_used_bytes / _total_bytes, terraria_disk_used_bytes / _total_bytes
+  terraria_load1                        container load average
+  terraria_status_timestamp_seconds     when the snapshot was taken (a stuck container falls behind)
+  terraria_log_lines_total              server_output.log lines processed
+  terraria_events_total{kind}           joins, leaves, deaths, chat...
+  terraria_world_save_seconds           histogram of world save durations
+"""
+from aiohttp import web
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+SAVE_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+SAVE_STALE_SECONDS = 600 # A save start with no completion line is forgotten after this
+MB = 1024 * 1024
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets) # Per bucket, made cumulative on render
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+
+class ServerCounters:
+    """Log-derived counters for one server, bumped by the bot's event handlers."""
+
+    def __init__(self):
+        self.lines = 0
+        self.events = {}
+        self.starts = 0
+        self.saves = Histogram(SAVE_BUCKETS)
+        self.save_started = None
+        self.generation = 0 # Bumped on every change; keys the render cache
+
+    def add_lines(self, count):
+        self.lines += count
+        self.generation += 1
+
+    def event(self, event):
+        self.events[event.kind] = self.events.get(event.kind, 0) + 1
+        if event.kind == 'server_started':
+            self.starts += 1
+        elif event.kind == 'save_started':
+            # One line per progress step: the save started at the first of them
+            if self.save_started is None or event.at - self.save_started > SAVE_STALE_SECONDS:
+                self.save_started = event.at
+        elif event.kind == 'save_completed' and self.save_started is not None:
+            # Both completion lines can appear for one save: time the first
+            self.saves.observe(max(0.0, event.at - self.save_started))
+            self.save_started = None
+        self.generation += 1
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsExporter:
+    """Renders the servers' cached state as Prometheus text and serves it over HTTP.
+
+    `servers()` returns the objects to export; each has `name`, `status` (with
+    `snapshot` and `updated_at`) and `counters` (a ServerCounters).
+    """
+
+    def __init__(self, servers, host="127.0.0.1", port=9150):
+        self.servers = servers
+        self.host = host
+        self.port = port
+        self.runner = None
+        self.scrapes = 0
+        self._key = None
+        self._body = b""
+
+    def render(self):
+        servers = list(self.servers())
+        key = tuple((srv.name, srv.status.updated_at, srv.counters.generation) for srv in servers)
+        if key == self._key:
+            return self._body
+        families = {} # family -> (type, help, sample lines); samples stay grouped by family
+
+        def sample(family, metric_type, help_text, srv, value, suffix="", **labels):
+            samples = families.setdefault(family, (metric_type, help_text, []))[2]
+            text = ",".join(f'{k}="{_escape(v)}"' for k, v in {'server': srv.name, **labels}.items())
+            samples.append(f"{family}{suffix}{{{text}}} {_number(value)}")
+
+        for srv in servers:
+            snapshot, counters = srv.status.snapshot, srv.counters
+            if snapshot is not None:
+                sample("terraria_up", "gauge", "1 if the Terraria server process is running.", srv, int(snapshot.running))
+                sample("terraria_players", "gauge", "Connected players.", srv, snapshot.players)
+                sample("terraria_server_rss_bytes", "gauge", "Resident memory of the server process.", srv, snapshot.server_rss_mb * MB)
+                sample("terraria_server_cpu_seconds_total", "counter", "CPU time used by the server process.", srv, snapshot.server_cpu_seconds)
+                sample("terraria_memory_used_bytes", "gauge", "Container memory in use.", srv, snapshot.mem_used_mb * MB)
+                sample("terraria_memory_total_bytes", "gauge", "Container memory.", srv, snapshot.mem_total_mb * MB)
+                sample("terraria_disk_used_bytes", "gauge", "Container root filesystem in use.", srv, snapshot.disk_used_mb * MB)
+                sample("terraria_disk_total_bytes", "gauge", "Container root filesystem size.", srv, snapshot.disk_total_mb * MB)
+                sample("terraria_load1", "gauge", "Container 1-minute load average.", srv, float(snapshot.load_avg[0]))
+                sample("terraria_status_timestamp_seconds", "gauge", "Unix time the status snapshot was collected.", srv,
+                       round(snapshot.collected_at, 3))
+            sample("terraria_server_starts_total", "counter", "Server starts seen in the log.", srv, counters.starts)
+            sample("terraria_log_lines_total", "counter", "Server log lines processed.", srv, counters.lines)
+            for kind in sorted(counters.events):
+                sample("terraria_events_total", "counter", "Classified log events by kind.", srv, counters.events[kind], kind=kind)
+            saves, cumulative = counters.saves, 0
+            for bound, count in zip(saves.buckets, saves.counts):
+                cumulative += count
+                sample("terraria_world_save_seconds", "histogram", "World save duration.", srv, cumulative, "_bucket",
+                       le=_number(float(bound)))
+            sample("terraria_world_save_seconds", "histogram", "World save duration.", srv, saves.count, "_bucket", le="+Inf")
+            sample("terraria_world_save_seconds", "histogram", "World save duration.", srv, round(saves.sum, 3), "_sum")
+            sample("terraria_world_save_seconds", "histogram", "World save duration.", srv, saves.count, "_count")
+
+        lines = []
+        for family, (metric_type, help_text, samples) in families.items():
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {metric_type}")
+            lines.extend(samples)
+        self._key = key
+        self._body = ("\n".join(lines) + "\n").encode()
+        return self._body
+
+    async def _handle(self, request):
+        self.scrapes += 1
+        return web.Response(body=self.render(), headers={'Content-Type': CONTENT_TYPE})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
@@ -0,0 +1,89 @@
+"""Minimal PNG line chart for !graph (no plotting library needed).
+
+Draws the per-bucket mean as a filled line and the per-bucket max as a thin
+line above it on a dark background with horizontal grid lines. Axis labels
+are left to the Discord embed, so no font rendering is required.
+"""
+import struct
+import zlib
+
+BACKGROUND = (0x2B, 0x2D, 0x31)
+GRID = (0x3F, 0x42, 0x48)
+FILL = (0x2D, 0x4F, 0x7C)
+MEAN = (0x58, 0x9B, 0xF2)
+PEAK = (0xF0, 0xB2, 0x32)
+
+
+def _png(width, height, rows):
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    raw = b"".join(b"\x00" + bytes(row) for row in rows) # Filter type 0 per scanline
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, 6))
+            + chunk(b'IEND', b""))
+
+
+def render_chart(series, start, end, width=640, height=220, low=None, high=None):
+    """Renders [(ts, mean, max)] between `start` and `end` as PNG bytes.
+
+    The y axis spans low..high (defaults: 0 and the largest max, padded).
+    """
+    rows = [bytearray(bytes(BACKGROUND) * width) for _ in range(height)]
+
+    def put(x, y, color):
+        if 0 <= x < width and 0 <= y < height:
+            rows[y][3 * x:3 * x + 3] = bytes(color)
+
+    for k in range(1, 4):
+        y = k * height // 4
+        for x in range(0, width, 2):
+            put(x, y, GRID)
+
+    if not series:
+        return _png(width, height, rows)
+
+    if low is None:
+        low = min(0.0, min(mean for _, mean, _ in series))
+    if high is None:
+        high = max(peak for _, _, peak in series) * 1.1
+    if high <= low:
+        high = low + 1.0
+    span = max(end - start, 1)
+
+    def xy(ts, value):
+        x = int((ts - start) * (width - 1) / span)
+        y = int((high - value) * (height - 1) / (high - low))
+        return x, min(max(y, 0), height - 1)
+
+    def line(points, color, fill=None):
+        filled = set()
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            # Bresenham between consecutive buckets
+            dx, dy = abs(x1 - x0), -abs(y1 - y0)
+            sx, sy = (1 if x0 < x1 else -1), (1 if y0 < y1 else -1)
+            err = dx + dy
+            while True:
+                if fill is not None and x0 not in filled:
+                    filled.add(x0)
+                    for y in range(y0 + 1, height):
+                        put(x0, y, fill)
+                put(x0, y0, color)
+                if x0 == x1 and y0 == y1:
+                    break
+                e2 = 2 * err
+                if e2 >= dy:
+                    err += dy
+                    x0 += sx
+                if e2 <= dx:
+                    err += dx
+                    y0 += sy
+
+    means = [xy(ts, mean) for ts, mean, _ in series]
+    peaks = [xy(ts, peak) for ts, _, peak in series]
+    if len(means) == 1:
+        means, peaks = means * 2, peaks * 2
+    line(means, MEAN, fill=FILL)
+    line(peaks, PEAK)
+    line(means, MEAN) # Mean on top of the max where they overlap
+    return _png(width, height, rows)
@@ -0,0 +1,81 @@
+"""Shared HTTP session and background public IP resolution.
+
+One connection-pooled aiohttp.ClientSession is kept for the bot's lifetime.
+The public IP is resolved in the background with a TTL; readers always get
+the last known value immediately, so a slow provider never blocks !status.
+"""
+import asyncio
+import ipaddress
+import time
+
+import aiohttp
+
+DEFAULT_IP_PROVIDER = "https://api.ipify.org"
+UNKNOWN_IP = "Unknown IP"
+
+
+class HttpPool:
+    """Lazily created, shared aiohttp session (bound to the running loop)."""
+
+    def __init__(self, limit=20, timeout=10):
+        self.limit = limit
+        self.timeout = timeout
+        self._session = None
+
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class PublicIPResolver:
+    """TTL-cached public IP with fallback to the last known value.
+
+    `provider` is either a URL returning the bare IP as text (ipify style) or
+    an async callable taking the aiohttp session and returning the IP string,
+    so tests can point it at a local stub server.
+    """
+
+    def __init__(self, pool, provider=DEFAULT_IP_PROVIDER, ttl=600, retry=60, timeout=5):
+        self.pool = pool
+        self.provider = provider
+        self.ttl = ttl
+        self.retry = retry
+        self.timeout = timeout
+        self.value = UNKNOWN_IP
+        self._expires = 0.0
+        self._task = None
+
+    async def _fetch(self):
+        session = self.pool.session()
+        if callable(self.provider):
+            return await self.provider(session)
+        async with session.get(self.provider, timeout=aiohttp.ClientTimeout(total=self.timeout)) as resp:
+            resp.raise_for_status()
+            return await resp.text()
+
+    async def refresh(self):
+        """Resolve now; keeps the previous value if the lookup fails."""
+        try:
+            ip = str(ipaddress.ip_address((await self._fetch()).strip()))
+        except Exception as e:
+            print(f"Failed to get IP: {e!r}")
+            self._expires = time.monotonic() + self.retry
+            return self.value
+        self.value = ip
+        self._expires = time.monotonic() + self.ttl
+        return ip
+
+    def maybe_refresh(self):
+        """Start a background refresh if the value expired. Never blocks."""
+        if time.monotonic() >= self._expires and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self.refresh())
+        return self.value
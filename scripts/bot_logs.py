@@ -0,0 +1,369 @@
+"""In-process follower for server_output.log.
+
+Replaces `tail -F -n 0`: reads the log in large chunks, detects rotation
+(inode change) and truncation, and checkpoints the byte offset of the last
+line handed to the consumer. After a bot restart it resumes exactly where it
+stopped instead of skipping everything written while it was down.
+
+Each line gets the time it was written from the index bot_logstore keeps
+next to the log (server_output.log.idx): sources report the entries covering
+what they read in `marks`, and LineTimes gives a line the time of the last
+entry at or before its offset.
+
+capture_output() uses the same sources to collect the console output of a
+single command: everything appended after the offset recorded just before it
+was sent.
+"""
+import asyncio
+import bisect
+import itertools
+import json
+import os
+
+from bot_exec import ExecUnavailable
+
+CHUNK_SIZE = 1024 * 1024
+_handles = itertools.count(1) # Agent-side file handle per ChannelLogSource
+
+
+class LogIndex:
+    """bot_logstore's "<unix time> <offset>" index of a log, read incrementally.
+
+    Opened together with the log, so a rotated log keeps reading its own index.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets, self.times = [], []
+        self._rest = b""
+        self._f = None
+        self._open()
+
+    def _open(self):
+        try:
+            self._f = open(self.path, 'rb')
+        except OSError:
+            pass
+
+    def marks(self, start, end, live=False):
+        """[(time, offset)]: the last entry at or before `start`, then every one before `end`.
+
+        `live`: the log is still the current one, so a missing index may appear yet.
+        """
+        if self._f is None and live:
+            self._open()
+        if self._f is not None:
+            self._update()
+        i = max(bisect.bisect_right(self.offsets, start) - 1, 0)
+        j = bisect.bisect_left(self.offsets, end, i)
+        return list(zip(self.times[i:j], self.offsets[i:j]))
+
+    def _update(self):
+        if os.fstat(self._f.fileno()).st_size < self._f.tell():
+            # Emptied with a truncated log: start over
+            self._f.seek(0)
+            self.offsets, self.times, self._rest = [], [], b""
+        data = self._rest + self._f.read()
+        cut = data.rfind(b"\n") + 1
+        self._rest = data[cut:]
+        for line in data[:cut].split(b"\n"):
+            parts = line.split()
+            try:
+                at, offset = float(parts[0]), int(parts[1])
+            except (IndexError, ValueError):
+                continue
+            if not self.offsets or offset > self.offsets[-1]:
+                self.offsets.append(offset)
+                self.times.append(at)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+        self._f = None
+
+
+class LineTimes:
+    """When each line of a log was written, from the index marks its source reports.
+
+    A line gets the time of the last entry at or before its offset (to within
+    bot_logstore's INDEX_SECONDS), or `fallback` when there is none.
+    """
+
+    def __init__(self):
+        self.offsets, self.times = [], []
+
+    def reset(self):
+        self.offsets, self.times = [], []
+
+    def add(self, marks):
+        for at, offset in marks or ():
+            if not self.offsets or offset > self.offsets[-1]:
+                self.offsets.append(offset)
+                self.times.append(at)
+
+    def at(self, offset, fallback=None):
+        i = bisect.bisect_right(self.offsets, offset) - 1
+        return self.times[i] if i >= 0 else fallback
+
+    def split(self, buf, offset, fallback=None):
+        """(lines, times) of `buf`, complete lines read from byte `offset`."""
+        # Entries sit on line boundaries, so each stretch between two decodes on its own
+        lo = bisect.bisect_right(self.offsets, offset)
+        hi = bisect.bisect_left(self.offsets, offset + len(buf), lo)
+        bounds = [0] + [o - offset for o in self.offsets[lo:hi]] + [len(buf)]
+        lines, times = [], []
+        for a, b in zip(bounds, bounds[1:]):
+            part = buf[a:b].decode('utf-8', errors='ignore').splitlines()
+            lines += part
+            times += [self.at(offset + a, fallback)] * len(part)
+        return lines, times
+
+    def forget(self, offset):
+        """Drops entries no line at or after `offset` needs any more."""
+        i = bisect.bisect_right(self.offsets, offset) - 1
+        if i > 0:
+            del self.offsets[:i], self.times[:i]
+
+
+class LocalLogSource:
+    """Reads a local file. Keeps the fd open so a rotated file is drained first."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None # Modification time seen by the last read
+        self.marks = [] # Index entries covering the last read: [(time, offset)]
+        self._f = None
+        self._ino = None
+        self._index = None
+
+    def _close(self):
+        if self._f is not None:
+            self._f.close()
+            self._index.close()
+        self._f = None
+        self._ino = None
+        self._index = None
+
+    async def read(self, ino, offset, max_bytes):
+        """Returns (ino, size, start, data) or None if the file does not exist."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            st = None
+
+        if self._f is not None and self._ino == ino and (st is None or st.st_ino != ino):
+            # Rotated away: finish the old file before moving on
+            self._f.seek(offset)
+            data = self._f.read(max_bytes)
+            if data:
+                self.marks = self._index.marks(offset, offset + len(data))
+                return ino, offset + len(data), offset, data
+            self._close()
+
+        if st is None:
+            return None
+        if self._f is None or self._ino != st.st_ino:
+            self._close()
+            try:
+                self._f = open(self.path, 'rb')
+            except OSError:
+                return None
+            self._ino = os.fstat(self._f.fileno()).st_ino
+            self._index = LogIndex(self.path + ".idx")
+
+        st = os.fstat(self._f.fileno())
+        size, self.mtime = st.st_size, st.st_mtime
+        if self._ino != ino or size < offset:
+            offset = 0
+        self._f.seek(offset)
+        data = self._f.read(max_bytes)
+        self.marks = self._index.marks(offset, offset + len(data), live=True)
+        return self._ino, size, offset, data
+
+    async def close(self):
+        self._close()
+
+
+class ChannelLogSource:
+    """Reads a file inside the container through the exec channel (no forks).
+    The agent holds the file open for this source (its own handle, like
+    LocalLogSource's fd), so a rotated file is drained first here too."""
+
+    def __init__(self, channel, path):
+        self.channel = channel
+        self.path = path
+        self.mtime = None
+        self.marks = []
+        self.handle = next(_handles)
+
+    async def read(self, ino, offset, max_bytes):
+        got = await self.channel.tail(self.path, ino, offset, max_bytes, handle=self.handle)
+        if got is None:
+            return None
+        self.mtime, self.marks = got[4], got[5]
+        return got[:4]
+
+    async def close(self):
+        try:
+            await self.channel.untail(self.path, self.handle)
+        except (ExecUnavailable, ConnectionError, asyncio.TimeoutError):
+            pass # Gone with the agent anyway
+
+
+class LogFollower:
+    """Yields batches of complete lines appended to a log file.
+
+    The checkpoint (inode + offset) is written after the consumer finishes a
+    batch, i.e. when the next batch is requested, so a restart neither skips
+    nor repeats lines. Without a checkpoint, following starts at end of file.
+    """
+
+    def __init__(self, source, checkpoint_path=None, chunk_size=CHUNK_SIZE, poll_min=0.2, poll_max=1.0):
+        self.source = source
+        self.checkpoint_path = checkpoint_path
+        self.chunk_size = chunk_size
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.ino = None
+        self.offset = None # Byte offset just past the last line handed out
+        self.lines_read = 0
+        self.written_at = None # Log mtime when the current batch was read (~ when its last line was written)
+        self.line_times = [] # When each line of the current batch was written (index time, else written_at)
+        self._times = LineTimes()
+
+    def _load_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                state = json.load(f)
+            self.ino = int(state['ino'])
+            self.offset = int(state['offset'])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Ignoring bad log checkpoint {self.checkpoint_path}: {e}")
+
+    def _save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        tmp = f"{self.checkpoint_path}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'ino': self.ino, 'offset': self.offset}, f)
+            os.replace(tmp, self.checkpoint_path)
+        except OSError as e:
+            print(f"Failed to save log checkpoint: {e}")
+
+    async def batches(self):
+        self._load_checkpoint()
+        pending = b"" # Partial line after self.offset
+        delay = self.poll_min
+
+        while True:
+            try:
+                if self.offset is None:
+                    # First run: skip history, like `tail -n 0`
+                    got = await self.source.read(None, 0, 0)
+                    if got is None:
+                        await asyncio.sleep(self.poll_max)
+                        continue
+                    self.ino, self.offset = got[0], got[1]
+                    self._save_checkpoint()
+
+                got = await self.source.read(self.ino, self.offset + len(pending), self.chunk_size)
+            except (ExecUnavailable, ConnectionError, asyncio.TimeoutError, OSError) as e:
+                print(f"Log follower read error: {e}")
+                await asyncio.sleep(self.poll_max)
+                continue
+
+            if got is None:
+                await asyncio.sleep(self.poll_max)
+                continue
+
+            ino, _size, start, data = got
+            if ino != self.ino or start != self.offset + len(pending):
+                # Rotated or truncated: the new file starts from scratch
+                print("Log file rotated or truncated, following from the beginning.")
+                self.ino, self.offset, pending = ino, 0, b""
+                self._times.reset()
+                if start != 0:
+                    continue
+
+            self._times.add(getattr(self.source, 'marks', None))
+            if not data:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.poll_max)
+                continue
+            delay = self.poll_min
+
+            buf = pending + data
+            cut = buf.rfind(b"\n") + 1
+            pending = buf[cut:]
+            if cut:
+                self.written_at = getattr(self.source, 'mtime', None)
+                lines, self.line_times = self._times.split(buf[:cut], self.offset, self.written_at)
+                self.lines_read += len(lines)
+                yield lines
+                # Consumer is done with the batch: commit it
+                self.offset += cut
+                self._times.forget(self.offset)
+                self._save_checkpoint()
+
+
+async def capture_output(source, send, until=None, exclude=None, quiet=0.5, idle=2.0, timeout=10.0, poll=0.05):
+    """Runs `send()` and returns (error, lines) for log lines written after it.
+
+    The log size is recorded before sending, so only output produced after the
+    command is returned. Capture stops `quiet` seconds after the last new line,
+    after `idle` seconds with no output at all, when `until(line)` is true, or
+    at `timeout`. Lines matching `exclude(line)` (e.g. player chat) are skipped.
+    """
+    try:
+        got = await source.read(None, 0, 0)
+    except (ExecUnavailable, ConnectionError, asyncio.TimeoutError, OSError):
+        got = None
+    ino, offset = (got[0], got[1]) if got else (None, 0)
+
+    error = await send()
+    if error:
+        return error, []
+
+    loop = asyncio.get_running_loop()
+    started = last = loop.time()
+    lines, pending = [], b""
+    while True:
+        now = loop.time()
+        if now - started >= timeout:
+            break
+        if now - last >= (quiet if lines else idle):
+            break
+        try:
+            got = await source.read(ino, offset + len(pending), CHUNK_SIZE)
+        except (ExecUnavailable, ConnectionError, asyncio.TimeoutError, OSError):
+            got = None
+        if got is not None:
+            new_ino, _size, start, data = got
+            if new_ino != ino or start != offset + len(pending):
+                # Rotated while capturing: continue in the new file
+                ino, offset, pending = new_ino, start, b""
+            if data:
+                buf = pending + data
+                cut = buf.rfind(b"\n") + 1
+                pending = buf[cut:]
+                offset += cut
+                done = False
+                for line in buf[:cut].decode('utf-8', errors='ignore').splitlines():
+                    line = line.strip()
+                    if not line or (exclude is not None and exclude(line)):
+                        continue
+                    lines.append(line)
+                    last = loop.time()
+                    if until is not None and until(line):
+                        done = True
+                        break
+                if done:
+                    break
+                continue
+        await asyncio.sleep(poll)
+    return "", lines
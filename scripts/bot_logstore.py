@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""Rotated, compressed and time-indexed server_output.log.
+
+launch.sh pipes the tmux pane into `bot_logstore.py write` instead of
+`cat >>`. The live file keeps its name (the bot's follower, `!logs` and
+launch.sh's diagnostics read it as before), and next to it the writer keeps
+a sparse index, `server_output.log.idx`: one "<unix time> <offset>" line per
+minute of output or per MiB, at a line boundary. Terraria prints no
+timestamps, so that index is the only record of when a line was written.
+
+When the file reaches --max-mb or --max-hours it is moved to
+logs/server_output-<start>.log and compressed in the background as a
+multi-member gzip with one member per index entry. The segment index
+(logs/server_output-<start>.idx) maps each entry to its compressed offset,
+so a search seeks straight to the member covering `since` in the right
+segment and decompresses from there. Segments older than --keep-days are
+deleted.
+
+Usage:
+  bot_logstore.py write LOG [--max-mb 64] [--max-hours 24] [--keep-days 30]
+  bot_logstore.py search LOG PATTERN [--since UNIX] [--until UNIX] [--limit N]
+  bot_logstore.py ship [--cursors JSON] [--follow SECONDS]
+
+`ship` is the container half of ship_logs.py: it sends only what every log
+(and the terraria journal) gained since the given cursors, reading rotated
+segments where a file was rotated in between.
+
+`search` prints one JSON object: {"matches": [[time, line], ...], "truncated": bool}.
+Self-contained (standard library only): it runs with the container's python3.
+"""
+import argparse
+import bisect
+import calendar
+import glob
+import gzip
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+INDEX_SECONDS = 60
+INDEX_BYTES = 1024 * 1024
+MEMBER_BYTES = 4 * 1024 * 1024 # Splits long unindexed stretches (e.g. a log from before rotation)
+READ_BYTES = 1024 * 1024
+MAX_LINE = 300
+
+
+def segment_dir(path):
+    return os.path.join(os.path.dirname(path) or ".", "logs")
+
+
+def segment_base(path, start):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(segment_dir(path), f"{stem}-{time.strftime('%Y%m%dT%H%M%S', time.gmtime(start))}")
+
+
+def segment_start(name):
+    """Start time encoded in a segment file name (0 if it has none)."""
+    match = re.search(r'-(\d{8}T\d{6})\.', os.path.basename(name))
+    if not match:
+        return 0
+    return calendar.timegm(time.strptime(match.group(1), '%Y%m%dT%H%M%S'))
+
+
+def read_index(path):
+    """[(time, raw offset[, gz offset])] from an index file ([] if missing)."""
+    entries = []
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2:
+                    entries.append((float(parts[0]),) + tuple(int(p) for p in parts[1:]))
+    except (OSError, ValueError):
+        pass
+    return entries
+
+
+def compress_segment(base):
+    """base.log + base.idx -> base.log.gz + base.idx (with gz offsets); removes base.log."""
+    raw = base + ".log"
+    entries = read_index(base + ".idx")
+    size = os.path.getsize(raw)
+    # Member boundaries: every index entry, plus MEMBER_BYTES splits in between
+    points = [(0.0, 0)] if not entries or entries[0][1] > 0 else []
+    for t, offset, *_ in entries:
+        if offset < size:
+            points.append((t, offset))
+    members = []
+    for i, (t, start) in enumerate(points):
+        end = points[i + 1][1] if i + 1 < len(points) else size
+        for cut in range(start, end, MEMBER_BYTES):
+            members.append((t, cut, min(cut + MEMBER_BYTES, end)))
+    with open(raw, 'rb') as src, open(base + ".log.gz.tmp", 'wb') as gz, open(base + ".idx.tmp", 'w') as idx:
+        for t, start, end in members:
+            src.seek(start)
+            idx.write(f"{t:.0f} {start} {gz.tell()}\n")
+            gz.write(gzip.compress(src.read(end - start), 6))
+    os.replace(base + ".log.gz.tmp", base + ".log.gz")
+    os.replace(base + ".idx.tmp", base + ".idx")
+    os.unlink(raw)
+
+
+class LogWriter:
+    """Appends stdin to the live log, maintains its index and rotates it."""
+
+    def __init__(self, path, max_bytes, max_age, keep_seconds):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.keep_seconds = keep_seconds
+        self._open()
+        # Segments a previous writer moved aside but did not finish compressing
+        for raw in glob.glob(os.path.join(segment_dir(path), "*.log")):
+            self._compress(raw[:-4])
+
+    def _open(self):
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.index = open(self.path + ".idx", 'a')
+        self.size = os.fstat(self.fd).st_size
+        entries = read_index(self.path + ".idx")
+        if entries and entries[-1][1] > self.size:
+            # Log truncated behind our back: the old index no longer applies
+            self.index.truncate(0)
+            entries = []
+        self.started = entries[0][0] if entries else None
+        self.last_time, self.last_offset = (entries[-1][:2] if entries else (0.0, -INDEX_BYTES))
+        self.line_start = True
+
+    def _compress(self, base):
+        def run():
+            try:
+                compress_segment(base)
+            except OSError as e:
+                print(f"logstore: compressing {base} failed: {e}", file=sys.stderr)
+        threading.Thread(target=run).start()
+
+    def _rotate(self, now):
+        os.makedirs(segment_dir(self.path), exist_ok=True)
+        base = segment_base(self.path, self.started or now)
+        os.close(self.fd)
+        self.index.close()
+        os.replace(self.path, base + ".log")
+        os.replace(self.path + ".idx", base + ".idx")
+        self._open()
+        self._compress(base)
+        for gz in glob.glob(os.path.join(segment_dir(self.path), "*.log.gz")):
+            if segment_start(gz) < now - self.keep_seconds:
+                for stale in (gz, gz[:-7] + ".idx"):
+                    try:
+                        os.unlink(stale)
+                    except OSError:
+                        pass
+
+    def write(self, data, now=None):
+        now = time.time() if now is None else now
+        if self.size and self.line_start and (self.size >= self.max_bytes
+                          or (self.started is not None and now - self.started >= self.max_age)):
+            self._rotate(now)
+        if now - self.last_time >= INDEX_SECONDS or self.size - self.last_offset >= INDEX_BYTES:
+            # Index the first line that starts in this write
+            cut = 0 if self.line_start else data.find(b"\n") + 1
+            if cut or self.line_start:
+                self.index.write(f"{now:.0f} {self.size + cut}\n")
+                self.index.flush()
+                self.last_time, self.last_offset = now, self.size + cut
+                if self.started is None:
+                    self.started = now
+        os.write(self.fd, data)
+        self.size += len(data)
+        self.line_start = data.endswith(b"\n")
+
+    def run(self, stream):
+        while True:
+            data = os.read(stream, 65536)
+            if not data:
+                break
+            self.write(data)
+        os.close(self.fd)
+        self.index.close()
+
+
+def segments(path):
+    """[(start time, log file, index entries, compressed)] oldest first, live log last."""
+    found = []
+    for idx in glob.glob(os.path.join(segment_dir(path), "*.idx")):
+        base = idx[:-4]
+        entries = read_index(idx)
+        if os.path.exists(base + ".log"): # Not compressed yet
+            found.append((base + ".log", entries, False))
+        elif os.path.exists(base + ".log.gz") and all(len(e) == 3 for e in entries):
+            found.append((base + ".log.gz", entries, True))
+    found.sort(key=lambda s: s[0])
+    found.append((path, read_index(path + ".idx"), False))
+    return [(entries[0][0] if entries else 0.0, log, entries, gz) for log, entries, gz in found]
+
+
+def _blocks(f, compressed):
+    """(raw offset, bytes of whole lines) from the current position of `f`."""
+    if compressed:
+        f = gzip.GzipFile(fileobj=f)
+    offset, pending = 0, b""
+    while True:
+        data = f.read(READ_BYTES)
+        if not data:
+            if pending:
+                yield offset, pending
+            return
+        buf = pending + data
+        cut = buf.rfind(b"\n") + 1
+        if cut:
+            yield offset, buf[:cut]
+            offset += cut
+        pending = buf[cut:]
+
+
+def _start(entries, since):
+    """Index position to start reading from for `since` (-1: the start of the file)."""
+    times = [e[0] for e in entries]
+    k = bisect.bisect_right(times, since) - 1 if since is not None else -1
+    if k < 0:
+        return -1
+    # Member splits repeat their entry's time: start at the first of them
+    return bisect.bisect_left(times, times[k])
+
+
+def search(path, pattern, since=None, until=None, limit=20):
+    """Lines matching `pattern` (regex, case-insensitive) written between since and until.
+
+    Each match comes with the time of the index entry before it, to within
+    INDEX_SECONDS (None if the line predates the index). Returns (matches, truncated).
+    """
+    try:
+        regex = re.compile(pattern.encode(), re.IGNORECASE)
+    except re.error:
+        regex = re.compile(re.escape(pattern.encode()), re.IGNORECASE)
+    found = segments(path)
+    matches = []
+    for n, (start, log, entries, compressed) in enumerate(found):
+        end = found[n + 1][0] if n + 1 < len(found) else None # The live log is open-ended
+        if since is not None and end and end < since:
+            continue # Whole segment is older
+        if until is not None and start > until:
+            break
+        i = _start(entries, since)
+        base = entries[i][1] if i >= 0 else 0
+        try:
+            f = open(log, 'rb')
+        except OSError:
+            continue
+        with f:
+            if i >= 0:
+                f.seek(entries[i][2] if compressed else base)
+            for offset, block in _blocks(f, compressed):
+                offset += base
+                hit = regex.search(block)
+                lines = block.split(b"\n")[:-1] if hit else ()
+                pos = offset
+                for line in lines:
+                    while i + 1 < len(entries) and entries[i + 1][1] <= pos:
+                        i += 1
+                    pos += len(line) + 1
+                    t = entries[i][0] if i >= 0 and entries[i][0] else None
+                    if until is not None and t is not None and t > until:
+                        return matches, False
+                    if since is not None and t is not None and t + INDEX_SECONDS <= since:
+                        continue
+                    if regex.search(line):
+                        if len(matches) >= limit:
+                            return matches, True
+                        matches.append((t, line.decode('utf-8', errors='replace').strip()[:MAX_LINE]))
+                # Blocks without a match only move the time cursor
+                while i + 1 < len(entries) and entries[i + 1][1] < offset + len(block):
+                    i += 1
+                if not hit and until is not None and i >= 0 and entries[i][0] > until:
+                    return matches, False
+    return matches, False
+
+
+def open_at(log, entries, compressed, offset):
+    """`log` opened for reading at raw (uncompressed) `offset`."""
+    f = open(log, 'rb')
+    if not compressed:
+        f.seek(offset)
+        return f
+    member = [e for e in entries if e[1] <= offset]
+    start = member[-1] if member else (0.0, 0, 0)
+    f.seek(start[2])
+    f = gzip.GzipFile(fileobj=f)
+    f.read(offset - start[1])
+    return f
+
+
+class Shipper:
+    """Emits what each log source gained since its cursor, as frames on stdout.
+
+    Frames are a JSON header line followed by its payload:
+      {"source": S, "len": N}  then N bytes of new log data from S
+      {"cursor": S, "state": {...}}  S is shipped up to this state
+      {"pass": T}  end of a pass over every source
+    File cursors are {"ino", "offset"} (plus "started", the segment name, for
+    logs written by LogWriter); a rotated file is drained before the new one.
+    The journal cursor is journalctl's own.
+    """
+
+    def __init__(self, patterns, unit, cursors, out):
+        self.patterns = patterns
+        self.unit = unit
+        self.cursors = cursors
+        self.out = out
+
+    def _frame(self, header, payload=b""):
+        self.out.write(json.dumps(header).encode() + b"\n" + payload)
+
+    def _copy(self, source, f, limit=None):
+        sent = 0
+        while limit is None or sent < limit:
+            data = f.read(READ_BYTES if limit is None else min(READ_BYTES, limit - sent))
+            if not data:
+                break
+            self._frame({'source': source, 'len': len(data)}, data)
+            sent += len(data)
+        return sent
+
+    def _pieces(self, path, cursor, st):
+        """[(file, entries, compressed, start offset)] to send for `path`, oldest first."""
+        if cursor.get('ino') == st.st_ino:
+            offset = cursor['offset'] if st.st_size >= cursor['offset'] else 0 # Truncated: start over
+            return [(path, [], False, offset)]
+        pieces = []
+        if os.path.exists(path + ".idx"):
+            # Rotated by LogWriter: finish the cursor's segment, then every later one
+            # (no cursor yet: ship every segment)
+            started = cursor.get('started', -1 if not cursor else None)
+            for start, log, entries, compressed in segments(path)[:-1]:
+                named = segment_start(log)
+                if started is not None and named == int(started):
+                    pieces.append((log, entries, compressed, cursor['offset']))
+                elif started is not None and named > started:
+                    pieces.append((log, entries, compressed, 0))
+        elif cursor.get('ino') is not None:
+            # Rotated by something else (logrotate): look for the old inode nearby
+            for other in glob.glob(os.path.join(os.path.dirname(path), "*")):
+                try:
+                    if os.stat(other).st_ino == cursor['ino'] and not other.endswith(".gz"):
+                        pieces.append((other, [], False, cursor['offset']))
+                        break
+                except OSError:
+                    pass
+        return pieces + [(path, [], False, 0)]
+
+    def ship_file(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        cursor = self.cursors.get(path, {})
+        for log, entries, compressed, offset in self._pieces(path, cursor, st):
+            try:
+                f = open_at(log, entries, compressed, offset)
+            except OSError:
+                if log == path:
+                    return # Keep the cursor; retried next pass
+                continue
+            with f:
+                # The live file is read up to the size seen above; later bytes go next pass
+                self._copy(path, f, st.st_size - offset if log == path else None)
+        state = {'ino': st.st_ino, 'offset': st.st_size}
+        entries = read_index(path + ".idx")
+        if entries:
+            state['started'] = entries[0][0]
+        if state != cursor:
+            self.cursors[path] = state
+            self._frame({'cursor': path, 'state': state})
+
+    def ship_journal(self):
+        source = f"journal:{self.unit}"
+        cmd = ["journalctl", "-u", self.unit, "--no-pager", "-o", "short-iso", "--show-cursor"]
+        if self.cursors.get(source):
+            cmd += ["--after-cursor", self.cursors[source]]
+        try:
+            p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except OSError:
+            return # No systemd journal in this container
+        batch, cursor = [], None
+        for line in p.stdout:
+            if line.startswith(b"-- cursor: "):
+                cursor = line[11:].strip().decode()
+            elif not line.startswith(b"-- No entries --"):
+                batch.append(line)
+                if sum(map(len, batch)) >= READ_BYTES:
+                    self._frame({'source': source, 'len': sum(map(len, batch))}, b"".join(batch))
+                    batch = []
+        p.wait()
+        if batch:
+            self._frame({'source': source, 'len': sum(map(len, batch))}, b"".join(batch))
+        if cursor and cursor != self.cursors.get(source):
+            self.cursors[source] = cursor
+            self._frame({'cursor': source, 'state': cursor})
+
+    def run(self, follow=None):
+        while True:
+            paths = sorted({p for pattern in self.patterns for p in glob.glob(pattern)
+                            if os.path.isfile(p) and not p.endswith((".gz", ".idx"))})
+            for path in paths:
+                self.ship_file(path)
+            if self.unit:
+                self.ship_journal()
+            self._frame({'pass': time.time()})
+            self.out.flush()
+            if not follow:
+                return
+            time.sleep(follow)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('write', help="append stdin to LOG, indexing and rotating it")
+    p.add_argument('log')
+    p.add_argument('--max-mb', type=float, default=64)
+    p.add_argument('--max-hours', type=float, default=24)
+    p.add_argument('--keep-days', type=float, default=30)
+
+    p = sub.add_parser('search', help="search LOG and its segments")
+    p.add_argument('log')
+    p.add_argument('pattern')
+    p.add_argument('--since', type=float)
+    p.add_argument('--until', type=float)
+    p.add_argument('--limit', type=int, default=20)
+
+    p = sub.add_parser('ship', help="stream new data of every log source as frames (see Shipper)")
+    p.add_argument('--cursors', default='{}', help="JSON cursors from the previous run")
+    p.add_argument('--files', nargs='*', default=["/opt/terraria/*.log", "/var/log/terraria*"])
+    p.add_argument('--unit', default="terraria", help="systemd unit for the journal ('' to skip)")
+    p.add_argument('--follow', type=float, help="keep shipping every N seconds")
+
+    args = parser.parse_args()
+    if args.command == 'ship':
+        Shipper(args.files, args.unit, json.loads(args.cursors), sys.stdout.buffer).run(args.follow)
+    elif args.command == 'write':
+        LogWriter(args.log, int(args.max_mb * 1024 * 1024), args.max_hours * 3600,
+                  args.keep_days * 86400).run(sys.stdin.fileno())
+    else:
+        matches, truncated = search(args.log, args.pattern, args.since, args.until, args.limit)
+        print(json.dumps({'matches': matches, 'truncated': truncated}))
+
+
+if __name__ == '__main__':
+    main()
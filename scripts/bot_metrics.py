@@ -0,0 +1,266 @@
+"""In-process metrics collector for the Terraria container.
+
+Reads /proc/meminfo, /proc/uptime, /proc/loadavg, /proc/net/tcp{,6}, the
+process table (plus /proc/<pid>/stat of the server) and statvfs of the root
+filesystem directly instead of forking free/uptime/ss/pgrep/df. In Host Mode
+the files are read inside the container through a single exec-channel probe;
+inside the container they are read locally.
+"""
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+
+from bot_exec import ExecUnavailable
+
+PROC_FILES = (
+    '/proc/meminfo',
+    '/proc/uptime',
+    '/proc/loadavg',
+    '/proc/net/tcp',
+    '/proc/net/tcp6',
+)
+SERVER_PATTERN = "TerrariaServer"
+TCP_ESTABLISHED = "01"
+DISK_PATH = "/"
+
+CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+@dataclass
+class StatusSnapshot:
+    """Point-in-time view of the container, as seen from inside it."""
+    mem_total_mb: int = 0
+    mem_used_mb: int = 0
+    uptime_seconds: float = 0.0
+    load_avg: tuple = (0.0, 0.0, 0.0)
+    server_pids: list = field(default_factory=list)
+    port: str = "7777"
+    players: int = 0
+    disk_total_mb: int = 0
+    disk_used_mb: int = 0
+    server_rss_mb: int = 0
+    server_cpu_seconds: float = 0.0 # Cumulative user+system time of the server processes
+    collected_at: float = 0.0
+
+    @property
+    def running(self):
+        return bool(self.server_pids)
+
+    @property
+    def mem_percent(self):
+        return 100 * self.mem_used_mb // self.mem_total_mb if self.mem_total_mb else 0
+
+    @property
+    def mem_text(self):
+        return f"{self.mem_used_mb}MB / {self.mem_total_mb}MB"
+
+    @property
+    def disk_percent(self):
+        return 100 * self.disk_used_mb // self.disk_total_mb if self.disk_total_mb else 0
+
+    @property
+    def uptime_text(self):
+        return format_uptime(self.uptime_seconds)
+
+
+def parse_meminfo(text):
+    """Returns (total_mb, used_mb) using the same 'used' definition as free(1)."""
+    values = {}
+    for line in (text or "").splitlines():
+        key, _, rest = line.partition(':')
+        parts = rest.split()
+        if parts and parts[0].isdigit():
+            values[key] = int(parts[0])  # kB
+    total = values.get('MemTotal', 0)
+    if 'MemAvailable' in values:
+        used = total - values['MemAvailable']
+    else:
+        used = total - values.get('MemFree', 0) - values.get('Buffers', 0) - values.get('Cached', 0)
+    return total // 1024, max(used, 0) // 1024
+
+
+def parse_uptime(text):
+    try:
+        return float((text or "").split()[0])
+    except (IndexError, ValueError):
+        return 0.0
+
+
+def parse_loadavg(text):
+    try:
+        return tuple(float(x) for x in (text or "").split()[:3])
+    except ValueError:
+        return (0.0, 0.0, 0.0)
+
+
+def count_established(tcp_text, port):
+    """Count ESTABLISHED sockets whose local port is `port` in a /proc/net/tcp table."""
+    port_hex = f"{int(port):04X}"
+    count = 0
+    for line in (tcp_text or "").splitlines()[1:]:
+        parts = line.split(None, 4)
+        if len(parts) < 4 or parts[3] != TCP_ESTABLISHED:
+            continue
+        if parts[1].rpartition(':')[2].upper() == port_hex:
+            count += 1
+    return count
+
+
+def parse_proc_stat(text):
+    """Returns (cpu_seconds, rss_mb) from a /proc/<pid>/stat line."""
+    try:
+        # Fields after the ")" that closes the command name start at field 3 (state)
+        rest = text.rsplit(')', 1)[1].split()
+        ticks = int(rest[11]) + int(rest[12]) # utime + stime
+        return ticks / CLK_TCK, int(rest[21]) * PAGE_SIZE // (1024 * 1024)
+    except (AttributeError, IndexError, ValueError):
+        return 0.0, 0
+
+
+def parse_statvfs(text):
+    """Returns (total_mb, used_mb) from "frsize blocks bfree bavail", like df."""
+    try:
+        frsize, blocks, bfree, bavail = (int(x) for x in text.split())
+    except (AttributeError, ValueError):
+        return 0, 0
+    used = blocks - bfree
+    # df's Use% is relative to used + available (root-reserved blocks excluded)
+    return (used + bavail) * frsize // (1024 * 1024), used * frsize // (1024 * 1024)
+
+
+def format_uptime(seconds):
+    """Formats seconds like `uptime -p` (without the leading 'up')."""
+    minutes = int(seconds) // 60
+    days, minutes = divmod(minutes, 1440)
+    hours, minutes = divmod(minutes, 60)
+    parts = []
+    for value, unit in ((days, "day"), (hours, "hour"), (minutes, "minute")):
+        if value:
+            parts.append(f"{value} {unit}{'s' if value != 1 else ''}")
+    return ", ".join(parts) or "0 minutes"
+
+
+def read_local(paths, pattern=None, procstat=False, statvfs=()):
+    """Local equivalent of the exec-channel probe: (files, pids)."""
+    files = {}
+    for path in paths:
+        try:
+            with open(path, errors='replace') as f:
+                files[path] = f.read()
+        except OSError:
+            files[path] = None
+    pids = []
+    if pattern:
+        own = os.getpid()
+        for name in os.listdir('/proc'):
+            if not name.isdigit() or int(name) == own:
+                continue
+            try:
+                with open(f'/proc/{name}/cmdline', 'rb') as f:
+                    cmdline = f.read().replace(b'\0', b' ').decode(errors='replace')
+            except OSError:
+                continue
+            if pattern in cmdline:
+                pids.append(int(name))
+    for pid in (pids if procstat else []):
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                files[f'/proc/{pid}/stat'] = f.read()
+        except OSError:
+            pass
+    for path in statvfs:
+        try:
+            st = os.statvfs(path)
+            files[f'statvfs:{path}'] = f"{st.f_frsize} {st.f_blocks} {st.f_bfree} {st.f_bavail}"
+        except OSError:
+            files[f'statvfs:{path}'] = None
+    return files, pids
+
+
+def build_snapshot(files, pids, port):
+    total, used = parse_meminfo(files.get('/proc/meminfo'))
+    players = sum(count_established(files.get(p), port) for p in ('/proc/net/tcp', '/proc/net/tcp6'))
+    disk_total, disk_used = parse_statvfs(files.get(f'statvfs:{DISK_PATH}'))
+    cpu_seconds, rss_mb = 0.0, 0
+    for pid in pids:
+        cpu, rss = parse_proc_stat(files.get(f'/proc/{pid}/stat'))
+        cpu_seconds += cpu
+        rss_mb += rss
+    return StatusSnapshot(
+        mem_total_mb=total,
+        mem_used_mb=used,
+        uptime_seconds=parse_uptime(files.get('/proc/uptime')),
+        load_avg=parse_loadavg(files.get('/proc/loadavg')),
+        server_pids=sorted(pids),
+        port=str(port),
+        players=players,
+        disk_total_mb=disk_total,
+        disk_used_mb=disk_used,
+        server_rss_mb=rss_mb,
+        server_cpu_seconds=cpu_seconds,
+        collected_at=time.time(),
+    )
+
+
+SHELL_MARKER = "==> "
+
+
+def shell_probe_script(paths, pattern, statvfs=(DISK_PATH,)):
+    """Shell equivalent of the exec-channel probe (procstat on), for parse_shell_probe()."""
+    marker = SHELL_MARKER
+    script = "; ".join(f"echo '{marker}{p}'; cat {p} 2>/dev/null" for p in paths)
+    # [X]yz keeps pgrep from matching the bash running this very script
+    script += f"; echo '{marker}pids'; pids=$(pgrep -f '[{pattern[0]}]{pattern[1:]}'); echo \"$pids\""
+    script += f"; for p in $pids; do echo '{marker}/proc/'$p/stat; cat /proc/$p/stat 2>/dev/null; done"
+    for path in statvfs:
+        script += f"; echo '{marker}statvfs:{path}'; stat -f -c '%S %b %f %a' {path} 2>/dev/null"
+    return script + "; true"
+
+
+def parse_shell_probe(out, paths):
+    """Splits shell_probe_script() output back into (files, pids)."""
+    sections, current = {}, None
+    for line in (out or "").splitlines():
+        if line.startswith(SHELL_MARKER):
+            current = line[len(SHELL_MARKER):]
+            sections[current] = []
+        elif current is not None:
+            sections[current].append(line)
+    pids = [int(x) for x in sections.pop('pids', []) if x.strip().isdigit()]
+    files = {p: "\n".join(lines) if lines else None for p, lines in sections.items()}
+    for p in paths:
+        files.setdefault(p, None)
+    return files, pids
+
+
+class MetricsCollector:
+    """Collects StatusSnapshots, locally or through an ExecChannel.
+
+    `fallback` is an async shell runner (e.g. run_shell_async) used for a
+    single `cat`/`pgrep` call when the exec channel is unavailable.
+    """
+
+    def __init__(self, channel=None, fallback=None):
+        self.channel = channel
+        self.fallback = fallback
+
+    async def _probe_shell(self, paths, pattern):
+        out = await self.fallback(shell_probe_script(paths, pattern))
+        return parse_shell_probe(out, paths)
+
+    async def collect(self, port="7777"):
+        if not str(port).isdigit():
+            port = "7777"
+        if self.channel is None:
+            files, pids = read_local(PROC_FILES, SERVER_PATTERN, procstat=True, statvfs=(DISK_PATH,))
+        else:
+            try:
+                files, pids = await self.channel.probe(PROC_FILES, SERVER_PATTERN, procstat=True, statvfs=(DISK_PATH,))
+            except (ExecUnavailable, ConnectionError, RuntimeError, asyncio.TimeoutError):
+                # Read-only probe, so retrying over a plain shell is always safe
+                if self.fallback is None:
+                    raise
+                files, pids = await self._probe_shell(PROC_FILES, SERVER_PATTERN)
+        return build_snapshot(files, pids, port)
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""Resident Discord webhook notifier.
+
+discord_webhook.sh forks sed/md5sum/curl for every alert and pays a new TLS
+handshake each time. `bot_notify.py serve` stays up instead and accepts
+events as JSON lines on a local Unix socket:
+  - duplicate alerts (same title and description) are dropped for 60 s,
+    tracked in memory rather than in /tmp lock files;
+  - one keep-alive HTTPS connection per webhook host is reused;
+  - events arriving together are batched into one message of up to 10 embeds;
+  - Discord's rate limits are honoured: a 429 is retried after `retry_after`,
+    and an exhausted bucket (X-RateLimit-Remaining: 0) waits for its reset.
+
+`bot_notify.py send` takes the same arguments as discord_webhook.sh, hands
+the event to the daemon (starting one if none is running) and returns as
+soon as it is queued. It exits 1 if no daemon can be reached, so notify.sh
+falls back to discord_webhook.sh. The daemon exits after --idle seconds
+without events. Standard library only: it runs on the host and in containers.
+
+Usage:
+  bot_notify.py serve [--socket PATH] [--idle SECONDS]
+  bot_notify.py send --title T [--desc D] [--status S] [--field Name:Value ...] [--ping P] [--url URL]
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOCKET = os.getenv('TERRARIA_NOTIFY_SOCKET', f"/tmp/terraria-notify-{os.getuid()}.sock")
+DEDUP_SECONDS = 60 # Same cooldown discord_webhook.sh applies to identical messages
+BATCH_SECONDS = 1.0 # How long a burst is collected before it is sent
+MAX_EMBEDS = 10 # Discord's per-message limits
+MAX_MESSAGE_CHARS = 6000
+MAX_ATTEMPTS = 5
+FOOTER = "Terraria Proxmox Manager"
+
+# (color, thumbnail) per --status, as in discord_webhook.sh
+STYLES = {
+    'success': (3066993, "https://i.imgur.com/8g6p0hD.png"),
+    'error': (15158332, "https://i.imgur.com/Is1XGgH.png"),
+    'warn': (16776960, "https://i.imgur.com/Kgd7wgM.png"),
+    'info': (3447003, "https://terraria.org/assets/terraria-logo.png"),
+}
+STATUS_ALIASES = {'ok': 'success', 'fail': 'error', 'failure': 'error', 'warning': 'warn'}
+
+
+def webhook_url(explicit=None):
+    """--url, else DISCORD_WEBHOOK_URL, else discord.conf (like discord_webhook.sh)."""
+    if explicit:
+        return explicit
+    if os.getenv('DISCORD_WEBHOOK_URL'):
+        return os.environ['DISCORD_WEBHOOK_URL']
+    for conf in (os.path.join(SCRIPT_DIR, "..", "discord.conf"), "discord.conf"):
+        try:
+            with open(conf) as f:
+                for line in f:
+                    key, _, value = line.strip().partition("=")
+                    if key.split()[-1:] == ["DISCORD_WEBHOOK_URL"]: # Also "export KEY=..."
+                        return value.strip().strip("'\"")
+        except OSError:
+            continue
+    return ""
+
+
+def build_embed(event):
+    status = STATUS_ALIASES.get(event.get('status'), event.get('status'))
+    color, thumbnail = STYLES.get(status, STYLES['info'])
+    fields = []
+    for field in event.get('fields', [])[:25]:
+        name, _, value = field.partition(":")
+        fields.append({'name': name[:256] or "​", 'value': value[:1024] or "​", 'inline': True})
+    return {
+        'title': event.get('title', "Notification")[:256],
+        'description': event.get('desc', "")[:4096],
+        'color': color,
+        'thumbnail': {'url': thumbnail},
+        'fields': fields,
+        'footer': {'text': event.get('footer') or FOOTER},
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(event.get('at', time.time()))),
+    }
+
+
+def embed_chars(embed):
+    return (len(embed['title']) + len(embed['description']) + len(embed['footer']['text'])
+            + sum(len(f['name']) + len(f['value']) for f in embed['fields']))
+
+
+class Webhook:
+    """Sender thread for one webhook URL: batching, keep-alive and rate limits."""
+
+    def __init__(self, url):
+        self.url = url
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.netloc
+        self.https = parts.scheme == 'https'
+        self.path = parts.path + (f"?{parts.query}" if parts.query else "")
+        self.queue = queue.Queue()
+        self.conn = None
+        self.blocked_until = 0.0
+        self.carry = None # Event that did not fit in the previous message
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _connection(self):
+        if self.conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self.conn = cls(self.host, timeout=15)
+        return self.conn
+
+    def _post(self, payload):
+        """POSTs once; returns (status, retry delay or None)."""
+        body = json.dumps(payload).encode()
+        try:
+            conn = self._connection()
+            conn.request("POST", self.path, body, {'Content-Type': "application/json"})
+            resp = conn.getresponse()
+            data = resp.read()
+        except (OSError, http.client.HTTPException) as e:
+            # Dropped keep-alive connection or network error: reconnect and retry
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = None
+            print(f"notify: {self.host}: {e}", file=sys.stderr)
+            return None, 2.0
+        if resp.getheader('X-RateLimit-Remaining') == "0":
+            self.blocked_until = time.monotonic() + float(resp.getheader('X-RateLimit-Reset-After') or 1)
+        if resp.status == 429:
+            try:
+                delay = float(json.loads(data).get('retry_after', 1))
+            except (ValueError, AttributeError):
+                delay = float(resp.getheader('Retry-After') or 1)
+            return 429, delay
+        if resp.status >= 500:
+            return resp.status, 2.0
+        if resp.status >= 400:
+            print(f"notify: {self.host} rejected the message ({resp.status}): {data[:200]!r}", file=sys.stderr)
+        return resp.status, None
+
+    def _batch(self):
+        first, self.carry = self.carry or self.queue.get(), None
+        events = [first]
+        deadline = time.monotonic() + BATCH_SECONDS
+        chars = embed_chars(first['embed'])
+        while len(events) < MAX_EMBEDS:
+            try:
+                event = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            size = embed_chars(event['embed'])
+            if chars + size > MAX_MESSAGE_CHARS:
+                self.carry = event # Starts the next message
+                break
+            events.append(event)
+            chars += size
+        return events
+
+    def _run(self):
+        while True:
+            events = self._batch()
+            pings = " ".join(dict.fromkeys(e['ping'] for e in events if e.get('ping')))
+            payload = {'content': pings, 'embeds': [e['embed'] for e in events]}
+            for _ in range(MAX_ATTEMPTS):
+                wait = self.blocked_until - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                status, retry = self._post(payload)
+                if retry is None:
+                    break
+                time.sleep(retry)
+            else:
+                print(f"notify: giving up on {len(events)} message(s) for {self.host}", file=sys.stderr)
+
+
+class Notifier:
+    def __init__(self):
+        self.webhooks = {}
+        self.recent = {} # dedup key -> time sent
+        self.lock = threading.Lock()
+        self.last_event = time.monotonic()
+
+    def submit(self, event):
+        """Queues an event; returns False if it duplicates one sent in the last minute."""
+        url = event.get('url')
+        if not url:
+            return False
+        key = hashlib.sha1(f"{url}\0{event.get('title')}\0{event.get('desc')}".encode()).hexdigest()
+        now = time.monotonic()
+        with self.lock:
+            self.last_event = now
+            if now - self.recent.get(key, -DEDUP_SECONDS) < DEDUP_SECONDS:
+                return False
+            self.recent[key] = now
+            if len(self.recent) > 1000:
+                self.recent = {k: t for k, t in self.recent.items() if now - t < DEDUP_SECONDS}
+            webhook = self.webhooks.get(url) or self.webhooks.setdefault(url, Webhook(url))
+        webhook.queue.put({'embed': build_embed(event), 'ping': event.get('ping')})
+        return True
+
+    def idle(self):
+        with self.lock:
+            busy = any(not w.queue.empty() for w in self.webhooks.values())
+            return 0.0 if busy else time.monotonic() - self.last_event
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = "ok" if self.server.notifier.submit(json.loads(line)) else "dup"
+            except (ValueError, AttributeError) as e:
+                reply = f"error {e}"
+            self.wfile.write(reply.encode() + b"\n")
+
+
+def serve(path, idle=None):
+    try:
+        os.unlink(path) # Stale socket from a previous daemon
+    except FileNotFoundError:
+        pass
+    old = os.umask(0o077) # Socket only usable by this user
+    server = socketserver.ThreadingUnixStreamServer(path, _Handler)
+    os.umask(old)
+    server.daemon_threads = True
+    server.notifier = Notifier()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        while idle is None or server.notifier.idle() < idle:
+            time.sleep(5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def _connect(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(5)
+    sock.connect(path)
+    return sock
+
+
+def send(event, path=DEFAULT_SOCKET, autostart=True, idle=3600):
+    """Hands `event` to the daemon, starting one if needed. Returns the reply or None."""
+    try:
+        sock = _connect(path)
+    except OSError:
+        if not autostart:
+            return None
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", "--socket", path, "--idle", str(idle)],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+        sock = None
+        for _ in range(40):
+            time.sleep(0.05)
+            try:
+                sock = _connect(path)
+                break
+            except OSError:
+                continue
+        if sock is None:
+            return None
+    with sock:
+        sock.sendall(json.dumps(event).encode() + b"\n")
+        return sock.makefile().readline().strip() or None
+
+
+def event_from_args(argv):
+    """discord_webhook.sh-style arguments -> event dict."""
+    parser = argparse.ArgumentParser(prog="bot_notify.py send")
+    parser.add_argument('--url')
+    parser.add_argument('--title', default="Notification")
+    parser.add_argument('--desc', '--description', '--message', dest='desc', default="")
+    parser.add_argument('--status', default="info")
+    parser.add_argument('--ping', default="")
+    parser.add_argument('--field', dest='fields', action='append', default=[])
+    parser.add_argument('--footer')
+    args = parser.parse_args(argv)
+    return {'url': webhook_url(args.url), 'title': args.title, 'desc': args.desc, 'status': args.status,
+            'ping': args.ping, 'fields': args.fields, 'footer': args.footer, 'at': time.time()}
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "send":
+        # Hand-rolled split so `send` keeps discord_webhook.sh's exact flags
+        socket_path = os.getenv('TERRARIA_NOTIFY_SOCKET', DEFAULT_SOCKET)
+        event = event_from_args(sys.argv[2:])
+        if not event['url']:
+            print("Warning: DISCORD_WEBHOOK_URL not configured. Skipping notification.", file=sys.stderr)
+            return
+        if send(event, socket_path) is None:
+            sys.exit(1)
+        return
+
+    parser = argparse.ArgumentParser(description="Resident Discord webhook notifier.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('serve', help="run the daemon")
+    p.add_argument('--socket', default=DEFAULT_SOCKET)
+    p.add_argument('--idle', type=float, help="exit after this many seconds without events")
+    args = parser.parse_args()
+    serve(args.socket, args.idle)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""Bounded outbound message queue for the Terraria -> Discord bridge.
+
+Log handlers post here and return immediately; a single worker delivers to
+Discord. Bursts are coalesced (consecutive chat/death lines become one
+message, consecutive embeds are sent up to 10 per message) and a full queue
+applies the configured overflow policy instead of stalling log ingestion.
+Rate limits are left to discord.py, which waits out a 429 inside the API
+call: the single worker is blocked there, so delivery pauses for every
+producer while log handlers keep queueing.
+
+"Live" messages (e.g. world generation progress) are edited in place: only
+the latest content per key is kept and edits are throttled per key.
+"""
+import asyncio
+import time
+from collections import deque
+
+MAX_CONTENT = 2000 # Discord message limit
+MAX_EMBEDS = 10 # Embeds per message
+
+OVERFLOW_POLICIES = ('drop_oldest', 'summarise', 'block')
+
+
+class _Item:
+    __slots__ = ('channel_id', 'content', 'embed', 'created', 'origin')
+
+    def __init__(self, channel_id, content, embed, origin=None):
+        self.channel_id = channel_id
+        self.content = content
+        self.embed = embed
+        self.created = time.monotonic()
+        self.origin = origin # Wall-clock time the source (log line) was written
+
+
+class Outbox:
+    """Async outbox between event detection and Discord delivery.
+
+    `resolve_channel(channel_id)` returns an object with an async
+    `send(content=..., embeds=...)` (a discord.TextChannel), or None.
+    `observe(kind, name, seconds)`, if given, receives the latency of every
+    Discord call and of every delivered item (see bot_perf.py).
+    """
+
+    def __init__(self, resolve_channel, maxsize=500, overflow='summarise', coalesce_window=0.5, live_interval=2.5,
+                 observe=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+        self.resolve_channel = resolve_channel
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.coalesce_window = coalesce_window
+        self.live_interval = live_interval
+        self.observe = observe
+
+        self._queue = deque()
+        self._omitted = {} # channel_id -> events dropped under 'summarise'
+        self._live = {} # key -> (channel_id, embed) pending, or None to delete
+        self._live_msgs = {} # key -> sent discord.Message
+        self._live_last = {} # key -> monotonic time of last send/edit
+        self._wakeup = None
+        self._space = None
+        self._task = None
+
+        # Metrics
+        self.sent_messages = 0
+        self.sent_items = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.avg_lag = 0.0
+
+    # --- Producers ---
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._space = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def post(self, channel_id, content=None, embed=None, origin=None):
+        """Queue a message. Only waits when the queue is full and the policy is 'block'.
+
+        `origin` is when the message's source was written (time.time()), for the
+        end-to-end lag reported to `observe`.
+        """
+        if len(self._queue) >= self.maxsize:
+            if self.overflow == 'block':
+                while len(self._queue) >= self.maxsize:
+                    self._space.clear()
+                    await self._space.wait()
+            else:
+                old = self._queue.popleft()
+                self.dropped += 1
+                if self.overflow == 'summarise':
+                    self._omitted[old.channel_id] = self._omitted.get(old.channel_id, 0) + 1
+        self._queue.append(_Item(channel_id, content, embed, origin))
+        self._wake()
+
+    def post_live(self, key, channel_id, embed):
+        """Create or edit the live message `key`; intermediate updates are skipped."""
+        self._live[key] = (channel_id, embed)
+        self._wake()
+
+    def clear_live(self, key):
+        """Delete the live message `key` (if one was sent)."""
+        if key in self._live_msgs or key in self._live:
+            self._live[key] = None
+            self._wake()
+
+    def stats(self):
+        return {
+            'depth': len(self._queue),
+            'maxsize': self.maxsize,
+            'overflow': self.overflow,
+            'sent_messages': self.sent_messages,
+            'sent_items': self.sent_items,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'last_lag': round(self.last_lag, 3),
+            'avg_lag': round(self.avg_lag, 3),
+            'max_lag': round(self.max_lag, 3),
+        }
+
+    async def close(self, drain=2.0):
+        """Give queued messages up to `drain` seconds to go out, then stop the worker."""
+        if self._task is None:
+            return
+        deadline = time.monotonic() + drain
+        while self._queue and time.monotonic() < deadline and not self._task.done():
+            await asyncio.sleep(0.1)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # --- Worker ---
+
+    def _live_deadline(self):
+        """Seconds until the next live update may go out (None if nothing pending)."""
+        if not self._live:
+            return None
+        now = time.monotonic()
+        return max(0.0, min(self._live_last.get(k, 0.0) + self.live_interval - now for k in self._live))
+
+    async def _run(self):
+        while True:
+            try:
+                live_wait = self._live_deadline()
+                if not self._queue and live_wait != 0.0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), live_wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                if self._queue:
+                    # Give a burst a moment to accumulate so it can be coalesced
+                    age = time.monotonic() - self._queue[0].created
+                    if age < self.coalesce_window:
+                        await asyncio.sleep(self.coalesce_window - age)
+                    await self._deliver_batch()
+                await self._flush_live()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Outbox worker error: {e}")
+                await asyncio.sleep(1)
+
+    def _take_batch(self):
+        head = self._queue[0]
+        items = []
+        if head.embed is not None:
+            while self._queue and len(items) < MAX_EMBEDS:
+                item = self._queue[0]
+                if item.channel_id != head.channel_id or item.embed is None or item.content:
+                    break
+                items.append(self._queue.popleft())
+            return items, None, [i.embed for i in items]
+
+        size = 0
+        while self._queue:
+            item = self._queue[0]
+            if item.channel_id != head.channel_id or item.embed is not None:
+                break
+            text = item.content or ""
+            if items and size + len(text) + 1 > MAX_CONTENT:
+                break
+            items.append(self._queue.popleft())
+            size += len(text) + 1
+        content = "\n".join(i.content or "" for i in items)[:MAX_CONTENT]
+        return items, content, None
+
+    async def _deliver_batch(self):
+        head = self._queue[0]
+        omitted = self._omitted.pop(head.channel_id, 0)
+        if omitted:
+            summary = _Item(head.channel_id, f"⚠️ *{omitted} eventos omitidos (fila cheia)*", None)
+            self._queue.appendleft(summary)
+
+        items, content, embeds = self._take_batch()
+        self._space.set()
+        channel = self.resolve_channel(items[0].channel_id)
+        if channel is None:
+            self.dropped += len(items)
+            return
+        started = time.monotonic()
+        try:
+            if embeds:
+                await channel.send(content=content, embeds=embeds)
+            else:
+                await channel.send(content=content)
+        except Exception as e:
+            self.failed += len(items)
+            print(f"Outbox delivery failed: {e}")
+            return
+
+        now = time.monotonic()
+        self.sent_messages += 1
+        self.sent_items += len(items)
+        for item in items:
+            lag = now - item.created
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.avg_lag = lag if not self.avg_lag else 0.9 * self.avg_lag + 0.1 * lag # EWMA
+        self._observe_call('send', started)
+        if self.observe is not None:
+            wall = time.time()
+            for item in items:
+                self.observe('lag', 'outbox', now - item.created)
+                if item.origin is not None:
+                    self.observe('lag', 'log_to_post', max(0.0, wall - item.origin))
+
+    def _observe_call(self, call, started):
+        if self.observe is not None:
+            self.observe('discord', call, time.monotonic() - started)
+
+    async def _flush_live(self):
+        now = time.monotonic()
+        for key in list(self._live):
+            if now - self._live_last.get(key, 0.0) < self.live_interval and self._live[key] is not None:
+                continue
+            pending = self._live.pop(key)
+            msg = self._live_msgs.get(key)
+            try:
+                if pending is None:
+                    self._live_msgs.pop(key, None)
+                    self._live_last.pop(key, None)
+                    if msg is not None:
+                        started = time.monotonic()
+                        await msg.delete()
+                        self._observe_call('delete', started)
+                    continue
+                channel_id, embed = pending
+                if msg is not None:
+                    started = time.monotonic()
+                    try:
+                        await msg.edit(embed=embed)
+                        self._observe_call('edit', started)
+                    except Exception as e:
+                        if getattr(e, 'status', None) != 404:
+                            raise
+                        msg = None # Deleted by someone: recreate below
+                if msg is None:
+                    channel = self.resolve_channel(channel_id)
+                    if channel is None:
+                        continue
+                    started = time.monotonic()
+                    self._live_msgs[key] = await channel.send(embed=embed)
+                    self._observe_call('send', started)
+                self._live_last[key] = time.monotonic()
+            except Exception as e:
+                print(f"Outbox live update failed: {e}")
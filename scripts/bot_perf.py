@@ -0,0 +1,286 @@
+"""Latency instrumentation for the bot's hot paths, summarised by `!perf`.
+
+Off unless BOT_PERF=1 (or `!perf on`). While off, every hook returns after
+one attribute check, so the instrumented paths cost nothing measurable.
+
+Operations are recorded by (kind, name):
+  shell/<command>   TerrariaServer.shell calls, by command (`tail`, `systemctl restart`...)
+  exec/<op>         exec channel round trips (probe, tail, readstat, heads, sh)
+  command/<name>    Discord command handlers, from invoke to return
+  discord/<call>    outbox API calls (send, edit, delete)
+  log/batch         handling one batch of server log lines
+  lag/log_to_post   server_output.log write (file mtime) to the Discord post
+  lag/outbox        time a message waited in the outbox
+  lag/loop          how late the event loop woke a sleeping task
+
+Each keeps lifetime count, total and max plus the last `window` samples, which
+percentiles are computed from. Operations slower than `slow_ms` (lags: 5 s)
+and loop stalls longer than `stall_ms` go to a bounded slow-operation log; a
+stall entry carries the stack that was blocking the loop.
+
+profile() is an on-demand sampling profiler: it records the event loop's stack
+every few milliseconds and returns collapsed stacks (the flamegraph.pl /
+speedscope format). It does not depend on recording being enabled.
+"""
+import asyncio
+import collections
+import math
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+
+WINDOW = 1024 # Recent samples kept per operation
+SLOW_LOG_SIZE = 100
+LAG_SLOW_SECONDS = 5.0 # Lags include normal poll/coalesce delays: only log the bad ones
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SlowOp = collections.namedtuple('SlowOp', 'at kind name seconds detail')
+
+
+class OpStats:
+    __slots__ = ('count', 'total', 'max', 'samples')
+
+    def __init__(self, window=WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = collections.deque(maxlen=window)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.samples.append(seconds)
+
+    def percentiles(self, *qs):
+        """Nearest-rank percentiles (0-100) of the recent samples."""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return tuple(0.0 for _ in qs)
+        return tuple(ordered[max(0, math.ceil(len(ordered) * q / 100) - 1)] for q in qs)
+
+
+class _Timer:
+    __slots__ = ('perf', 'kind', 'name', 'detail', 'started')
+
+    def __init__(self, perf, kind, name, detail):
+        self.perf = perf
+        self.kind = kind
+        self.name = name
+        self.detail = detail
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.perf.observe(self.kind, self.name, time.perf_counter() - self.started, self.detail)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class PerfRecorder:
+    """Latency samples and the slow-operation log for every instrumented path."""
+
+    def __init__(self, enabled=False, slow_ms=500, stall_ms=100, window=WINDOW):
+        self.enabled = enabled
+        self.slow_seconds = slow_ms / 1000
+        self.stall_seconds = stall_ms / 1000
+        self.window = window
+        self.ops = {} # (kind, name) -> OpStats
+        self.slow = collections.deque(maxlen=SLOW_LOG_SIZE)
+        self.stalls = 0
+        self.since = time.time()
+
+    def record(self, kind, name, seconds):
+        """Adds a sample without slow-log bookkeeping."""
+        stats = self.ops.get((kind, name))
+        if stats is None:
+            stats = self.ops[(kind, name)] = OpStats(self.window)
+        stats.add(seconds)
+
+    def observe(self, kind, name, seconds, detail=None):
+        if not self.enabled:
+            return
+        self.record(kind, name, seconds)
+        if seconds >= (LAG_SLOW_SECONDS if kind == 'lag' else self.slow_seconds):
+            self.slow.append(SlowOp(time.time(), kind, name, seconds, detail))
+
+    def timer(self, kind, name, detail=None):
+        """`with perf.timer('log', 'batch'):` times the block (a no-op while disabled)."""
+        return _Timer(self, kind, name, detail) if self.enabled else NULL_TIMER
+
+    def stall(self, seconds, stack):
+        self.stalls += 1
+        self.slow.append(SlowOp(time.time(), 'loop', 'stall', seconds, stack))
+
+    def reset(self):
+        self.ops.clear()
+        self.slow.clear()
+        self.stalls = 0
+        self.since = time.time()
+
+    def summary(self):
+        """[(kind, name, stats)] ordered by kind, then by total time spent."""
+        return sorted(((kind, name, stats) for (kind, name), stats in self.ops.items()),
+                      key=lambda row: (row[0], -row[2].total))
+
+    def top_slow(self, count=10):
+        return sorted(self.slow, key=lambda op: op.seconds, reverse=True)[:count]
+
+
+def describe_stack(frame, depth=3):
+    """'file:line func < caller...' for the innermost frames, plus the innermost
+    frame of the bot's own code when the stack is deep in a library."""
+    if frame is None:
+        return None
+    frames = traceback.extract_stack(frame)[::-1] # Innermost first
+    picked = frames[:depth]
+    own = next((f for f in frames if f.filename.startswith(SCRIPT_DIR)), None)
+    if own is not None and own not in picked:
+        picked.append(own)
+    return " < ".join(f"{os.path.basename(f.filename)}:{f.lineno} {f.name}" for f in picked)
+
+
+class LoopMonitor:
+    """Measures event-loop lag and catches what is blocking the loop.
+
+    A task sleeps `interval` seconds at a time and records how late it woke
+    up. A watchdog thread notices when the loop has not come back within the
+    stall threshold and captures the loop thread's stack at that moment, i.e.
+    the callback that is hogging it.
+    """
+
+    def __init__(self, perf, interval=0.05):
+        self.perf = perf
+        self.interval = interval
+        self._task = None
+        self._stop = threading.Event()
+        self._loop_thread = None
+        self._beat = None
+        self._stack = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._loop_thread = threading.get_ident()
+        self._stop = threading.Event() # Fresh per run, so a stopping watchdog never sees it cleared
+        threading.Thread(target=self._watch, args=(self._stop,), name="perf-watchdog", daemon=True).start()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self._stack = None
+            self._beat = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - self._beat - self.interval)
+            self.perf.record('lag', 'loop', lag)
+            if lag >= self.perf.stall_seconds:
+                self.perf.stall(lag, self._stack)
+
+    def _watch(self, stop):
+        while not stop.wait(self.interval):
+            beat = self._beat
+            if beat is None or self._stack is not None:
+                continue
+            if time.perf_counter() - beat - self.interval >= self.perf.stall_seconds:
+                self._stack = describe_stack(sys._current_frames().get(self._loop_thread))
+
+
+def _collapse(frame):
+    parts = []
+    while frame is not None:
+        parts.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def _sample_thread(thread_id, seconds, interval):
+    stacks = collections.Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            stacks[_collapse(frame)] += 1
+        time.sleep(interval)
+    return stacks
+
+
+_profiling = False
+
+
+async def profile(seconds, interval=0.005):
+    """Samples the event loop's stack for `seconds`. Returns a Counter of
+    collapsed stacks ("file:func;file:func" -> samples).
+
+    When the loop runs in the main thread, an interval timer (SIGALRM) takes the
+    samples: the handler runs between bytecodes of whatever the loop is doing.
+    A sampling thread would only get the GIL when the loop releases it, i.e.
+    mostly while it sits idle in select(), and under-count busy code; it is
+    only the fallback. Raises RuntimeError if a profile is already running.
+    """
+    global _profiling
+    if _profiling:
+        raise RuntimeError("a profile is already running")
+    _profiling = True
+    try:
+        if threading.current_thread() is not threading.main_thread() or not hasattr(signal, 'setitimer'):
+            return await asyncio.to_thread(_sample_thread, threading.get_ident(), seconds, interval)
+        stacks = collections.Counter()
+
+        def sample(signum, frame):
+            stacks[_collapse(frame)] += 1
+
+        previous = signal.signal(signal.SIGALRM, sample)
+        signal.setitimer(signal.ITIMER_REAL, interval, interval)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+        return stacks
+    finally:
+        _profiling = False
+
+
+def top_functions(stacks, count=10):
+    """[(function, self samples)] from profile() output; the innermost frame is charged."""
+    own = collections.Counter()
+    for stack, samples in stacks.items():
+        own[stack.rsplit(";", 1)[-1]] += samples
+    return own.most_common(count)
+
+
+def collapsed(stacks):
+    """profile() output as text, one "stack samples" line each (flamegraph.pl input)."""
+    return "".join(f"{stack} {samples}\n" for stack, samples in stacks.most_common())
@@ -0,0 +1,87 @@
+"""Server registry for multi-server mode.
+
+One bot process can manage several Terraria containers, each with its own
+exec channel, log follower, status refresher, console writer and state
+files, on one event loop and one Discord connection. The servers are listed
+in a JSON file (BOT_SERVERS_FILE):
+
+  [
+    {"name": "survival", "ct_id": "105", "channel": 123456789012345678},
+    {"name": "hardcore", "ct_id": "106"}
+  ]
+
+  name     how commands address the server: `!survival status`
+  ct_id    container ID (multi-server mode runs on the Proxmox host)
+  channel  optional: commands sent in this channel go to this server, and its
+           join/leave/chat messages are posted there (`!monitor` overrides it)
+  dir      server directory inside the container (default /opt/terraria)
+  state    bot state directory on the host (default <registry dir>/<ct_id>,
+           the directory setup_bot.sh uses for a single server)
+
+Without a registry the bot manages the single server given by CT_ID, as before.
+"""
+import json
+import os
+import re
+from dataclasses import dataclass
+
+DEFAULT_SERVER_DIR = "/opt/terraria"
+NAME_RE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,31}$')
+
+
+@dataclass
+class ServerSpec:
+    name: str
+    ct_id: str = None
+    server_dir: str = DEFAULT_SERVER_DIR
+    state_dir: str = None
+    channel_id: int = None
+
+
+def load_registry(path, reserved=()):
+    """Parses the registry file into [ServerSpec]; ValueError says what is wrong.
+
+    `reserved` are names that cannot be used (the bot's command names, since
+    `!<name> ` is parsed as a prefix).
+    """
+    with open(path, encoding='utf-8') as f:
+        try:
+            entries = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"{path}: invalid JSON ({e})") from None
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path}: expected a non-empty list of servers")
+
+    base = os.path.dirname(os.path.abspath(path))
+    specs, seen_names, seen_cts = [], set(), set()
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"{path}: entry {i + 1} is not an object")
+        name = str(entry.get('name', '')).strip().lower()
+        ct_id = str(entry.get('ct_id', '')).strip()
+        where = f"{path}: server '{name or i + 1}'"
+        if not NAME_RE.match(name):
+            raise ValueError(f"{where}: name must be 1-32 lowercase letters, digits, '-' or '_'")
+        if name in reserved:
+            raise ValueError(f"{where}: name clashes with the !{name} command")
+        if name in seen_names:
+            raise ValueError(f"{where}: duplicate name")
+        if not ct_id.isdigit():
+            raise ValueError(f"{where}: ct_id must be a container ID")
+        if ct_id in seen_cts:
+            raise ValueError(f"{where}: container {ct_id} is listed twice")
+        channel = entry.get('channel')
+        try:
+            channel = int(channel) if channel else None
+        except (TypeError, ValueError):
+            raise ValueError(f"{where}: channel must be a Discord channel ID") from None
+        seen_names.add(name)
+        seen_cts.add(ct_id)
+        specs.append(ServerSpec(
+            name=name,
+            ct_id=ct_id,
+            server_dir=str(entry.get('dir') or DEFAULT_SERVER_DIR).rstrip('/'),
+            state_dir=os.path.join(base, entry['state']) if entry.get('state') else os.path.join(base, ct_id),
+            channel_id=channel,
+        ))
+    return specs
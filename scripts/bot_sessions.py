@@ -0,0 +1,278 @@
+"""Player sessions: joins and leaves from the server log, kept in SQLite.
+
+Every join opens a session row and every leave closes it. The aggregates the
+commands read are updated in the same transaction, so `!playtime`, `!seen`
+and `!top` are primary-key or index lookups however long the history is:
+  players      total playtime, session count, last seen, current session
+  concurrency  per number of players online: seconds spent at that level and
+               how many times it was reached (the peak-concurrency histogram)
+
+Sessions left open by a crash (no leave lines) are closed at the last time
+the server was known to be up: the status refresher calls touch() while it
+runs, and the next server start/stop line or a status check that finds the
+server down closes them there.
+
+backfill() seeds the store once from the existing server_output.log, streamed
+in chunks. Terraria prints no timestamps; each line's time comes from the
+index bot_logstore writes next to the log (to within a minute), so history
+contributes playtime, last seen and time at each concurrency level too.
+Stretches the index does not cover (a log older than bot_logstore) still
+count sessions and peaks, without durations.
+"""
+import os
+import sqlite3
+import time
+
+from bot_events import LogClassifier
+from bot_logs import CHUNK_SIZE, LineTimes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id      INTEGER PRIMARY KEY,
+    player  TEXT NOT NULL COLLATE NOCASE,
+    joined  REAL NOT NULL,
+    left    REAL,
+    closed  TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS sessions_by_player ON sessions (player, joined);
+CREATE INDEX IF NOT EXISTS sessions_open ON sessions (player) WHERE left IS NULL;
+CREATE TABLE IF NOT EXISTS players (
+    name          TEXT PRIMARY KEY COLLATE NOCASE,
+    seconds       REAL NOT NULL DEFAULT 0,
+    sessions      INTEGER NOT NULL DEFAULT 0,
+    last_seen     REAL,
+    online_since  REAL
+);
+CREATE INDEX IF NOT EXISTS players_by_time ON players (seconds DESC);
+CREATE INDEX IF NOT EXISTS players_by_seen ON players (last_seen DESC);
+CREATE TABLE IF NOT EXISTS concurrency (
+    level    INTEGER PRIMARY KEY,
+    seconds  REAL NOT NULL DEFAULT 0,
+    reached  INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key    TEXT PRIMARY KEY,
+    value  TEXT
+);
+"""
+# Lines that mean the server (re)started or stopped: nobody is connected any more
+RESET_EVENTS = ('server_starting', 'server_started', 'server_stopped')
+
+
+class SessionStore:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        # Small hot state, mirrored in memory so touch() is free when nobody is on
+        self.online = {name: since for name, since in
+                       self.db.execute("SELECT name, online_since FROM players WHERE online_since IS NOT NULL")}
+        self.level_since = float(self._meta('level_since') or time.time())
+        self.alive = float(self._meta('alive') or self.level_since)
+
+    def _meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _level_changed(self, at, reached=False):
+        # Time-weighted histogram: credit the level that just ended
+        level = len(self.online)
+        at = max(at, self.level_since)
+        prev = level - 1 if reached else level + 1
+        if prev >= 0:
+            self.db.execute("INSERT INTO concurrency (level) VALUES (?) ON CONFLICT DO NOTHING", (prev,))
+            self.db.execute("UPDATE concurrency SET seconds = seconds + ? WHERE level = ?",
+                            (at - self.level_since, prev))
+        if reached:
+            self.db.execute("INSERT INTO concurrency (level, reached) VALUES (?, 1) "
+                            "ON CONFLICT (level) DO UPDATE SET reached = reached + 1", (level,))
+        self.level_since = at
+        self._set_meta('level_since', at)
+
+    def _close(self, name, at, reason):
+        since = self.online.pop(name)
+        at = max(at, since)
+        self.db.execute("UPDATE sessions SET left = ?, closed = ? WHERE player = ? AND left IS NULL",
+                        (at, reason, name))
+        self.db.execute("UPDATE players SET seconds = seconds + ?, last_seen = ?, online_since = NULL "
+                        "WHERE name = ?", (at - since, at, name))
+        self._level_changed(at)
+
+    def join(self, name, at=None):
+        at = time.time() if at is None else at
+        if self._online_key(name) is not None:
+            return # Already open (duplicate line): keep the original start
+        with self.db:
+            self.db.execute("INSERT INTO sessions (player, joined) VALUES (?, ?)", (name, at))
+            self.db.execute("INSERT INTO players (name, sessions, last_seen, online_since) VALUES (?, 1, ?, ?) "
+                            "ON CONFLICT (name) DO UPDATE SET sessions = sessions + 1, "
+                            "last_seen = excluded.last_seen, online_since = excluded.online_since",
+                            (name, at, at))
+            self.online[name] = at
+            self._level_changed(at, reached=True)
+            self.alive = at
+            self._set_meta('alive', at)
+
+    def leave(self, name, at=None, reason='leave'):
+        at = time.time() if at is None else at
+        key = self._online_key(name)
+        if key is None:
+            return # Joined before tracking started
+        with self.db:
+            self._close(key, at, reason)
+
+    def close_all(self, at=None, reason='stop'):
+        """Closes every open session (server stopped or restarted). Returns how many."""
+        at = self.alive if at is None else at
+        names = list(self.online)
+        if names:
+            with self.db:
+                for name in names:
+                    self._close(name, at, reason)
+        return len(names)
+
+    def touch(self, running, at=None):
+        """Status heartbeat: records that the server is up, or closes orphaned sessions."""
+        if not self.online:
+            return 0
+        at = time.time() if at is None else at
+        if not running:
+            return self.close_all(reason='crash')
+        self.alive = at
+        with self.db:
+            self._set_meta('alive', at)
+        return 0
+
+    def _online_key(self, name):
+        return next((n for n in self.online if n.lower() == name.lower()), None)
+
+    def player(self, name, now=None):
+        """dict for one player (playtime includes a session in progress), or None."""
+        row = self.db.execute("SELECT name, seconds, sessions, last_seen, online_since FROM players WHERE name = ?",
+                              (name,)).fetchone()
+        if row is None:
+            return None
+        name, seconds, sessions, last_seen, online_since = row
+        if online_since is not None:
+            seconds += max(0.0, (time.time() if now is None else now) - online_since)
+        return {'name': name, 'seconds': seconds, 'sessions': sessions,
+                'last_seen': last_seen, 'online_since': online_since}
+
+    def top(self, limit=10):
+        """[(name, seconds, sessions)] by total playtime of finished sessions."""
+        return list(self.db.execute("SELECT name, seconds, sessions FROM players "
+                                    "ORDER BY seconds DESC LIMIT ?", (int(limit),)))
+
+    def recent(self, limit=10):
+        """[(name, last_seen, online)] most recently seen first."""
+        rows = self.db.execute("SELECT name, last_seen, online_since IS NOT NULL FROM players "
+                               "WHERE last_seen IS NOT NULL ORDER BY last_seen DESC LIMIT ?", (int(limit),))
+        return [(name, last_seen, bool(online)) for name, last_seen, online in rows]
+
+    def concurrency(self):
+        """[(players online, seconds at that level, times reached)], ascending."""
+        return list(self.db.execute("SELECT level, seconds, reached FROM concurrency ORDER BY level"))
+
+    @property
+    def backfilled(self):
+        return self._meta('backfilled') is not None
+
+    def merge_history(self, sessions, reached, end, seconds=None, last_seen=None, level_seconds=None):
+        """Adds backfilled history: {player: sessions}, {level: times reached} and,
+        where the log was indexed, {player: seconds}, {player: last seen} and
+        {level: seconds}."""
+        seconds, last_seen, level_seconds = seconds or {}, last_seen or {}, level_seconds or {}
+        with self.db:
+            self.db.executemany("INSERT INTO players (name, sessions, seconds, last_seen) VALUES (?, ?, ?, ?) "
+                                "ON CONFLICT (name) DO UPDATE SET sessions = sessions + excluded.sessions, "
+                                "seconds = seconds + excluded.seconds, "
+                                "last_seen = COALESCE(MAX(last_seen, excluded.last_seen), last_seen, excluded.last_seen)",
+                                [(name, count, seconds.get(name, 0), last_seen.get(name))
+                                 for name, count in sessions.items()])
+            self.db.executemany("INSERT INTO concurrency (level, reached, seconds) VALUES (?, ?, ?) "
+                                "ON CONFLICT (level) DO UPDATE SET reached = reached + excluded.reached, "
+                                "seconds = seconds + excluded.seconds",
+                                [(level, reached.get(level, 0), level_seconds.get(level, 0))
+                                 for level in sorted(set(reached) | set(level_seconds))])
+            self._set_meta('backfilled', end)
+            self._set_meta('backfilled_at', int(time.time()))
+
+    def close(self):
+        self.db.close()
+
+
+async def backfill(store, source, end, chunk_size=CHUNK_SIZE):
+    """Replays the log from the start up to byte `end` into `store`, once.
+
+    `source` is a bot_logs log source; the file is streamed `chunk_size` bytes
+    at a time and each line is timed by the index marks the source reports.
+    Returns the number of joins found.
+    """
+    classifier = LogClassifier()
+    times = LineTimes()
+    online = {} # lower name -> (name, joined at or None)
+    sessions, reached, seconds, last_seen, level_seconds = {}, {}, {}, {}, {}
+    level_since = last = None
+    offset, pending, joins = 0, b"", 0
+    ino = None
+
+    def level_changed(at, level):
+        # Time-weighted histogram, as live: credit the level that just ended
+        nonlocal level_since
+        if at is not None and level_since is not None:
+            level_seconds[level] = level_seconds.get(level, 0) + max(0.0, at - level_since)
+        level_since = at
+
+    def close(key, at):
+        name, since = online.pop(key)
+        if at is not None:
+            if since is not None:
+                seconds[name] = seconds.get(name, 0) + max(0.0, at - since)
+            last_seen[name] = max(last_seen.get(name, at), at)
+        level_changed(at, len(online) + 1)
+
+    while offset < end:
+        got = await source.read(ino, offset, min(chunk_size, end - offset))
+        if got is None or not got[3] or (ino is not None and got[0] != ino):
+            break # Gone, truncated or rotated under us: keep what was read
+        ino, data = got[0], got[3]
+        times.add(getattr(source, 'marks', None))
+        buf = pending + data
+        cut = buf.rfind(b"\n") + 1
+        lines, line_times = times.split(buf[:cut], offset - len(pending))
+        offset += len(data)
+        pending = buf[cut:]
+        times.forget(offset - len(pending))
+        for line, at in zip(lines, line_times):
+            event = classifier.classify(line.strip())
+            if event is not None:
+                if event.kind == 'join':
+                    name = event.get('player')
+                    if name.lower() not in online:
+                        online[name.lower()] = (name, at)
+                        sessions[name] = sessions.get(name, 0) + 1
+                        reached[len(online)] = reached.get(len(online), 0) + 1
+                        if at is not None:
+                            last_seen[name] = max(last_seen.get(name, at), at)
+                        level_changed(at, len(online) - 1)
+                        joins += 1
+                elif event.kind == 'leave':
+                    key = event.get('player', '').lower()
+                    if key in online:
+                        close(key, at)
+                elif event.kind in RESET_EVENTS:
+                    # Nobody survives a restart: close at the last line before it, like close_all()
+                    stop = at if event.kind == 'server_stopped' else last
+                    for key in list(online):
+                        close(key, stop)
+            if at is not None:
+                last = at
+    # Sessions still open at `end` have no end yet; live tracking starts after them
+    store.merge_history(sessions, reached, end, seconds, last_seen, level_seconds)
+    return joins
@@ -0,0 +1,189 @@
+"""Compact on-disk time series for the bot's metrics.
+
+Samples are folded into fixed-size ring buffers at several resolutions
+(10 s for a day, 1 min for a week, 15 min for a year) kept in one
+memory-mapped file. Every bucket stores the mean and the max of each metric,
+so !stats and !graph read pre-aggregated buckets of the finest tier that
+covers the requested span instead of scanning raw samples, and the file
+never grows (about 4 MB with the default layout).
+"""
+import json
+import mmap
+import os
+import re
+import struct
+
+DEFAULT_TIERS = ((10, 8640), (60, 10080), (900, 35040)) # (step seconds, slots)
+MAGIC = b"TTSDB2\0\0"
+HEADER_SIZE = 4096
+
+_SPAN_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'y': 31536000}
+
+
+def parse_span(text, default=86400):
+    """'30m', '24h', '7d', '1y' -> seconds. Returns None for invalid input."""
+    if not text:
+        return default
+    m = re.fullmatch(r'(\d+)\s*([smhdwy]?)', text.strip().lower())
+    if not m:
+        return None
+    return int(m.group(1)) * _SPAN_UNITS[m.group(2) or 'h']
+
+
+class _Tier:
+    """One ring of buckets: start time, then sample count, mean and max per metric."""
+
+    def __init__(self, step, slots, metrics, view):
+        self.step = step
+        self.slots = slots
+        pos = 0
+        self.ts = view[pos:pos + 8 * slots].cast('q')
+        pos += 8 * slots
+        self.count, self.avg, self.max = [], [], []
+        for _ in metrics:
+            self.count.append(view[pos:pos + 2 * slots].cast('H'))
+            pos += 2 * slots
+            self.avg.append(view[pos:pos + 4 * slots].cast('f'))
+            pos += 4 * slots
+            self.max.append(view[pos:pos + 4 * slots].cast('f'))
+            pos += 4 * slots
+
+    @staticmethod
+    def size(slots, metrics):
+        return slots * (8 + 10 * len(metrics))
+
+    def release(self):
+        for v in [self.ts] + self.count + self.avg + self.max:
+            v.release()
+
+    def add(self, ts, values):
+        bucket = int(ts) // self.step * self.step
+        i = bucket // self.step % self.slots
+        if self.ts[i] != bucket:
+            # Slot still holds a bucket from one ring-length ago: recycle it
+            self.ts[i] = bucket
+            for j in range(len(values)):
+                self.count[j][i] = 0
+                self.avg[j][i] = 0.0
+                self.max[j][i] = float('-inf')
+        for j, value in enumerate(values):
+            n = self.count[j][i] + 1
+            if value is None or n > 0xFFFF:
+                continue
+            self.count[j][i] = n
+            a = self.avg[j][i]
+            self.avg[j][i] = a + (value - a) / n
+            if value > self.max[j][i]:
+                self.max[j][i] = value
+
+    def buckets(self, j, start, end):
+        """(bucket_ts, count, mean, max) for every populated bucket in [start, end]."""
+        out = []
+        step, slots = self.step, self.slots
+        first = max(start // step, end // step - slots + 1)
+        ts, count, avg, mx = self.ts, self.count[j], self.avg[j], self.max[j]
+        for k in range(first, end // step + 1):
+            i = k % slots
+            if ts[i] == k * step and count[i]:
+                out.append((k * step, count[i], avg[i], mx[i]))
+        return out
+
+
+class TimeSeriesStore:
+    """Fixed-size, multi-resolution metric store backed by an mmap'ed file.
+
+    `metrics` is the ordered list of metric names; changing it (or the tiers)
+    starts a fresh file. Values are recorded with record(); None is skipped.
+    """
+
+    def __init__(self, path, metrics, tiers=DEFAULT_TIERS):
+        self.path = path
+        self.metrics = list(metrics)
+        self.tiers_spec = [tuple(t) for t in tiers]
+        layout = json.dumps({'metrics': self.metrics, 'tiers': self.tiers_spec}).encode()
+        size = HEADER_SIZE + sum(_Tier.size(slots, self.metrics) for _, slots in self.tiers_spec)
+        header = MAGIC + struct.pack('<I', len(layout)) + layout
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            existing = os.pread(fd, len(header), 0)
+            if existing != header or os.fstat(fd).st_size != size:
+                if os.fstat(fd).st_size:
+                    print(f"Metrics store layout changed, starting a new {path}")
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size) # Zero-filled: every slot reads as empty
+                os.pwrite(fd, header, 0)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        self._view = memoryview(self._mm)
+        self.tiers = []
+        pos = HEADER_SIZE
+        for step, slots in self.tiers_spec:
+            n = _Tier.size(slots, self.metrics)
+            self.tiers.append(_Tier(step, slots, self.metrics, self._view[pos:pos + n]))
+            pos += n
+
+    def record(self, values, ts):
+        row = [None if values.get(name) is None else float(values[name]) for name in self.metrics]
+        for tier in self.tiers:
+            tier.add(ts, row)
+
+    def tier_for(self, span):
+        """Finest tier whose ring covers `span` seconds (the coarsest one otherwise)."""
+        for tier in self.tiers:
+            if tier.step * tier.slots >= span:
+                return tier
+        return self.tiers[-1]
+
+    def query(self, metric, span, now, points=None):
+        """[(ts, mean, max)] over the last `span` seconds, merged down to `points` buckets."""
+        j = self.metrics.index(metric)
+        tier = self.tier_for(span)
+        rows = tier.buckets(j, int(now - span), int(now))
+        if points and len(rows) > points:
+            width = span / points
+            merged, cur, key = [], None, None
+            for ts, count, mean, peak in rows:
+                k = int((ts - (now - span)) // width)
+                if k != key:
+                    if cur:
+                        merged.append(cur)
+                    key, cur = k, [ts, count, mean * count, peak]
+                else:
+                    cur[1] += count
+                    cur[2] += mean * count
+                    cur[3] = max(cur[3], peak)
+            if cur:
+                merged.append(cur)
+            rows = [(ts, count, total / count, peak) for ts, count, total, peak in merged]
+        return [(ts, mean, peak) for ts, _count, mean, peak in rows]
+
+    def summary(self, metric, span, now):
+        """{'last', 'mean', 'low', 'peak', 'step'} over the span, or None without data."""
+        j = self.metrics.index(metric)
+        tier = self.tier_for(span)
+        rows = tier.buckets(j, int(now - span), int(now))
+        if not rows:
+            return None
+        samples = sum(count for _, count, _, _ in rows)
+        return {
+            'last': rows[-1][2],
+            'mean': sum(count * mean for _, count, mean, _ in rows) / samples,
+            'low': min(mean for _, _, mean, _ in rows),
+            'peak': max(peak for _, _, _, peak in rows),
+            'step': tier.step,
+        }
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        if self._mm.closed:
+            return
+        for tier in self.tiers:
+            tier.release()
+        self._view.release()
+        self._mm.flush()
+        self._mm.close()
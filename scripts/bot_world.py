@@ -0,0 +1,252 @@
+"""World (.wld) metadata from the file header, without loading the tiles.
+
+A .wld starts with a short preamble (file version, "relogic" magic, save
+revision, section table) followed by the header section: name, seed, size,
+game mode, creation time, evil biome, boss flags, hardmode... The tile data
+that makes up almost all of the file comes after it and is never touched: the
+file is memory-mapped and only the pages holding the header are read.
+
+Parsed results are cached per path and reused until the file's signature
+(mtime, size, inode) changes, so listing dozens of worlds costs one stat each.
+In Host Mode the stats run inside the container over the exec channel, and the
+header bytes are only transferred for files that changed.
+"""
+import asyncio
+import mmap
+import os
+import struct
+from dataclasses import asdict, dataclass, field
+
+from bot_exec import ExecUnavailable
+
+HEAD_BYTES = 65536 # Far more than the preamble plus the header fields read below
+
+GAME_MODES = {0: "Classic", 1: "Expert", 2: "Master", 3: "Journey"}
+WORLD_SIZES = {4200: "Small", 6400: "Medium", 8400: "Large"}
+# Header booleans in file order, from Eye of Cthulhu to Golem (then King Slime, v118+)
+BOSS_FLAGS = ("Eye of Cthulhu", "Eater of Worlds / Brain of Cthulhu", "Skeletron", "Queen Bee",
+              "The Destroyer", "The Twins", "Skeletron Prime", None, "Plantera", "Golem")
+# (first file version, flag) for the special-seed booleans of 1.4 worlds
+SPECIAL_SEEDS = ((222, "drunk"), (227, "for the worthy"), (238, "celebrationmk10"),
+                 (239, "the constant"), (241, "not the bees"), (249, "remix"),
+                 (266, "no traps"), (267, "zenith"))
+# Newest known release for a file version (highest first)
+RELEASES = ((279, "1.4.4.9"), (269, "1.4.4"), (242, "1.4.3"), (238, "1.4.2"),
+            (232, "1.4.1"), (225, "1.4.0"), (194, "1.3.5"), (147, "1.3"))
+DOTNET_EPOCH_TICKS = 621355968000000000 # 1970-01-01 in .NET ticks (100 ns)
+
+
+@dataclass
+class WorldInfo:
+    name: str
+    seed: str
+    version: int
+    revision: int
+    width: int
+    height: int
+    game_mode: int
+    crimson: bool
+    hardmode: bool
+    created: int = None # Unix time
+    bosses: list = field(default_factory=list)
+    special: list = field(default_factory=list)
+
+    @property
+    def size_name(self):
+        return WORLD_SIZES.get(self.width, f"{self.width}x{self.height}")
+
+    @property
+    def difficulty(self):
+        return GAME_MODES.get(self.game_mode, str(self.game_mode))
+
+    @property
+    def evil(self):
+        return "Crimson" if self.crimson else "Corruption"
+
+    @property
+    def release(self):
+        """Game release the file was last saved with (best known match)."""
+        return next((name for version, name in RELEASES if self.version >= version), f"v{self.version}")
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class _Reader:
+    """Little-endian .NET BinaryReader over a buffer (bytes or mmap)."""
+
+    def __init__(self, buf, pos=0):
+        self.buf = buf
+        self.pos = pos
+
+    def _unpack(self, fmt, size):
+        try:
+            value, = struct.unpack_from(fmt, self.buf, self.pos)
+        except struct.error:
+            raise ValueError("truncated world header")
+        self.pos += size
+        return value
+
+    def i16(self): return self._unpack('<h', 2)
+    def i32(self): return self._unpack('<i', 4)
+    def u32(self): return self._unpack('<I', 4)
+    def i64(self): return self._unpack('<q', 8)
+    def u64(self): return self._unpack('<Q', 8)
+    def u8(self): return self._unpack('<B', 1)
+    def bool(self): return self.u8() != 0
+
+    def skip(self, size):
+        self.pos += size
+
+    def string(self):
+        # 7-bit encoded length prefix, then UTF-8
+        length = shift = 0
+        while True:
+            byte = self.u8()
+            length |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+        if self.pos + length > len(self.buf):
+            raise ValueError("truncated world header")
+        text = bytes(self.buf[self.pos:self.pos + length]).decode('utf-8', errors='replace')
+        self.pos += length
+        return text
+
+
+def parse_world_header(buf):
+    """Parses the preamble and header section of a .wld held in `buf`.
+
+    Raises ValueError for files that are not (supported) world files.
+    """
+    r = _Reader(buf)
+    version = r.i32()
+    revision = 0
+    if version >= 135:
+        if bytes(buf[4:11]) != b"relogic" or buf[11] != 2:
+            raise ValueError("not a Terraria world file")
+        r.skip(8)
+        revision = r.u32()
+        r.skip(8) # Favourite flags
+    elif version < 88:
+        raise ValueError(f"world file version {version} is too old")
+    sections = r.i16()
+    if sections < 1:
+        raise ValueError("world file has no section table")
+    r.pos = r.i32() # Header section starts at the first section pointer
+
+    name = r.string()
+    seed = ""
+    if version >= 179:
+        seed = str(r.i32()) if version == 179 else r.string()
+        r.skip(8) # World generator version
+    if version >= 181:
+        r.skip(16) # Unique id
+    r.skip(4 + 16) # World id, left/right/top/bottom
+    height, width = r.i32(), r.i32()
+    if not (0 < width <= 100000 and 0 < height <= 100000):
+        raise ValueError("unrecognised world header")
+
+    special = []
+    if version >= 209:
+        game_mode = r.i32()
+        for first, label in SPECIAL_SEEDS:
+            if version >= first and r.bool():
+                special.append(label)
+    else:
+        game_mode = 1 if version >= 112 and r.bool() else 0
+        if version == 208 and r.bool():
+            game_mode = 2
+
+    created = None
+    if version >= 141:
+        ticks = r.i64() & 0x3FFFFFFFFFFFFFFF # DateTime.ToBinary(): top bits are the kind
+        if ticks > DOTNET_EPOCH_TICKS:
+            created = (ticks - DOTNET_EPOCH_TICKS) // 10000000
+
+    r.skip(1 + 12 + 16 + 12 + 16 + 12) # Moon type, tree and cave backgrounds, ice/jungle/hell styles
+    r.skip(8 + 24 + 7 + 8) # Spawn tile, surface/rock/time, day/moon/blood moon/eclipse, dungeon
+    crimson = r.bool()
+    bosses = [label for label in BOSS_FLAGS if r.bool() and label]
+    if version >= 118 and r.bool():
+        bosses.insert(0, "King Slime")
+    r.skip(7 + 2 + 1 + 4) # NPCs saved, invasions beaten, orbs/meteor, orb count, altar count
+    hardmode = r.bool()
+
+    return WorldInfo(name=name, seed=seed, version=version, revision=revision,
+                     width=width, height=height, game_mode=game_mode, crimson=crimson,
+                     hardmode=hardmode, created=created, bosses=bosses, special=special)
+
+
+def read_world_header(path):
+    """WorldInfo of a local .wld; only the header pages are read from disk."""
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return parse_world_header(mm)
+
+
+class WorldInfoCache:
+    """WorldInfo per .wld path, re-parsed only when the file changes."""
+
+    def __init__(self, channel=None):
+        self.channel = channel
+        self._cache = {} # path -> (signature, WorldInfo or None)
+
+    def _store(self, path, sig, parse):
+        try:
+            info = parse()
+        except (OSError, ValueError):
+            info = None
+        self._cache[path] = (sig, info)
+        return info
+
+    def _scan_local(self, directory, paths):
+        paths = list(paths)
+        if directory:
+            try:
+                paths += sorted(os.path.join(directory, n) for n in os.listdir(directory) if n.endswith(".wld"))
+            except OSError:
+                pass
+        result = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                self._cache.pop(path, None)
+                continue
+            sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+            cached = self._cache.get(path)
+            if cached is not None and cached[0] == sig:
+                result[path] = cached[1]
+            else:
+                result[path] = self._store(path, sig, lambda: read_world_header(path))
+        return result
+
+    async def _scan_channel(self, directory, paths):
+        since = {path: list(sig) for path, (sig, _) in self._cache.items()}
+        try:
+            files = await self.channel.heads(paths, directory=directory, suffix=".wld",
+                                             since=since, max_bytes=HEAD_BYTES)
+        except (ExecUnavailable, ConnectionError, asyncio.TimeoutError):
+            return {}
+        result = {}
+        for path, (sig, head) in files.items():
+            sig = tuple(sig)
+            cached = self._cache.get(path)
+            if head is None and cached is not None and cached[0] == sig:
+                result[path] = cached[1]
+            else:
+                result[path] = self._store(path, sig, lambda: parse_world_header(head or b""))
+        return result
+
+    async def scan(self, directory=None, paths=()):
+        """{path: WorldInfo or None} for every .wld in `directory` plus `paths`.
+
+        None marks a file that exists but could not be parsed.
+        """
+        if self.channel is not None:
+            return await self._scan_channel(directory, list(paths))
+        return self._scan_local(directory, paths)
+
+    async def get(self, path):
+        return (await self.scan(paths=[path])).get(path)
@@ -3,11 +3,30 @@ import os
 import asyncio
 import signal
 import re
-import aiohttp
 import datetime
 import shutil
 import shlex
+import time
+import io
+import json
 from discord.ext import commands
+from bot_exec import ExecChannel, ExecUnavailable
+from bot_metrics import MetricsCollector
+from bot_config import ConfigCache
+from bot_http import HttpPool, PublicIPResolver, DEFAULT_IP_PROVIDER
+from bot_logs import LogFollower, LocalLogSource, ChannelLogSource, capture_output
+from bot_events import LogClassifier
+from bot_outbox import Outbox, OVERFLOW_POLICIES
+from bot_console import ConsoleWriter, ConsoleBusy, ConsoleError, ConsoleRateLimited, ConsoleUnavailable
+from bot_timeseries import TimeSeriesStore, parse_span
+from bot_graph import render_chart
+from bot_backup import STAGE_DIR, SAVE_TIMEOUT, snapshot_script, worlds_dir
+from bot_catalog import BackupCatalog, BackupEntry, world_names
+from bot_world import WorldInfoCache
+from bot_sessions import SessionStore, RESET_EVENTS, backfill as backfill_sessions
+from bot_servers import DEFAULT_SERVER_DIR, load_registry
+from bot_exporter import MetricsExporter, ServerCounters
+from bot_perf import PerfRecorder, LoopMonitor, profile, top_functions, collapsed
 
 # --- CONFIGURATION (INTERNAL) ---
 TOKEN = os.getenv('DISCORD_BOT_TOKEN')
@@ -19,10 +38,53 @@ except ValueError:
 # Configuration for Host Mode
 CT_ID = os.getenv('CT_ID')
 HAS_PCT = shutil.which('pct') is not None
-SERVER_DIR = "/opt/terraria"
-LOG_FILE = f"{SERVER_DIR}/server_output.log"
-CONFIG_FILE = f"{SERVER_DIR}/serverconfig.txt"
-CHANNEL_ID_FILE = f"{SERVER_DIR}/.discord_channel_id"
+SERVER_DIR = DEFAULT_SERVER_DIR
+# Bot state (channel ids, log offset...). Defaults to SERVER_DIR inside the container;
+# Host Mode installs point BOT_STATE_DIR at a host directory.
+STATE_DIR = os.getenv('BOT_STATE_DIR', SERVER_DIR)
+# Multi-server mode: one bot for every container listed here (see bot_servers.py)
+SERVERS_FILE = os.getenv('BOT_SERVERS_FILE', '')
+
+# Background status refresher
+try:
+    STATUS_REFRESH_SECONDS = max(5, int(os.getenv('STATUS_REFRESH_SECONDS', '15')))
+except ValueError:
+    STATUS_REFRESH_SECONDS = 15
+IP_REFRESH_SECONDS = 600
+PUBLIC_IP_URL = os.getenv('PUBLIC_IP_URL', DEFAULT_IP_PROVIDER)
+DASHBOARD_MIN_EDIT_SECONDS = 30 # Coalesce dashboard edits (Discord rate limits)
+METRICS_SAMPLE_SECONDS = 10 # Matches the finest tier of the metrics store
+# Prometheus endpoint (GET /metrics), served from cached state; 0 disables it
+try:
+    METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+except ValueError:
+    METRICS_PORT = 0
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+# Latency instrumentation for !perf (off by default; `!perf on` enables it at runtime)
+PERF_ENABLED = os.getenv('BOT_PERF', '0') == '1'
+try:
+    PERF_SLOW_MS = max(1, int(os.getenv('PERF_SLOW_MS', '500')))
+except ValueError:
+    PERF_SLOW_MS = 500
+try:
+    PERF_STALL_MS = max(10, int(os.getenv('PERF_STALL_MS', '100')))
+except ValueError:
+    PERF_STALL_MS = 100
+PROFILE_MAX_SECONDS = 60
+try:
+    MANUAL_BACKUP_KEEP = max(1, int(os.getenv('MANUAL_BACKUP_KEEP', '5')))
+except ValueError:
+    MANUAL_BACKUP_KEEP = 5
+
+# Outbound Discord queue for log events (bridge, joins, deaths...)
+try:
+    OUTBOX_MAXSIZE = max(10, int(os.getenv('OUTBOX_MAXSIZE', '500')))
+except ValueError:
+    OUTBOX_MAXSIZE = 500
+OUTBOX_OVERFLOW = os.getenv('OUTBOX_OVERFLOW', 'summarise')
+if OUTBOX_OVERFLOW not in OVERFLOW_POLICIES:
+    print(f"Warning: invalid OUTBOX_OVERFLOW '{OUTBOX_OVERFLOW}', using 'summarise'.")
+    OUTBOX_OVERFLOW = 'summarise'
 
 # Detect Service Manager
 SERVICE_CMD = "systemctl" # default
@@ -33,122 +95,320 @@ elif not shutil.which('systemctl'):
      print("Warning: Neither systemctl nor supervisorctl found.")
 
 # Setup Bot
+COMMAND_PREFIX = '!'
+SERVERS = {} # name -> TerrariaServer, filled in below
+
+def command_prefix(bot, message):
+    # `!<server> <command>` addresses one server; a plain `!` is routed by channel
+    head = message.content[len(COMMAND_PREFIX):].split(" ", 1)[0]
+    if message.content.startswith(COMMAND_PREFIX) and head.lower() in SERVERS and len(SERVERS) > 1:
+        return [f"{COMMAND_PREFIX}{head} ", COMMAND_PREFIX]
+    return COMMAND_PREFIX
+
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+bot = commands.Bot(command_prefix=command_prefix, intents=intents)
 bot.remove_command('help') # Remove default help to use custom one
 
-async def run_shell_async(command):
-    try:
-        if CT_ID and HAS_PCT:
-            full_command = f"pct exec {CT_ID} -- bash -c {shlex.quote(command)}"
-        else:
-            full_command = command
+# Hot-path timings (see bot_perf.py); every hook is a no-op while PERF is disabled
+PERF = PerfRecorder(enabled=PERF_ENABLED, slow_ms=PERF_SLOW_MS, stall_ms=PERF_STALL_MS)
+LOOP_MONITOR = LoopMonitor(PERF)
 
-        process = await asyncio.create_subprocess_shell(
-            full_command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-        stdout_text = stdout.decode(errors='replace').strip()
-        stderr_text = stderr.decode(errors='replace').strip()
+async def _fork_shell(full_command):
+    process = await asyncio.create_subprocess_shell(
+        full_command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    return process.returncode, stdout.decode(errors='replace'), stderr.decode(errors='replace')
 
-        if process.returncode != 0:
-            return stderr_text or stdout_text or f"Command failed with exit code {process.returncode}"
 
-        return stdout_text
-    except Exception as e:
-        return f"Error: {str(e)}"
+def command_kind(command):
+    """Latency label for a shell command: its program, plus the action for service tools."""
+    words = command.split(None, 2)
+    if not words:
+        return "?"
+    if len(words) > 1 and words[0] in ('systemctl', 'supervisorctl', 'tmux'):
+        return f"{words[0]} {words[1]}"
+    return words[0]
 
 
 def build_tmux_command(command_text):
     return f"tmux send-keys -t terraria {shlex.quote(command_text)} Enter"
 
 
-async def get_public_ip():
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get('https://api.ipify.org', timeout=5) as resp:
-                IP = await resp.text()
-                return IP.strip()
-    except Exception as e:
-        print(f"Failed to get IP: {e}")
-        return "Unknown IP"
+# Console input goes through one persistent `tmux -C` client, in order;
+# the per-command send-keys above is only the fallback.
+CONSOLE_ARGV = ["tmux", "-C", "attach-session", "-t", "terraria"]
+
+# One pooled HTTP session for the bot's lifetime, shared by every server
+HTTP = HttpPool()
+PUBLIC_IP = PublicIPResolver(HTTP, PUBLIC_IP_URL, ttl=IP_REFRESH_SECONDS)
+
+class StatusState:
+    """Latest status snapshot, shared by !status, the presence and the dashboard."""
+    def __init__(self, name=None):
+        self.name = name
+        self.snapshot = None
+        self.server_info = {'world': 'Unknown', 'port': '7777'}
+        self.public_ip = PUBLIC_IP.value
+        self.updated_at = 0.0
+        self.lock = None
+
+
+class TerrariaServer:
+    """One managed server: its container, caches, console and per-server bot state.
+
+    Everything that talks to a container hangs off this object, so a slow or
+    unreachable container only delays its own tasks and commands.
+    """
+
+    def __init__(self, name, ct_id=None, server_dir=SERVER_DIR, state_dir=STATE_DIR, channel_id=None):
+        self.name = name
+        self.ct_id = ct_id
+        self.server_dir = server_dir
+        self.log_file = f"{server_dir}/server_output.log"
+        self.config_file = f"{server_dir}/serverconfig.txt"
+        self.state_dir = state_dir
+        self.channel_id_file = f"{state_dir}/.discord_channel_id"
+        self.dashboard_file = f"{state_dir}/.discord_dashboard"
+        self.log_offset_file = f"{state_dir}/.log_offset"
+        self.metrics_file = f"{state_dir}/metrics.tsdb"
+        self.backup_catalog_file = f"{state_dir}/backups.db"
+        self.sessions_file = f"{state_dir}/sessions.db"
+
+        # One long-lived exec session into the container (Host Mode only)
+        self.exec_channel = None
+        if ct_id and HAS_PCT:
+            self.exec_channel = ExecChannel(ct_id, observe=lambda op, seconds: PERF.observe('exec', op, seconds, f"CT {ct_id}"))
+        self.collector = MetricsCollector(self.exec_channel, fallback=self.shell)
+        self.config = ConfigCache(self.config_file, self.exec_channel, fallback=self.shell)
+        self.worlds = WorldInfoCache(self.exec_channel)
+        console_argv = CONSOLE_ARGV
+        if self.exec_channel is not None:
+            console_argv = ["pct", "exec", ct_id, "--"] + CONSOLE_ARGV
+        self.console = ConsoleWriter(console_argv, fallback=lambda text: self.shell(build_tmux_command(text)))
+        # Command output: only log lines written after the command was sent
+        self.capture_source = self.log_source()
+
+        self.status = StatusState(name)
+        self.counters = ServerCounters() # Log-derived counters for /metrics
+        self.log_channel_id = channel_id # Channel receiving join/leave/chat updates
+        self.log_written_at = None # Log mtime for the batch being handled (!perf origin; event time without an index)
+        self.dashboard_ref = None
+        self.dashboard_msg = None
+        self.dashboard_fingerprint = None
+        self.dashboard_last_edit = 0.0
+        self.metrics_store = None
+        self.catalog = None
+        self.sessions = None
+        self.tasks = {}
+
+    def __repr__(self):
+        return f"TerrariaServer({self.name!r}, ct_id={self.ct_id!r})"
+
+    async def shell(self, command):
+        started = time.perf_counter()
+        try:
+            return await self._shell(command)
+        finally:
+            if PERF.enabled:
+                PERF.observe('shell', command_kind(command), time.perf_counter() - started,
+                             f"{server_tag(self)}{command[:100]}")
+
+    async def _shell(self, command):
+        try:
+            if self.exec_channel is not None:
+                # Host mode: reuse the persistent channel, fall back to a one-off pct exec
+                try:
+                    returncode, stdout_text, stderr_text = await self.exec_channel.run(command)
+                except ExecUnavailable:
+                    returncode, stdout_text, stderr_text = await _fork_shell(
+                        f"pct exec {self.ct_id} -- bash -c {shlex.quote(command)}"
+                    )
+            else:
+                returncode, stdout_text, stderr_text = await _fork_shell(command)
+
+            stdout_text = stdout_text.strip()
+            stderr_text = stderr_text.strip()
+
+            if returncode != 0:
+                return stderr_text or stdout_text or f"Command failed with exit code {returncode}"
 
-async def get_server_info():
-    info = {'world': 'Unknown', 'port': '7777'}
+            return stdout_text
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+    async def send_console(self, text, user=None):
+        """Types a line into the server console. Returns an error message or ''."""
+        try:
+            await self.console.send(text, user)
+        except (ConsoleError, ConsoleUnavailable, ConsoleBusy, ConsoleRateLimited, ConnectionError) as e:
+            return str(e) or "Console unavailable"
+        return ""
+
+    def log_source(self):
+        if self.exec_channel is not None:
+            return ChannelLogSource(self.exec_channel, self.log_file)
+        return LocalLogSource(self.log_file)
+
+    def backup_catalog(self):
+        # Catalog of !backup archives: listing, totals and retention are index queries
+        if self.catalog is None:
+            self.catalog = BackupCatalog(self.backup_catalog_file)
+        return self.catalog
+
+    def session_store(self):
+        # Player sessions (joins/leaves): every lookup is an indexed query
+        if self.sessions is None:
+            self.sessions = SessionStore(self.sessions_file)
+        return self.sessions
+
+    async def close(self):
+        if self.exec_channel is not None:
+            await self.exec_channel.close()
+        await self.console.close()
+        if self.metrics_store is not None:
+            self.metrics_store.close()
+        if self.catalog is not None:
+            self.catalog.close()
+        if self.sessions is not None:
+            self.sessions.close()
+
+
+def load_servers():
+    """The registry from BOT_SERVERS_FILE, or the single server given by CT_ID."""
+    if not SERVERS_FILE or not os.path.exists(SERVERS_FILE):
+        return [TerrariaServer("terraria", CT_ID)]
+    if not HAS_PCT:
+        raise SystemExit(f"{SERVERS_FILE}: multi-server mode runs on the Proxmox host (pct not found)")
+    reserved = {name for command in bot.commands for name in (command.name, *command.aliases)}
     try:
-        # Read config via shell (cat) to support both Host and Container modes
-        content = await run_shell_async(f"cat {CONFIG_FILE}")
-        
-        if not content or "No such file" in content:
-            return info
-            
-        for line in content.split('\n'):
-            line = line.strip()
-            if line.startswith("world="):
-                # Format: world=/path/to/WorldName.wld
-                path = line.split("=", 1)[1]
-                info['world'] = os.path.basename(path).replace(".wld", "")
-            elif line.startswith("port="):
-                info['port'] = line.split("=", 1)[1]
+        specs = load_registry(SERVERS_FILE, reserved=reserved)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Invalid server registry: {e}")
+    servers = []
+    for spec in specs:
+        os.makedirs(spec.state_dir, exist_ok=True)
+        servers.append(TerrariaServer(spec.name, spec.ct_id, spec.server_dir, spec.state_dir, spec.channel_id))
+    return servers
+
+
+def servers_in_channel(channel_id):
+    return [srv for srv in SERVERS.values() if srv.log_channel_id == channel_id]
+
+
+async def server_for(ctx):
+    """The server a command is for: `!<name> cmd`, else the channel's server,
+    else the only one. Replies with a hint and returns None if it is ambiguous."""
+    name = ctx.prefix[len(COMMAND_PREFIX):].strip().lower() if ctx.prefix else ""
+    if name in SERVERS:
+        return SERVERS[name]
+    if len(SERVERS) == 1:
+        return next(iter(SERVERS.values()))
+    bound = servers_in_channel(ctx.channel.id)
+    if len(bound) == 1:
+        return bound[0]
+    await ctx.send(f"🗂️ Qual servidor? Use `{COMMAND_PREFIX}<servidor> {ctx.invoked_with}` "
+                   f"({', '.join(f'`{n}`' for n in SERVERS)}) ou `{COMMAND_PREFIX}servers`.")
+    return None
+
+
+async def get_server_config(srv):
+    """Parsed serverconfig.txt, re-read only when the file changes."""
+    return await srv.config.get()
+
+async def get_server_info(srv):
+    info = {'world': 'Unknown', 'port': '7777', 'world_info': None}
+    try:
+        config = await get_server_config(srv)
+        info['world'] = config.world_name
+        info['port'] = str(config.port)
+        if config.world:
+            # Header of the .wld (cached until the file changes)
+            info['world_info'] = await srv.worlds.get(config.world)
+            if info['world_info'] is not None:
+                info['world'] = info['world_info'].name
     except Exception as e:
-        print(f"Error parsing serverconfig: {e}")
+        print(f"[{srv.name}] Error parsing serverconfig: {e}")
         
     return info
 
 
-async def get_player_count(port):
-    if not re.fullmatch(r"\d+", str(port or "")):
-        port = "7777"
-
-    result = await run_shell_async(
-        "if command -v ss >/dev/null 2>&1; then "
-        f"ss -tn state established '( sport = :{port} )' | grep -v Recv-Q | wc -l; "
-        "elif command -v netstat >/dev/null 2>&1; then "
-        f"netstat -tn | grep ':{port}' | grep ESTABLISHED | wc -l; "
-        "else echo 0; fi"
-    )
+async def collect_status(srv, port="7777"):
+    """Single /proc snapshot: RAM, uptime, load, server process and players."""
+    return await srv.collector.collect(port)
 
-    count = result.strip()
-    return count if re.fullmatch(r"\d+", count) else "0"
 
+async def get_player_count(srv, port):
+    snapshot = await collect_status(srv, port)
+    return str(snapshot.players)
 
 
 @bot.event
 async def on_ready():
     print(f'Bot internal log: Logged in as {bot.user}')
     
-    # Restore Monitor Channel
-    global LOG_CHANNEL_ID
-    if os.path.exists(CHANNEL_ID_FILE):
+    announced = set()
+    for srv in SERVERS.values():
+        # Restore Monitor Channel
+        if os.path.exists(srv.channel_id_file):
+            try:
+                with open(srv.channel_id_file, 'r') as f:
+                    srv.log_channel_id = int(f.read().strip())
+                print(f"[{srv.name}] Restored Monitor Channel ID: {srv.log_channel_id}")
+            except Exception as e:
+                print(f"[{srv.name}] Failed to restore channel: {e}")
+
+        # Startup Notification (once per channel)
+        if srv.log_channel_id and srv.log_channel_id not in announced:
+            announced.add(srv.log_channel_id)
+            try:
+                channel = bot.get_channel(srv.log_channel_id)
+                if channel:
+                    embed = discord.Embed(
+                        title="\U0001f916 Bot Online", 
+                        description="O Gerenciador Terraria está ativo.", 
+                        color=discord.Color.blue()
+                    )
+                    embed.add_field(name="Ping", value=f"{round(bot.latency * 1000)}ms", inline=True)
+                    if len(SERVERS) > 1:
+                        names = ", ".join(s.name for s in servers_in_channel(srv.log_channel_id))
+                        embed.add_field(name="Servidores", value=names, inline=True)
+                    embed.timestamp = datetime.datetime.now()
+                    await channel.send(embed=embed)
+            except Exception as e:
+                print(f"[{srv.name}] Failed to send startup msg: {e}")
+
+        # Restore Live Dashboard
+        if os.path.exists(srv.dashboard_file):
+            try:
+                with open(srv.dashboard_file, 'r') as f:
+                    channel_id, message_id = (int(x) for x in f.read().split())
+                srv.dashboard_ref = (channel_id, message_id)
+            except Exception as e:
+                print(f"[{srv.name}] Failed to restore dashboard: {e}")
+
+    OUTBOX.start()
+    if PERF.enabled:
+        LOOP_MONITOR.start()
+    for srv in SERVERS.values():
+        start_server_tasks(srv)
+    if METRICS_PORT and EXPORTER.runner is None:
         try:
-            with open(CHANNEL_ID_FILE, 'r') as f:
-                LOG_CHANNEL_ID = int(f.read().strip())
-            print(f"Restored Monitor Channel ID: {LOG_CHANNEL_ID}")
-            
-            # Startup Notification
-            channel = bot.get_channel(LOG_CHANNEL_ID)
-            if channel:
-                embed = discord.Embed(
-                    title="\U0001f916 Bot Online", 
-                    description="O Gerenciador Terraria est\u00e1 ativo.", 
-                    color=discord.Color.blue()
-                )
-                embed.add_field(name="Ping", value=f"{round(bot.latency * 1000)}ms", inline=True)
-                embed.timestamp = datetime.datetime.now()
-                await channel.send(embed=embed)
-        except Exception as e:
-            print(f"Failed to restore channel or send startup msg: {e}")
-
-    if not hasattr(bot, 'status_task'):
-        bot.status_task = bot.loop.create_task(update_status_task())
-    if not hasattr(bot, 'log_task'):
-        bot.log_task = bot.loop.create_task(log_monitor_task())
-
-# Global variable to store the channel receiving updates
-LOG_CHANNEL_ID = None
+            await EXPORTER.start()
+            print(f"Metrics endpoint on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+        except OSError as e:
+            print(f"Metrics endpoint disabled: {e}")
+
+def start_server_tasks(srv):
+    """Per-server background tasks; each server's tasks only wait on its own container."""
+    for name, job in (('status', update_status_task), ('metrics', metrics_sampler_task),
+                      ('logs', log_monitor_task), ('catalog', reconcile_backup_catalog),
+                      ('sessions', backfill_player_sessions)):
+        if name not in srv.tasks:
+            srv.tasks[name] = bot.loop.create_task(job(srv))
 
 @bot.event
 async def on_message(message):
@@ -161,145 +421,153 @@ async def on_message(message):
     
     # Chat Bridge: Discord -> Terraria
     # Only if channel checks out and it's not a command
-    if LOG_CHANNEL_ID and message.channel.id == LOG_CHANNEL_ID:
-        if not message.content.startswith(bot.command_prefix):
-             clean_msg = message.content.replace("\n", " ").replace("\r", " ").strip()
-             if len(clean_msg) > 100:
-                 clean_msg = clean_msg[:100] + "..."
-             
-             user = message.author.display_name
-             # Send to Terraria Console via 'say'
-             # Format: say [Discord] <User>: Message
-             cmd = f"say [Discord] <{user}>: {clean_msg}"
-             full_cmd = build_tmux_command(cmd)
-             
-             # Fire and forget (don't wait for output to keep chat snappy)
-             asyncio.create_task(run_shell_async(full_cmd))
+    if message.content.startswith(COMMAND_PREFIX):
+        return
+    for srv in servers_in_channel(message.channel.id):
+        clean_msg = message.content.replace("\n", " ").replace("\r", " ").strip()
+        if len(clean_msg) > 100:
+            clean_msg = clean_msg[:100] + "..."
+        
+        user = message.author.display_name
+        # Send to Terraria Console via 'say'
+        # Format: say [Discord] <User>: Message
+        cmd = f"say [Discord] <{user}>: {clean_msg}"
+        
+        # Queued on the console writer (ordered, one tmux connection); don't wait for the ack
+        try:
+            srv.console.submit(cmd, user=message.author.id)
+        except (ConsoleRateLimited, ConsoleBusy):
+            await message.add_reaction("⏳")
+            return
 
 @bot.command()
 async def monitor(ctx):
     """Sets the current channel to receive Join/Leave notifications."""
     if not await is_authorized(ctx): return
-    global LOG_CHANNEL_ID
-    LOG_CHANNEL_ID = ctx.channel.id
+    srv = await server_for(ctx)
+    if srv is None: return
+    srv.log_channel_id = ctx.channel.id
     
     # Save Persistence
     try:
         # Save locally (bot's environment)
-        with open(CHANNEL_ID_FILE, 'w', encoding='utf-8') as f:
-            f.write(str(LOG_CHANNEL_ID))
+        with open(srv.channel_id_file, 'w', encoding='utf-8') as f:
+            f.write(str(srv.log_channel_id))
                  
-        await ctx.send("\U0001f440 **Monitoramento ativado!** As atualiza\u00e7\u00f5es aparecer\u00e3o aqui.")
+        where = f" de **{srv.name}**" if len(SERVERS) > 1 else ""
+        await ctx.send(f"\U0001f440 **Monitoramento{where} ativado!** As atualizações aparecerão aqui.")
     except Exception as e:
-        await ctx.send(f"\u26a0\ufe0f Falha ao salvar canal padr\u00e3o: {e}")
+        await ctx.send(f"⚠️ Falha ao salvar canal padrão: {e}")
 
-async def log_monitor_task():
+async def log_monitor_task(srv):
     """Continuously reads the server log for Join/Leave events."""
     await bot.wait_until_ready()
-    
-    # Wait for the log file to exist before tailing
-    while not os.path.exists(LOG_FILE):
-        await asyncio.sleep(10)
-    
-    # Use tail -F to follow the file (works well with rotation/restarts)
-    process = await asyncio.create_subprocess_exec(
-        'tail', '-F', '-n', '0', LOG_FILE,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
 
-    print("Log Monitor started.")
-    
-    while not bot.is_closed():
-        try:
-            line_bytes = await process.stdout.readline()
-            if not line_bytes:
-                break 
-                
-            line = line_bytes.decode('utf-8', errors='ignore').strip()
-            
-            if LOG_CHANNEL_ID is None: continue
-            channel = bot.get_channel(LOG_CHANNEL_ID)
-            if not channel: continue
+    # Follow the log in-process; the offset checkpoint lets a restarted bot
+    # pick up events written while it was down.
+    follower = LogFollower(srv.log_source(), checkpoint_path=srv.log_offset_file)
 
-            timestamp = datetime.datetime.now().strftime("%H:%M")
-            
-            # Logic: Join/Leave detection
-            if "has joined." in line:
-                match = re.search(r'(?:\d+\.\d+\.\d+\.\d+:\d+\s+)?(.+) has joined\.', line)
-                if match:
-                    player_name = match.group(1).strip()
-                    embed = discord.Embed(description=f"**{player_name}** entrou no mundo! 🌍", color=discord.Color.green())
-                    embed.set_footer(text=f"At {timestamp}")
-                    await channel.send(embed=embed)
-                    
-            elif "has left." in line:
-                match = re.search(r'(?:\d+\.\d+\.\d+\.\d+:\d+\s+)?(.+) has left\.', line)
-                if match:
-                    player_name = match.group(1).strip()
-                    embed = discord.Embed(description=f"**{player_name}** saiu do mundo. 👋", color=discord.Color.red())
-                    embed.set_footer(text=f"At {timestamp}")
-                    await channel.send(embed=embed)
-            
-            # Chat: <Name> Message
-            elif line.startswith("<") and "> " in line:
-                 # Standard Terraria Chat: <Name> Message
-                 # Exclude [Server] or special tags if needed
-                 parts = line.split("> ", 1)
-                 if len(parts) == 2:
-                     name = parts[0][1:]
-                     msg = parts[1]
-                     # Don't echo back our own [Discord] messages if they appear in logs
-                     if "[Discord]" not in name:
-                         await channel.send(f"💬 **{name}**: {msg}")
-
-            # Death Messages (Heuristic)
-            elif any(x in line for x in [" was slain by ", " fell ", " drowned ", " burned ", " died "]):
-                 await channel.send(f"💀 *{line}*")
-
-            # World Generation Progress (Heuristic: "10.0% - Step Name")
-            elif "% - " in line:
-                 # Rate limit updates to avoid API spam (Discord limits edits)
-                 now = datetime.datetime.now().timestamp()
-                 
-                 # Initialize state if needed (attach to bot to persist across loop iterations)
-                 if not hasattr(bot, 'gen_progress_msg'): bot.gen_progress_msg = None
-                 if not hasattr(bot, 'gen_last_update'): bot.gen_last_update = 0
-                 
-                 # Pattern: 19.3% - Adding more grass
-                 # Clean up the line to be a nice status
-                 status_text = line.strip()
-                 
-                 # Update immediately if first time, else check throttle (2.5s)
-                 if bot.gen_progress_msg is None:
-                     embed = discord.Embed(title="🌍 Generating World - Auto-Repair", description=f"`{status_text}`", color=discord.Color.gold())
-                     bot.gen_progress_msg = await channel.send(embed=embed)
-                     bot.gen_last_update = now
-                 elif now - bot.gen_last_update > 2.5:
-                     try:
-                         embed = discord.Embed(title="🌍 Generating World - Auto-Repair", description=f"`{status_text}`", color=discord.Color.gold())
-                         await bot.gen_progress_msg.edit(embed=embed)
-                         bot.gen_last_update = now
-                     except discord.NotFound:
-                         # Message deleted, recreate
-                         bot.gen_progress_msg = await channel.send(embed=embed)
-            
-            # Detect Generation Complete (or Server Start) to cleanup
-            if bot.get_channel(LOG_CHANNEL_ID) and hasattr(bot, 'gen_progress_msg') and bot.gen_progress_msg:
-                 if "Listening on port" in line or "Server shut down" in line or "Setting up" in line:
-                     try:
-                         # clear the progress message
-                         await bot.gen_progress_msg.delete()
-                     except: pass
-                     bot.gen_progress_msg = None
-                    
-        except Exception as e:
-            print(f"Log monitor error: {e}")
-            await asyncio.sleep(1)
+    print(f"[{srv.name}] Log Monitor started.")
+    
+    async for lines in follower.batches():
+        if bot.is_closed():
+            break
+        srv.counters.add_lines(len(lines))
+        srv.log_written_at = follower.written_at
+        with PERF.timer('log', 'batch', f"{server_tag(srv)}{len(lines)} lines"):
+            for raw_line, at in zip(lines, follower.line_times):
+                try:
+                    await handle_log_line(srv, raw_line.strip(), at)
+                except Exception as e:
+                    print(f"[{srv.name}] Log monitor error: {e}")
+
+# Log events: one combined regex per line, handlers subscribe by kind.
+# Shared by every server; handlers are called as handler(srv, event).
+EVENTS = LogClassifier()
+
+async def handle_log_line(srv, line, at=None):
+    # Stamp events with the line's write time (from the log index): after a restart the
+    # follower replays the backlog, and session joins/leaves must not all land on "now"
+    await EVENTS.dispatch(line, srv, at=at if at is not None else srv.log_written_at)
+
+# Handlers only enqueue: log ingestion never waits on Discord
+OUTBOX = Outbox(bot.get_channel, maxsize=OUTBOX_MAXSIZE, overflow=OUTBOX_OVERFLOW, observe=PERF.observe)
+
+def server_tag(srv):
+    """'[name] ' in multi-server mode, so shared channels show where events come from."""
+    return f"[{srv.name}] " if len(SERVERS) > 1 else ""
+
+# Counters for /metrics (every event kind, including save timings)
+@EVENTS.on('*')
+async def count_event(srv, event):
+    srv.counters.event(event)
+
+# Player sessions: recorded before the Discord handlers, whether or not a channel is set
+@EVENTS.on('join')
+async def record_session_join(srv, event):
+    srv.session_store().join(event.get('player'), event.at)
+
+@EVENTS.on('leave')
+async def record_session_leave(srv, event):
+    srv.session_store().leave(event.get('player'), event.at)
+
+async def close_sessions(srv, event):
+    # A clean stop closes sessions now; a (re)start after a crash closes them
+    # at the last time the server was seen up
+    srv.session_store().close_all(event.at if event.kind == 'server_stopped' else None, reason=event.kind)
+
+for kind in RESET_EVENTS:
+    EVENTS.subscribe(kind, close_sessions)
+
+@EVENTS.on('join')
+async def on_player_join(srv, event):
+    if not srv.log_channel_id: return
+    timestamp = datetime.datetime.now().strftime("%H:%M")
+    embed = discord.Embed(description=f"**{event.get('player')}** entrou no mundo! 🌍", color=discord.Color.green())
+    embed.set_footer(text=f"{server_tag(srv)}At {timestamp}")
+    await OUTBOX.post(srv.log_channel_id, embed=embed, origin=srv.log_written_at)
+
+@EVENTS.on('leave')
+async def on_player_leave(srv, event):
+    if not srv.log_channel_id: return
+    timestamp = datetime.datetime.now().strftime("%H:%M")
+    embed = discord.Embed(description=f"**{event.get('player')}** saiu do mundo. 👋", color=discord.Color.red())
+    embed.set_footer(text=f"{server_tag(srv)}At {timestamp}")
+    await OUTBOX.post(srv.log_channel_id, embed=embed, origin=srv.log_written_at)
+
+@EVENTS.on('chat')
+async def on_player_chat(srv, event):
+    if not srv.log_channel_id: return
+    name = event.get('player')
+    # Don't echo back our own [Discord] messages if they appear in logs
+    if "[Discord]" not in name:
+        await OUTBOX.post(srv.log_channel_id, f"{server_tag(srv)}💬 **{name}**: {event.get('message', '')}",
+                          origin=srv.log_written_at)
+
+@EVENTS.on('death')
+async def on_player_death(srv, event):
+    if not srv.log_channel_id: return
+    await OUTBOX.post(srv.log_channel_id, f"{server_tag(srv)}💀 *{event.line}*", origin=srv.log_written_at)
+
+@EVENTS.on('worldgen')
+async def on_worldgen_progress(srv, event):
+    # World Generation Progress ("10.0% - Step Name")
+    if not srv.log_channel_id: return
+    status_text = event.line.strip()
+    embed = discord.Embed(title=f"🌍 {server_tag(srv)}Generating World - Auto-Repair", description=f"`{status_text}`", color=discord.Color.gold())
+    # Edited in place; the outbox keeps only the latest step and throttles edits (2.5s)
+    OUTBOX.post_live(f"worldgen:{srv.name}", srv.log_channel_id, embed)
+
+async def clear_worldgen_progress(srv, event):
+    # Generation Complete (or Server Start/Stop): remove the progress message
+    OUTBOX.clear_live(f"worldgen:{srv.name}")
+
+for kind in ('server_started', 'server_starting', 'server_stopped'):
+    EVENTS.subscribe(kind, clear_worldgen_progress)
 
 async def is_authorized(ctx):
     # Public Commands (whitelist)
-    if ctx.command and ctx.command.name in ['ping', 'status', 'help']:
+    if ctx.command and ctx.command.name in ['ping', 'status', 'help', 'playtime', 'top', 'seen', 'servers']:
         return True
 
     # 1. Hardcoded Owner
@@ -313,30 +581,191 @@ async def is_authorized(ctx):
     await ctx.send("⛔ **Acesso Negado** (Requer permissão de Administrador)")
     return False
 
-async def update_status_task():
-    """Background task to update bot status with player count or server state."""
+# Command latency for !perf; the after hook also runs when the command raises
+@bot.before_invoke
+async def perf_command_started(ctx):
+    ctx.perf_started = time.perf_counter()
+
+@bot.after_invoke
+async def perf_command_finished(ctx):
+    started = getattr(ctx, 'perf_started', None)
+    if started is not None and PERF.enabled:
+        PERF.observe('command', ctx.command.qualified_name, time.perf_counter() - started, ctx.message.content[:100])
+
+async def refresh_status(srv):
+    """Recollect the status snapshot (one /proc probe + config read)."""
+    state = srv.status
+    if state.lock is None:
+        state.lock = asyncio.Lock()
+    async with state.lock:
+        server_info = await get_server_info(srv)
+        snapshot = await collect_status(srv, server_info["port"])
+        # Resolved in the background; last known value until it completes
+        state.public_ip = PUBLIC_IP.maybe_refresh()
+        state.server_info = server_info
+        state.snapshot = snapshot
+        state.updated_at = time.monotonic()
+    # Heartbeat for crash recovery: sessions stay open only while the server runs
+    closed = srv.session_store().touch(snapshot.running)
+    if closed:
+        print(f"[{srv.name}] Server is down: closed {closed} orphaned player session(s).")
+    return state
+
+async def current_status(srv):
+    """Cached status; only recollects if the background refresher fell behind."""
+    state = srv.status
+    if state.snapshot is None or time.monotonic() - state.updated_at > 2 * STATUS_REFRESH_SECONDS:
+        await refresh_status(srv)
+    return state
+
+def build_status_embed(state, footer="Terraria Proxmox Manager • Interactive Mode"):
+    snapshot = state.snapshot
+    title = f" • {state.name}" if len(SERVERS) > 1 else ""
+    if snapshot.running:
+        embed = discord.Embed(title=f"🟢 Server Online{title}", color=discord.Color.green())
+    else:
+        embed = discord.Embed(title=f"🔴 Server Offline{title}", color=discord.Color.red())
+    embed.set_thumbnail(url="https://terraria.org/assets/terraria-logo.png")
+
+    embed.add_field(name="🌍 World", value=state.server_info['world'], inline=True)
+    world = state.server_info.get('world_info')
+    if world is not None:
+        embed.add_field(name="🗺️ Mode", value=describe_world(world), inline=True)
+    embed.add_field(name="👥 Players", value=str(snapshot.players), inline=True)
+    embed.add_field(name="📡 Address", value=f"`{state.public_ip}:{state.server_info['port']}`", inline=False)
+
+    embed.add_field(name="💾 RAM Usage", value=snapshot.mem_text, inline=True)
+    embed.add_field(name="⏱️ Uptime", value=snapshot.uptime_text, inline=True)
+
+    embed.set_footer(text=footer)
+    return embed
+
+def describe_world(world):
+    parts = [world.size_name, world.difficulty, world.evil]
+    if world.hardmode:
+        parts.append("Hardmode")
+    return " • ".join(parts)
+
+async def update_presence():
+    # One presence for the whole bot: summed over every server's cached status
+    states = [srv.status for srv in SERVERS.values() if srv.status.snapshot is not None]
+    running = [state for state in states if state.snapshot.running]
+    players = sum(state.snapshot.players for state in running)
+    if len(SERVERS) > 1:
+        text = f"Terraria: {len(running)}/{len(SERVERS)} servidores, {players} jogadores" if running else "Servidores Offline"
+    elif running:
+        text = f"Terraria com {players} jogadores"
+    else:
+        text = "Servidor Offline"
+    # Only touch the gateway when the text actually changes
+    if getattr(bot, 'presence_text', None) == text:
+        return
+    if running:
+        activity = discord.Game(name=text)
+    else:
+        activity = discord.Activity(type=discord.ActivityType.watching, name=text)
+    await bot.change_presence(activity=activity)
+    bot.presence_text = text
+
+async def update_dashboard(srv, state):
+    """Edit the pinned dashboard in place when its rendered fields change."""
+    ref = srv.dashboard_ref
+    if not ref:
+        return
+    embed = build_status_embed(state, footer="Terraria Proxmox Manager • Live Dashboard")
+    fingerprint = repr(embed.to_dict())
+    if fingerprint == srv.dashboard_fingerprint:
+        return
+    # Coalesce: changes arriving faster than the edit interval wait for the next tick
+    now = time.monotonic()
+    if now - srv.dashboard_last_edit < DASHBOARD_MIN_EDIT_SECONDS:
+        return
+
+    channel_id, message_id = ref
+    channel = bot.get_channel(channel_id)
+    if not channel:
+        return
+    embed.timestamp = datetime.datetime.now()
+    try:
+        if srv.dashboard_msg is None:
+            srv.dashboard_msg = await channel.fetch_message(message_id)
+        await srv.dashboard_msg.edit(content=None, embed=embed)
+    except discord.NotFound:
+        # Dashboard deleted by someone; stop tracking it
+        print(f"[{srv.name}] Dashboard message not found, disabling live dashboard.")
+        clear_dashboard(srv)
+        return
+    srv.dashboard_fingerprint = fingerprint
+    srv.dashboard_last_edit = now
+
+def clear_dashboard(srv):
+    srv.dashboard_ref = None
+    srv.dashboard_msg = None
+    srv.dashboard_fingerprint = None
+    try:
+        os.remove(srv.dashboard_file)
+    except FileNotFoundError:
+        pass
+
+async def update_status_task(srv):
+    """Background refresher: keeps the server's status current and updates presence + dashboard."""
     await bot.wait_until_ready()
     while not bot.is_closed():
         try:
-            # Check if server is actually running
-            pgrep = await run_shell_async("pgrep -f TerrariaServer")
-            
-            if not pgrep or len(pgrep.strip()) == 0:
-                # Process not found
-                await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.watching, name="Servidor Offline"))
-                await asyncio.sleep(30) # Check less frequently if offline
-                continue
-
-            server_info = await get_server_info()
-            count = await get_player_count(server_info["port"])
-            
-            activity_text = f"Terraria com {count} jogadores"
-            await bot.change_presence(activity=discord.Game(name=activity_text))
-            
+            state = await refresh_status(srv)
+            await update_presence()
+            await update_dashboard(srv, state)
         except Exception as e:
-            print(f"Status update error: {e}")
+            print(f"[{srv.name}] Status update error: {e}")
         
-        await asyncio.sleep(30) # Update every 30s
+        await asyncio.sleep(STATUS_REFRESH_SECONDS)
+
+# Metric history: (name, label, unit). Kept in a fixed-size mmap'ed file per server.
+METRICS = [
+    ('ram', "RAM", "MB"),
+    ('ram_percent', "RAM %", "%"),
+    ('load', "Load (1m)", ""),
+    ('disk_percent', "Disco", "%"),
+    ('players', "Jogadores", ""),
+    ('server_rss', "RSS do Servidor", "MB"),
+    ('server_cpu', "CPU do Servidor", "%"),
+]
+METRIC_ALIASES = {'mem': 'ram', 'memory': 'ram', 'cpu': 'server_cpu', 'rss': 'server_rss', 'disk': 'disk_percent'}
+
+async def metrics_sampler_task(srv):
+    """Samples the container every METRICS_SAMPLE_SECONDS into the metrics store."""
+    await bot.wait_until_ready()
+    try:
+        srv.metrics_store = TimeSeriesStore(srv.metrics_file, [name for name, _, _ in METRICS])
+    except (OSError, ValueError) as e:
+        print(f"[{srv.name}] Metrics history disabled: {e}")
+        return
+
+    previous = None
+    while not bot.is_closed():
+        try:
+            snapshot = await collect_status(srv, srv.status.server_info['port'])
+            cpu = None
+            if previous is not None and snapshot.server_pids == previous.server_pids:
+                # Percent of one core over the sampling interval
+                elapsed = snapshot.collected_at - previous.collected_at
+                if elapsed > 0:
+                    cpu = max(0.0, 100 * (snapshot.server_cpu_seconds - previous.server_cpu_seconds) / elapsed)
+            previous = snapshot
+            srv.metrics_store.record({
+                'ram': snapshot.mem_used_mb,
+                'ram_percent': snapshot.mem_percent,
+                'load': snapshot.load_avg[0],
+                'disk_percent': snapshot.disk_percent,
+                'players': snapshot.players,
+                'server_rss': snapshot.server_rss_mb,
+                'server_cpu': cpu if snapshot.running else 0.0,
+            }, snapshot.collected_at)
+        except Exception as e:
+            print(f"[{srv.name}] Metrics sample error: {e}")
+        
+        # Stay on the bucket grid so every 10s bucket gets one sample
+        await asyncio.sleep(METRICS_SAMPLE_SECONDS - time.time() % METRICS_SAMPLE_SECONDS)
 
 
 @bot.command()
@@ -344,63 +773,75 @@ async def shutdown(ctx):
     """Desliga o bot graciosamente (Apenas Admin)."""
     if not await is_authorized(ctx): return
     await ctx.send("🛑 **Desligando bot...**")
-    await bot.close()
+    await shutdown_bot()
 
 @bot.command()
 async def kick(ctx, player: str, *, reason: str = "Sem motivo"):
     """Expulsa um jogador: !kick "Nome" Motivo"""
     if not await is_authorized(ctx): return
-    await command(ctx, cmd_text=f'kick "{player}" "{reason}"')
+    srv = await server_for(ctx)
+    if srv is None: return
+    await run_console_command(ctx, srv, f'kick "{player}" "{reason}"')
 
 @bot.command()
 async def ban(ctx, player: str, *, reason: str = "Sem motivo"):
     """Bane um jogador: !ban "Nome" Motivo"""
     if not await is_authorized(ctx): return
-    await command(ctx, cmd_text=f'ban "{player}" "{reason}"')
+    srv = await server_for(ctx)
+    if srv is None: return
+    await run_console_command(ctx, srv, f'ban "{player}" "{reason}"')
 
-# End of Helpers, Start of Commands
+def is_player_chat(line):
+    return line.startswith("<") and not line.startswith("<Server>")
 
-@bot.command(aliases=['exec', 'cmd'])
-async def command(ctx, *, cmd_text: str):
-    """Sends a raw command to the server console."""
-    if not await is_authorized(ctx):
-        return
-    
+def is_save_completed(line):
+    event = EVENTS.classify(line)
+    return event is not None and event.kind == 'save_completed'
+
+async def console_command(srv, cmd_text, until=None, timeout=10.0):
+    """Sends a console command. Returns (error, output lines) for what it printed.
+
+    With `until`, capture waits for that line (up to `timeout`) instead of
+    stopping when the output goes quiet: a long save pauses between lines.
+    """
+    wait = {'quiet': timeout, 'idle': timeout} if until is not None else {}
+    return await capture_output(srv.capture_source, lambda: srv.send_console(cmd_text),
+                                until=until, exclude=is_player_chat, timeout=timeout, **wait)
+
+async def run_console_command(ctx, srv, cmd_text, until=None, timeout=10.0):
     # Sanitize inputs (Basic check to avoid breakout, though tmux send-keys is relatively safe as it types text)
     if any(c in cmd_text for c in [";", "&&", "`", "\n", "\r"]):
         await ctx.send("⚠️ **Unsafe characters detected.** Command blocked.")
-        return
+        return False
 
-    # tmux send-keys logic
-    # We send the command + Enter
-    full_cmd = build_tmux_command(cmd_text)
-    
     async with ctx.typing():
-        res = await run_shell_async(full_cmd)
+        res, lines = await console_command(srv, cmd_text, until=until, timeout=timeout)
         
         if res:
              await ctx.send(f"⚠️ Erro ao enviar: `{res}`")
-             return
+             return False
 
-        # Wait for execution and read new log lines
-        await asyncio.sleep(1.0)
-        
-        try:
-             # tail the bytes added since log_size_before
-             # easier method: just tail last 10 lines and try to find relevance, 
-             # or just show last few lines. Suffixing command with unique ID is hard in tmux.
-             # We will show the last 6 lines.
-             logs = await run_shell_async(f"tail -n 6 {LOG_FILE}")
-             if not logs:
-                 logs = "(No output captured)"
-             await ctx.send(f"✅ **Enviado:** `{cmd_text}`\n**Console Output:**\n```bash\n{logs}\n```")
-        except Exception:
-             await ctx.send(f"✅ **Enviado:** `{cmd_text}` (Logs indisponíveis)")
+        logs = "\n".join(lines)[-1800:] or "(No output captured)"
+        await ctx.send(f"✅ **Enviado:** `{cmd_text}`\n**Console Output:**\n```bash\n{logs}\n```")
+        return True
+
+# End of Helpers, Start of Commands
+
+@bot.command(aliases=['exec', 'cmd'])
+async def command(ctx, *, cmd_text: str):
+    """Sends a raw command to the server console."""
+    if not await is_authorized(ctx):
+        return
+    srv = await server_for(ctx)
+    if srv is None: return
+    await run_console_command(ctx, srv, cmd_text)
 
 @bot.command()
 async def update(ctx, version: str):
     """Atualiza o servidor: !update 1450"""
     if not await is_authorized(ctx): return
+    srv = await server_for(ctx)
+    if srv is None: return
     
     # regex validator for simple version (digits with optional dots)
     if not re.match(r'^\d+$', version):
@@ -419,12 +860,10 @@ async def update(ctx, version: str):
     # If the bot runs INSIDE container, `pct` command won't exist.
     
     # Check if we have 'pct'
-    check_pct = await run_shell_async("which pct")
-    
     cmd = ""
-    if "pct" in check_pct and CT_ID:
+    if HAS_PCT and srv.ct_id:
         # Running on Host
-        cmd = f"{os.getcwd()}/scripts/update_terraria.sh {CT_ID} {version}"
+        cmd = f"{os.getcwd()}/scripts/update_terraria.sh {srv.ct_id} {version}"
     else:
         # Running inside container? 
         # The update script uses `pct exec`. It is NOT designed to run inside container.
@@ -433,7 +872,9 @@ async def update(ctx, version: str):
         return
 
     async with ctx.typing():
-        res = await run_shell_async(cmd)
+        # Runs on the host (it drives `pct` itself), not through the container channel
+        returncode, stdout_text, stderr_text = await _fork_shell(cmd)
+        res = (stdout_text.strip() if returncode == 0 else stderr_text.strip() or stdout_text.strip()) or f"exit code {returncode}"
         
         if "Update Complete" in res:
              await ctx.send("✅ **Atualização Concluída com Sucesso!**\nVerifique o `!status`.")
@@ -446,74 +887,159 @@ async def update(ctx, version: str):
 async def say(ctx, *, msg: str):
     """Broadcasts a message to the server chat."""
     if not await is_authorized(ctx): return
+    srv = await server_for(ctx)
+    if srv is None: return
     # Terraria 'say' command format
-    await command(ctx, cmd_text=f"say [Discord] {msg}")
+    await run_console_command(ctx, srv, f"say [Discord] {msg}")
 
 @bot.command()
 async def save(ctx):
     """Triggers a world save."""
     if not await is_authorized(ctx): return
-    await command(ctx, cmd_text="save")
-    await ctx.send("💾 **World Save triggered.**")
+    srv = await server_for(ctx)
+    if srv is None: return
+    # Waits for the save to finish (up to 60s) instead of showing a partial log
+    if await run_console_command(ctx, srv, "save", until=is_save_completed, timeout=60.0):
+        await ctx.send("💾 **World Save triggered.**")
 
 # --- COMMANDS ---
 
 @bot.command()
 async def ping(ctx):
     latency = round(bot.latency * 1000)
-    await ctx.send(f'🏓 Pong! `{latency}ms`')
+    q = OUTBOX.stats()
+    await ctx.send(f"🏓 Pong! `{latency}ms` · Fila do chat: `{q['depth']}` (atraso m\u00e9dio `{q['avg_lag']:.1f}s`, descartadas `{q['dropped']}`)")
 
 @bot.command()
 async def status(ctx):
     """Shows comprehensive server status."""
     # Status is public
-    await send_status_embed(ctx)
+    srv = await server_for(ctx)
+    if srv is None: return
+    await send_status_embed(ctx, srv)
 
-async def send_status_embed(ctx):
-    async with ctx.typing():
-        # Parallel Tasks
-        ip_task = asyncio.create_task(get_public_ip())
-        mem_task = asyncio.create_task(run_shell_async("free -m | grep Mem: | awk '{print $3\"MB / \"$2\"MB\"}'"))
-        uptime_task = asyncio.create_task(run_shell_async("uptime -p || uptime"))
-        server_info_task = asyncio.create_task(get_server_info())
-        
-        public_ip, mem, uptime, server_info = await asyncio.gather(
-            ip_task, mem_task, uptime_task, server_info_task
+async def send_status_embed(ctx, srv):
+    # Answered from the background snapshot; no shell or HTTP on this path
+    state = await current_status(srv)
+    embed = build_status_embed(state)
+    view = ServerControlView(ctx, srv)
+    await ctx.send(embed=embed, view=view)
+
+@bot.command()
+async def dashboard(ctx, mode: str = "on"):
+    """Posts a pinned live status message here (!dashboard off to remove)."""
+    if not await is_authorized(ctx): return
+    srv = await server_for(ctx)
+    if srv is None: return
+
+    if mode.lower() == "off":
+        clear_dashboard(srv)
+        await ctx.send("📊 **Dashboard desativado.**")
+        return
+
+    state = await current_status(srv)
+    embed = build_status_embed(state, footer="Terraria Proxmox Manager • Live Dashboard")
+    msg = await ctx.send(embed=embed)
+    try:
+        await msg.pin()
+    except discord.HTTPException as e:
+        print(f"[{srv.name}] Failed to pin dashboard: {e}")
+
+    clear_dashboard(srv)
+    srv.dashboard_ref = (ctx.channel.id, msg.id)
+    srv.dashboard_msg = msg
+    srv.dashboard_fingerprint = repr(embed.to_dict())
+    srv.dashboard_last_edit = time.monotonic()
+    try:
+        with open(srv.dashboard_file, 'w', encoding='utf-8') as f:
+            f.write(f"{ctx.channel.id} {msg.id}")
+    except Exception as e:
+        await ctx.send(f"\u26a0\ufe0f Falha ao salvar dashboard: {e}")
+
+def format_span(seconds):
+    for unit, size in (('y', 31536000), ('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size and seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+def format_metric(value, unit):
+    text = f"{value:.2f}" if abs(value) < 10 and value != int(value) else f"{value:.0f}"
+    return f"{text}{unit}" if unit == "%" else f"{text} {unit}".strip()
+
+@bot.command()
+async def stats(ctx, span: str = "24h"):
+    """Resumo do histórico de métricas: !stats 24h | 7d | 1y"""
+    if not await is_authorized(ctx): return
+    srv = await server_for(ctx)
+    if srv is None: return
+    seconds = parse_span(span)
+    if not seconds:
+        await ctx.send("⚠️ Período inválido. Use por exemplo `1h`, `24h`, `7d` ou `1y`.")
+        return
+    if srv.metrics_store is None:
+        await ctx.send("📊 Ainda não há histórico de métricas.")
+        return
+
+    now = time.time()
+    embed = discord.Embed(title=f"📊 {server_tag(srv)}Estatísticas ({format_span(seconds)})", color=discord.Color.blue())
+    step = None
+    for name, label, unit in METRICS:
+        summary = srv.metrics_store.summary(name, seconds, now)
+        if summary is None:
+            continue
+        step = summary['step']
+        embed.add_field(
+            name=label,
+            value=f"Atual `{format_metric(summary['last'], unit)}`\nMédia `{format_metric(summary['mean'], unit)}`\nPico `{format_metric(summary['peak'], unit)}`",
+            inline=True,
         )
-        players = await get_player_count(server_info["port"])
-        
-        # Determine Status
-        status_color = discord.Color.green()
-        try:
-            pgrep = await run_shell_async("pgrep -f TerrariaServer")
-            if not pgrep:
-                 status_title = "🔴 Server Offline"
-                 status_color = discord.Color.red()
-            else:
-                 status_title = "🟢 Server Online"
-        except:
-             status_title = "❓ Status Unknown"
-             status_color = discord.Color.orange()
+    if step is None:
+        await ctx.send("📊 Sem dados para esse período ainda.")
+        return
+    embed.set_footer(text=f"Resolução: {format_span(step)} por ponto")
+    await ctx.send(embed=embed)
 
-        embed = discord.Embed(title=status_title, color=status_color)
-        embed.set_thumbnail(url="https://terraria.org/assets/terraria-logo.png")
-        
-        embed.add_field(name="🌍 World", value=server_info['world'], inline=True)
-        embed.add_field(name="👥 Players", value=f"{players.strip() or '0'}", inline=True)
-        embed.add_field(name="📡 Address", value=f"`{public_ip}:{server_info['port']}`", inline=False)
-        
-        embed.add_field(name="💾 RAM Usage", value=mem.strip(), inline=True)
-        embed.add_field(name="⏱️ Uptime", value=uptime.strip().replace("up ", ""), inline=True)
-        
-        embed.set_footer(text="Terraria Proxmox Manager • Interactive Mode")
-        
-        view = ServerControlView(ctx)
-        await ctx.send(embed=embed, view=view)
+@bot.command()
+async def graph(ctx, metric: str = "ram", span: str = "24h"):
+    """Gráfico de uma métrica: !graph ram 7d"""
+    if not await is_authorized(ctx): return
+    srv = await server_for(ctx)
+    if srv is None: return
+    names = {name: (label, unit) for name, label, unit in METRICS}
+    metric = METRIC_ALIASES.get(metric.lower(), metric.lower())
+    seconds = parse_span(span)
+    if metric not in names or not seconds:
+        await ctx.send(f"⚠️ Uso: `!graph <métrica> [período]`. Métricas: {', '.join(f'`{n}`' for n in names)}")
+        return
+    if srv.metrics_store is None:
+        await ctx.send("📊 Ainda não há histórico de métricas.")
+        return
+
+    now = time.time()
+    series = srv.metrics_store.query(metric, seconds, now, points=320)
+    if not series:
+        await ctx.send("📊 Sem dados para esse período ainda.")
+        return
+    label, unit = names[metric]
+    peak = max(p for _, _, p in series)
+    mean = sum(m for _, m, _ in series) / len(series)
+    high = 100.0 if unit == "%" and peak <= 100 else None
+    # Pure-Python rasterising takes a few dozen ms: keep it off the event loop
+    png = await asyncio.get_running_loop().run_in_executor(None, lambda: render_chart(series, now - seconds, now, high=high))
+    embed = discord.Embed(
+        title=f"📈 {server_tag(srv)}{label} ({format_span(seconds)})",
+        description=f"Média `{format_metric(mean, unit)}` • Pico `{format_metric(peak, unit)}`\n🟦 média  🟧 pico",
+        color=discord.Color.blue(),
+    )
+    embed.set_image(url="attachment://graph.png")
+    embed.set_footer(text=f"{datetime.datetime.fromtimestamp(now - seconds):%d/%m %H:%M} → {datetime.datetime.fromtimestamp(now):%d/%m %H:%M}")
+    await ctx.send(embed=embed, file=discord.File(io.BytesIO(png), filename="graph.png"))
 
 class ServerControlView(discord.ui.View):
-    def __init__(self, ctx):
+    def __init__(self, ctx, srv):
         super().__init__(timeout=60)
         self.ctx = ctx
+        self.srv = srv
 
     async def interaction_check(self, interaction):
         if interaction.user.id != self.ctx.author.id:
@@ -524,34 +1050,34 @@ class ServerControlView(discord.ui.View):
     @discord.ui.button(label="Iniciar", style=discord.ButtonStyle.success, emoji="▶️")
     async def start_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_message("🚀 Iniciando servidor...", ephemeral=True)
-        await run_shell_async(f"{SERVICE_CMD} start terraria")
+        await self.srv.shell(f"{SERVICE_CMD} start terraria")
         
     @discord.ui.button(label="Reiniciar", style=discord.ButtonStyle.primary, emoji="🔄")
     async def restart_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_message("🔄 Reiniciando servidor...", ephemeral=True)
-        await run_shell_async(f"{SERVICE_CMD} restart terraria")
+        await self.srv.shell(f"{SERVICE_CMD} restart terraria")
 
     @discord.ui.button(label="Parar", style=discord.ButtonStyle.danger, emoji="🛑")
     async def stop_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.send_message("🛑 Parando servidor...", ephemeral=True)
-        await run_shell_async(f"{SERVICE_CMD} stop terraria")
+        await self.srv.shell(f"{SERVICE_CMD} stop terraria")
         
     @discord.ui.button(label="Status", style=discord.ButtonStyle.secondary, emoji="📊")
     async def status_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
-        # Refresh the status view by calling send_status_embed again
-        # We can't edit the original easily without passing message ref, so we send a new one.
-        # Or ideally, we edit the interaction message.
-        await interaction.response.defer()
-        await send_status_embed(self.ctx)
+        # Refresh the status card in place from the shared snapshot
+        state = await current_status(self.srv)
+        await interaction.response.edit_message(embed=build_status_embed(state), view=self)
 
 @bot.command(aliases=['log'])
 async def logs(ctx, lines: int = 15):
     """Fetch the latest server logs."""
     if not await is_authorized(ctx): return
+    srv = await server_for(ctx)
+    if srv is None: return
     if lines > 50: lines = 50 
     
     async with ctx.typing():
-        log_content = await run_shell_async(f"tail -n {lines} {LOG_FILE}")
+        log_content = await srv.shell(f"tail -n {lines} {srv.log_file}")
         
         # Clean up log content
         if not log_content or "No such file" in log_content:
@@ -564,7 +1090,53 @@ async def logs(ctx, lines: int = 15):
             
         await ctx.send(f"**📜 Last {lines} lines of Server Log:**\n```bash\n{log_content}\n```")
 
-async def wait_and_verify(ctx, action, verify_running=True):
+def parse_when(text, now):
+    """'2h' / '7d' (ago) or an ISO date/time -> unix time; None if invalid."""
+    seconds = parse_span(text, default=None)
+    if seconds is not None:
+        return now - seconds
+    try:
+        return datetime.datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        return None
+
+@bot.command()
+async def logsearch(ctx, pattern: str, since: str = "24h", until: str = None):
+    """Searches the server log and its rotated segments: !logsearch <padrão> [desde] [até]"""
+    if not await is_authorized(ctx): return
+    srv = await server_for(ctx)
+    if srv is None: return
+    now = time.time()
+    start = parse_when(since, now)
+    end = parse_when(until, now) if until else None
+    if start is None or (until and end is None):
+        await ctx.send("❌ Período inválido. Use `30m`, `24h`, `7d` ou uma data como `2026-04-01T12:00`.")
+        return
+
+    cmd = (f"python3 {srv.server_dir}/bot_logstore.py search {shlex.quote(srv.log_file)} {shlex.quote(pattern)} "
+           f"--since {start:.0f} --limit 25" + (f" --until {end:.0f}" if end else ""))
+    async with ctx.typing():
+        res = await srv.shell(cmd)
+    try:
+        result = json.loads(res)
+    except ValueError:
+        await ctx.send(f"⚠️ Busca indisponível: `{res[:300]}`")
+        return
+
+    if not result['matches']:
+        await ctx.send(f"🔍 Nada encontrado para `{pattern}` no período.")
+        return
+    lines = []
+    for at, line in result['matches']:
+        stamp = datetime.datetime.fromtimestamp(at).strftime("%d/%m %H:%M") if at else "--/-- --:--"
+        lines.append(f"{stamp} {line}")
+    text = "\n".join(lines)
+    if len(text) > 1800:
+        text = text[:1800].rsplit("\n", 1)[0]
+    more = " (mais resultados omitidos, refine a busca)" if result['truncated'] or len(text) < len("\n".join(lines)) else ""
+    await ctx.send(f"**🔍 `{pattern}` — {len(result['matches'])} linha(s){more}:**\n```\n{text}\n```")
+
+async def wait_and_verify(ctx, srv, action, verify_running=True):
     """Wait for an action to complete and verify status."""
     embed = discord.Embed(title=f"⏳ {action} in progress...", color=discord.Color.gold())
     status_msg = await ctx.send(embed=embed)
@@ -573,8 +1145,8 @@ async def wait_and_verify(ctx, action, verify_running=True):
     await asyncio.sleep(5)
     
     # Check Verification
-    pgrep = await run_shell_async("pgrep -f TerrariaServer")
-    is_running = bool(pgrep)
+    snapshot = await collect_status(srv)
+    is_running = snapshot.running
     
     success = False
     if verify_running and is_running:
@@ -598,28 +1170,40 @@ async def wait_and_verify(ctx, action, verify_running=True):
     # If starting was verification, show status card too
     if verify_running and success:
         await asyncio.sleep(1)
-        await send_status_embed(ctx)
+        await send_status_embed(ctx, srv)
 
 @bot.command()
 async def start(ctx):
     if not await is_authorized(ctx): return
-    await run_shell_async(f"{SERVICE_CMD} start terraria")
-    await wait_and_verify(ctx, "Start", verify_running=True)
+    srv = await server_for(ctx)
+    if srv is None: return
+    await srv.shell(f"{SERVICE_CMD} start terraria")
+    await wait_and_verify(ctx, srv, "Start", verify_running=True)
 
 @bot.command()
 async def stop(ctx):
     if not await is_authorized(ctx): return
-    await run_shell_async(f"{SERVICE_CMD} stop terraria")
-    await wait_and_verify(ctx, "Stop", verify_running=False)
+    srv = await server_for(ctx)
+    if srv is None: return
+    await srv.shell(f"{SERVICE_CMD} stop terraria")
+    await wait_and_verify(ctx, srv, "Stop", verify_running=False)
 
 @bot.command()
 async def restart(ctx):
     if not await is_authorized(ctx): return
-    await run_shell_async(f"{SERVICE_CMD} restart terraria")
-    await wait_and_verify(ctx, "Restart", verify_running=True)
+    srv = await server_for(ctx)
+    if srv is None: return
+    await srv.shell(f"{SERVICE_CMD} restart terraria")
+    await wait_and_verify(ctx, srv, "Restart", verify_running=True)
 
 # Graceful Shutdown
 async def shutdown_bot():
+    await LOOP_MONITOR.stop()
+    await EXPORTER.close()
+    await OUTBOX.close()
+    for srv in SERVERS.values():
+        await srv.close()
+    await HTTP.close()
     await bot.close()
 
 def handle_sigterm(*args):
@@ -628,86 +1212,301 @@ def handle_sigterm(*args):
 signal.signal(signal.SIGTERM, handle_sigterm)
 
 # Duplicate runner removed properly
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+async def reconcile_backup_catalog(srv):
+    """Drops catalog entries whose archive is gone (e.g. /tmp cleared by a reboot)."""
+    await bot.wait_until_ready()
+    entries = srv.backup_catalog().list(kind='archive')
+    if not entries:
+        return
+    paths = " ".join(shlex.quote(e.path) for e in entries)
+    res = await srv.shell(f'for f in {paths}; do [ -e "$f" ] && echo "$f"; done; true')
+    if res.startswith("Error"):
+        return
+    present = set(res.splitlines())
+    missing = [e.name for e in entries if e.path not in present]
+    if missing:
+        srv.backup_catalog().remove(missing)
+        print(f"[{srv.name}] Backup catalog: {len(missing)} archive(s) no longer exist, removed.")
+
+async def prune_backups(srv):
+    """Keeps the newest MANUAL_BACKUP_KEEP archives (chosen from the catalog)."""
+    expired = srv.backup_catalog().expired(MANUAL_BACKUP_KEEP, kind='archive')
+    if expired:
+        await srv.shell("rm -f -- " + " ".join(shlex.quote(e.path) for e in expired))
+        srv.backup_catalog().remove([e.name for e in expired])
+
+async def compress_backup(ctx, srv, stage, dest):
+    """Compresses a staged world copy in the background, then catalogs the archive."""
+    q_stage, q_dest = shlex.quote(stage), shlex.quote(dest)
+    res = await srv.shell(
+        f"cd {q_stage} || exit 1; nice -n 10 tar -czf {q_dest} . || {{ rc=$?; cd /; rm -rf {q_stage}; exit $rc; }}; "
+        f"echo $(du -sk . | cut -f1) $(wc -c < {q_dest}) $(sha256sum {q_dest} | cut -d' ' -f1); "
+        f'for f in *.wld; do [ -e "$f" ] && echo "$f"; done; cd /; rm -rf {q_stage}'
+    )
+    lines = res.splitlines()
+    info = lines[0].split() if lines else []
+    if len(info) != 3 or not (info[0].isdigit() and info[1].isdigit()):
+        await ctx.send(f"❌ Backup failed: {res}")
+        return
+
+    entry = BackupEntry(name=os.path.basename(dest), kind='archive', created=int(time.time()),
+                        ct_id=srv.ct_id or "", path=dest, size=int(info[0]) * 1024, stored=int(info[1]),
+                        checksum=info[2], worlds=world_names(lines[1:]), mode='hot')
+    srv.backup_catalog().add(entry)
+    await prune_backups(srv)
+    await ctx.send(f"✅ **Backup Created!**\n📁 Path: `{dest}`\n📦 Size: `{format_bytes(entry.stored)}` ({entry.ratio:.1f}x)\n"
+                   f"🔑 SHA-256: `{entry.checksum[:16]}`\n\n*(Save this file if you plan to destroy the container)*")
+
 @bot.command()
 async def backup(ctx):
-    """Triggers a manual backup."""
+    """Triggers a manual hot backup (the server keeps running)."""
     if not await is_authorized(ctx): return
+    srv = await server_for(ctx)
+    if srv is None: return
     
-    await ctx.send("📦 **Starting Manual Backup...**")
+    await ctx.send(f"📦 {server_tag(srv)}**Starting Manual Backup...**")
     
     async with ctx.typing():
-        timestamp = await run_shell_async("date +%Y%m%d_%H%M%S")
+        timestamp = await srv.shell("date +%Y%m%d_%H%M%S")
         filename = f"world_backup_{timestamp}.tar.gz"
         dest = f"/tmp/{filename}"
-        
-        # Determine source path with a safe default
-        # Note: Standard path for this project is /home/terraria/.local/share/Terraria/Worlds
-        src = "/home/terraria/.local/share/Terraria/Worlds"
-        
-        # Verify source exists
-        check = await run_shell_async(f"ls -d {src}")
-        if "No such file" in check:
+        stage = f"{STAGE_DIR}-{timestamp}"
+        src = worlds_dir(await get_server_config(srv))
+
+        # 1. Save in-game and wait for the log to confirm it, instead of
+        # archiving files the server may be writing
+        state = await current_status(srv)
+        if state.snapshot.running:
+            res, lines = await console_command(srv, "save", until=is_save_completed, timeout=SAVE_TIMEOUT)
+            if res or not any(is_save_completed(line) for line in lines):
+                await ctx.send(f"❌ Backup aborted: world save not confirmed (`{res or 'timeout'}`).")
+                return
+
+        # 2. Copy (reflink when possible) and verify every .wld against the live file
+        res = await srv.shell(snapshot_script(src, stage))
+        if "World directory not found" in res:
              await ctx.send(f"⚠️ Source directory not found: `{src}`. Backup skipped.")
              return
-
-        res = await run_shell_async(f"tar -czf {dest} -C {src} .")
-        
-        if "Error" in res:
+        parts = res.split()
+        if len(parts) != 2 or not all(p.isdigit() for p in parts):
              await ctx.send(f"❌ Backup failed: {res}")
-        else:
-             file_size = await run_shell_async(f"du -h {dest} | cut -f1")
-             await ctx.send(f"✅ **Backup Created!**\n📁 Path: `{dest}`\n📦 Size: `{file_size}`\n\n*(Save this file if you plan to destroy the container)*")
+             return
+
+    # 3. Compress the verified copy while the server keeps running
+    await ctx.send(f"📸 **Snapshot verified** ({parts[0]} world file(s), {int(parts[1]) // 1024} MB). Compressing in background...")
+    srv.tasks['backup'] = asyncio.create_task(compress_backup(ctx, srv, stage, dest))
 
 @bot.command(name="help")
 async def help_command(ctx):
     """Shows this help message."""
     embed = discord.Embed(title="\U0001f916 Comandos Terraria Bot", description="Controle seu servidor diretamente pelo Discord.", color=discord.Color.blue())
     
-    embed.add_field(name="\U0001f3ae **Gerenciamento**", value="`!status` - Info do Servidor & Jogadores\n`!start` - Iniciar Servidor\n`!stop` - Parar Servidor\n`!restart` - Rein\u00edcio Instant\u00e2neo\n`!reboot [min]` - Rein\u00edcio Suave com Aviso", inline=False)
+    embed.add_field(name="\U0001f3ae **Gerenciamento**", value="`!status` - Info do Servidor & Jogadores\n`!dashboard [off]` - Painel Fixo ao Vivo\n`!start` - Iniciar Servidor\n`!stop` - Parar Servidor\n`!restart` - Rein\u00edcio Instant\u00e2neo\n`!reboot [min]` - Rein\u00edcio Suave com Aviso", inline=False)
     
-    embed.add_field(name="\U0001f6e0\ufe0f **Manuten\u00e7\u00e3o**", value="`!update <ver>` - Atualizar servidor\n`!backup` - Backup Manual do Mundo\n`!storage` - Ver Tamanho de Disco\n`!logs [linhas]` - Ver Logs do Servidor\n`!save` - For\u00e7ar Salvamento", inline=False)
+    embed.add_field(name="\U0001f6e0\ufe0f **Manuten\u00e7\u00e3o**", value="`!update <ver>` - Atualizar servidor\n`!backup` - Backup Manual do Mundo\n`!storage` - Ver Tamanho de Disco\n`!backups` - Listar Backups\n`!worlds` - Mundos e Progresso\n`!logs [linhas]` - Ver Logs do Servidor\n`!logsearch <padrão> [24h]` - Buscar nos Logs\n`!save` - For\u00e7ar Salvamento\n`!stats [24h]` - Hist\u00f3rico de M\u00e9tricas\n`!graph <ram|cpu|players> [7d]` - Gr\u00e1fico\n`!perf [on|off|profile]` - Lat\u00eancia do Bot", inline=False)
     
     embed.add_field(name="\U0001f46e **Modera\u00e7\u00e3o**", value="`!kick <nome> [motivo]` - Expulsar Jogador\n`!ban <nome> [motivo]` - Banir Jogador", inline=False)
 
+    embed.add_field(name="\U0001f3c6 **Jogadores**", value="`!playtime <nome>` - Tempo de Jogo\n`!top` - Ranking de Tempo de Jogo\n`!seen [nome]` - Visto por \u00daltimo", inline=False)
+
     embed.add_field(name="\U0001f4ac **Console**", value="`!say <msg>` - Enviar Mensagem no Chat\n`!cmd <comando>` - Comando RCON/Console", inline=False)
+
+    if len(SERVERS) > 1:
+        names = ", ".join(f"`{name}`" for name in SERVERS)
+        embed.add_field(name="\U0001f5c2\ufe0f **Servidores**", value=f"`!servers` - Lista e Status\n`!<servidor> <comando>` - Ex.: `!{next(iter(SERVERS))} status`\nNo canal do `!monitor` de um servidor, o nome pode ser omitido.\nServidores: {names}", inline=False)
     
     embed.set_thumbnail(url="https://terraria.org/assets/terraria-logo.png")
     embed.set_footer(text="Terraria Proxmox Manager")
     
     await ctx.send(embed=embed)
 
-@bot.command(aliases=['backups', 'usage'])
+@bot.command(aliases=['mundos'])
+async def worlds(ctx):
+    """Lists the world files with details read from their headers."""
+    if not await is_authorized(ctx): return
+    srv = await server_for(ctx)
+    if srv is None: return
+
+    config = await get_server_config(srv)
+    found = await srv.worlds.scan(worlds_dir(config), paths=[config.world] if config.world else ())
+    if not found:
+        await ctx.send(f"📭 Nenhum mundo encontrado em `{worlds_dir(config)}`.")
+        return
+
+    embed = discord.Embed(title=f"🌍 {server_tag(srv)}Mundos", color=discord.Color.green())
+    for path, world in sorted(found.items())[:25]:
+        active = " ⭐" if path == config.world else ""
+        if world is None:
+            embed.add_field(name=f"{os.path.basename(path)}{active}", value="⚠️ Cabeçalho ilegível", inline=False)
+            continue
+        lines = [describe_world(world), f"Seed: `{world.seed or '?'}` • Versão {world.release}"]
+        if world.created:
+            lines.append(f"Criado <t:{world.created}:D> • {world.revision} salvamentos")
+        if world.special:
+            lines.append("Seeds especiais: " + ", ".join(world.special))
+        lines.append(f"Chefes: {', '.join(world.bosses) if world.bosses else 'nenhum'}")
+        embed.add_field(name=f"{world.name} ({os.path.basename(path)}){active}", value="\n".join(lines)[:1024], inline=False)
+    embed.set_footer(text="⭐ = mundo ativo no serverconfig.txt")
+    await ctx.send(embed=embed)
+
+@bot.command(aliases=['usage'])
 async def storage(ctx):
     """Checks the size of Worlds and Backup files."""
     if not await is_authorized(ctx): return
+    srv = await server_for(ctx)
+    if srv is None: return
     
     async with ctx.typing():
         # World Folder Size
-        world_dir = "/home/terraria/.local/share/Terraria/Worlds"
-        world_size = await run_shell_async(f"du -sh {world_dir} 2>/dev/null | cut -f1")
+        world_dir = worlds_dir(await get_server_config(srv))
+        world_size = await srv.shell(f"du -sh {shlex.quote(world_dir)} 2>/dev/null | cut -f1")
         if not world_size or "No such file" in world_size: world_size = "0B"
         
-        # Manual Backups Size (/tmp/world_backup_*.tar.gz)
-        # We check /tmp inside container where !backup saves
-        backup_size = await run_shell_async("du -ch /tmp/world_backup_*.tar.gz 2>/dev/null | grep total | cut -f1")
-        if not backup_size: backup_size = "0B"
+        # Manual Backups: totals come from the catalog, no scan of /tmp
+        catalog = srv.backup_catalog()
+        backup_count, backup_data, backup_size = catalog.totals(kind='archive')
+        latest = catalog.latest(kind='archive')
         
-        # Count of backups
-        backup_count = await run_shell_async("ls -1 /tmp/world_backup_*.tar.gz 2>/dev/null | wc -l")
-        
-        embed = discord.Embed(title="💾 Storage Usage", color=discord.Color.teal())
+        embed = discord.Embed(title=f"💾 {server_tag(srv)}Storage Usage", color=discord.Color.teal())
         embed.add_field(name="🌍 Active World Data", value=f"`{world_size.strip()}`", inline=True)
-        embed.add_field(name="📦 Tmp Backups", value=f"`{backup_size.strip()}`\n({backup_count.strip()} files)", inline=True)
+        embed.add_field(name="📦 Tmp Backups", value=f"`{format_bytes(backup_size)}`\n({backup_count} files)", inline=True)
+        if latest is not None:
+            embed.add_field(name="🕒 Último Backup", value=f"<t:{latest.created}:R>", inline=True)
         
-        embed.set_footer(text="Note: !backup stores files in /tmp (ephemeral)")
+        embed.set_footer(text=f"Note: !backup stores files in /tmp (ephemeral), keeping the last {MANUAL_BACKUP_KEEP} • !backups lists them")
         
         await ctx.send(embed=embed)
 
+@bot.command(name="backups")
+async def backups_command(ctx, count: int = 10):
+    """Lists the most recent manual backups from the catalog."""
+    if not await is_authorized(ctx): return
+    srv = await server_for(ctx)
+    if srv is None: return
+
+    entries = srv.backup_catalog().list(kind='archive', limit=max(1, min(count, 25)))
+    if not entries:
+        await ctx.send("📭 Nenhum backup registrado. Use `!backup` para criar um.")
+        return
+
+    lines = []
+    for e in entries:
+        ratio = f" • {e.ratio:.1f}x" if e.ratio else ""
+        worlds = ", ".join(e.worlds) or "?"
+        lines.append(f"**{e.name}** • <t:{e.created}:f>\n"
+                     f"└ {format_bytes(e.stored)}{ratio} • 🌍 {worlds} • `{e.checksum[:12]}`")
+    embed = discord.Embed(title=f"📦 {server_tag(srv)}Backups", description="\n".join(lines)[:4000], color=discord.Color.teal())
+    count, _, stored = srv.backup_catalog().totals(kind='archive')
+    embed.set_footer(text=f"{count} backup(s) • {format_bytes(stored)} no total")
+    await ctx.send(embed=embed)
+
+
+async def backfill_player_sessions(srv):
+    """Seeds the session store from the existing log, once (see bot_sessions.py)."""
+    await bot.wait_until_ready()
+    store = srv.session_store()
+    if store.backfilled:
+        return
+    source = srv.log_source()
+    try:
+        current = await source.read(None, 0, 0)
+    except (ExecUnavailable, ConnectionError, asyncio.TimeoutError, OSError) as e:
+        print(f"[{srv.name}] Session backfill skipped: {e}")
+        return
+    end = current[1] if current else 0
+    # Stop where the log follower started, so no line is counted twice
+    try:
+        with open(srv.log_offset_file, 'r') as f:
+            checkpoint = json.load(f)
+        end = int(checkpoint['offset']) if current and int(checkpoint['ino']) == current[0] else 0
+    except (OSError, ValueError, KeyError):
+        pass
+    started = time.monotonic()
+    try:
+        joins = await backfill_sessions(store, source, end)
+    finally:
+        await source.close()
+    print(f"[{srv.name}] Session backfill: {joins} join(s) in {end // 1024} KiB of log, {time.monotonic() - started:.1f}s.")
+
+def format_duration(seconds):
+    minutes = int(seconds) // 60
+    if minutes < 60:
+        return f"{minutes} min"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 48:
+        return f"{hours}h {minutes:02d}min"
+    days, hours = divmod(hours, 24)
+    return f"{days}d {hours}h"
+
+@bot.command()
+async def playtime(ctx, *, name: str):
+    """Total playtime of a player."""
+    srv = await server_for(ctx)
+    if srv is None: return
+    info = srv.session_store().player(name)
+    if info is None:
+        await ctx.send(f"❓ Nenhum registro de **{name}**.")
+        return
+    status = "🟢 online agora" if info['online_since'] else (
+        f"visto por último <t:{int(info['last_seen'])}:R>" if info['last_seen'] else "visto antes do início do registro")
+    await ctx.send(f"⏱️ **{info['name']}**: {format_duration(info['seconds'])} de jogo em "
+                   f"{info['sessions']} sessão(ões) • {status}")
+
+@bot.command()
+async def top(ctx, count: int = 10):
+    """Players ranked by total playtime."""
+    srv = await server_for(ctx)
+    if srv is None: return
+    rows = srv.session_store().top(max(1, min(count, 25)))
+    if not rows:
+        await ctx.send("📭 Nenhuma sessão registrada ainda.")
+        return
+    medals = ["🥇", "🥈", "🥉"]
+    lines = [f"{medals[i] if i < 3 else f'`{i + 1}.`'} **{name}** • {format_duration(seconds)} ({sessions} sessões)"
+             for i, (name, seconds, sessions) in enumerate(rows)]
+    embed = discord.Embed(title=f"🏆 {server_tag(srv)}Mais Tempo de Jogo", description="\n".join(lines), color=discord.Color.gold())
+    histogram = [(level, reached) for level, _, reached in srv.session_store().concurrency() if level and reached]
+    if histogram:
+        embed.add_field(name="👥 Pico de Jogadores", value=f"{histogram[-1][0]} simultâneos "
+                        f"(atingido {histogram[-1][1]}x)", inline=False)
+    await ctx.send(embed=embed)
+
+@bot.command()
+async def seen(ctx, *, name: str = None):
+    """When a player was last online (or the most recent players)."""
+    srv = await server_for(ctx)
+    if srv is None: return
+    if name is None:
+        rows = srv.session_store().recent(10)
+        if not rows:
+            await ctx.send("📭 Nenhuma sessão registrada ainda.")
+            return
+        lines = [f"🟢 **{n}** • online agora" if online else f"⚪ **{n}** • <t:{int(at)}:R>" for n, at, online in rows]
+        await ctx.send(embed=discord.Embed(title=f"👀 {server_tag(srv)}Vistos Recentemente", description="\n".join(lines), color=discord.Color.blue()))
+        return
+    info = srv.session_store().player(name)
+    if info is None:
+        await ctx.send(f"❓ **{name}** nunca foi visto no servidor.")
+    elif info['online_since']:
+        await ctx.send(f"🟢 **{info['name']}** está online desde <t:{int(info['online_since'])}:t>.")
+    elif info['last_seen']:
+        await ctx.send(f"👀 **{info['name']}** foi visto por último <t:{int(info['last_seen'])}:R> (<t:{int(info['last_seen'])}:f>).")
+    else:
+        await ctx.send(f"👀 **{info['name']}** só aparece no log anterior ao registro de sessões.")
 
 @bot.command()
 async def reboot(ctx, minutes: int = 5):
     """Restarts the server gracefully with a countdown."""
     if not await is_authorized(ctx): return
+    srv = await server_for(ctx)
+    if srv is None: return
     
     if minutes < 1: minutes = 1
     
@@ -720,20 +1519,124 @@ async def reboot(ctx, minutes: int = 5):
         if i == 1:
              msg = "say [Server] Reiniciando em 60 segundos! AVISO FINAL!"
              
-        await run_shell_async(build_tmux_command(msg))
+        await srv.send_console(msg)
         
         # Wait 60s (unless it's the last minute, handle differently if we wanted seconds logic)
         if i > 0:
              await asyncio.sleep(60)
 
     # Final Save
-    await run_shell_async(build_tmux_command("say [Server] Salvando mundo..."))
-    await run_shell_async(build_tmux_command("save"))
-    await asyncio.sleep(2)
+    await srv.send_console("say [Server] Salvando mundo...")
+    # Restart only once the save has actually completed
+    await console_command(srv, "save", until=is_save_completed, timeout=60.0)
     
     await ctx.send("🔄 **Reiniciando agora...**")
-    await run_shell_async(f"{SERVICE_CMD} restart terraria")
-    await wait_and_verify(ctx, "Restart", verify_running=True)
+    await srv.shell(f"{SERVICE_CMD} restart terraria")
+    await wait_and_verify(ctx, srv, "Restart", verify_running=True)
+
+def format_latency(seconds):
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    return f"{seconds * 1000:.0f}ms" if seconds >= 0.01 else f"{seconds * 1000:.1f}ms"
+
+@bot.command()
+async def perf(ctx, action: str = None, seconds: float = 10):
+    """Latency percentiles and slow operations; `!perf profile [s]` samples the event loop."""
+    if not await is_authorized(ctx): return
+    action = (action or "").lower()
+
+    if action in ('on', 'off'):
+        PERF.enabled = action == 'on'
+        if PERF.enabled:
+            LOOP_MONITOR.start()
+            await ctx.send(f"⏱️ Instrumentação **ativada** (lento ≥ {PERF_SLOW_MS}ms, travamento do loop ≥ {PERF_STALL_MS}ms).")
+        else:
+            await LOOP_MONITOR.stop()
+            await ctx.send("⏱️ Instrumentação **desativada**. As estatísticas coletadas continuam em `!perf`.")
+        return
+    if action == 'reset':
+        PERF.reset()
+        await ctx.send("🧹 Estatísticas de desempenho zeradas.")
+        return
+    if action == 'profile':
+        seconds = min(max(seconds, 1), PROFILE_MAX_SECONDS)
+        await ctx.send(f"🔬 Amostrando o loop do bot por {seconds:g}s...")
+        try:
+            stacks = await profile(seconds)
+        except RuntimeError as e:
+            await ctx.send(f"⚠️ {e}")
+            return
+        total = sum(stacks.values()) or 1
+        lines = []
+        for name, samples in top_functions(stacks, 12):
+            idle = " *(ocioso)*" if name.startswith("selectors.py:") else ""
+            lines.append(f"`{samples / total:6.1%}` `{name}`{idle}")
+        report = io.BytesIO(collapsed(stacks).encode())
+        await ctx.send(f"🔬 **Profile** ({sum(stacks.values())} amostras, tempo próprio por função)\n" + "\n".join(lines),
+                       file=discord.File(report, filename="profile.folded"))
+        return
+    if action:
+        await ctx.send("❓ Uso: `!perf`, `!perf on|off|reset` ou `!perf profile [segundos]`")
+        return
+
+    if not PERF.ops and not PERF.slow:
+        hint = "" if PERF.enabled else " Use `!perf on` (ou `BOT_PERF=1`) para começar a medir."
+        await ctx.send(f"⏱️ Nenhuma medição ainda.{hint}")
+        return
+
+    state = "ativa" if PERF.enabled else "pausada"
+    embed = discord.Embed(
+        title="⏱️ Desempenho do Bot",
+        description=f"Desde <t:{int(PERF.since)}:R> • Instrumentação {state}\n"
+                    f"Travamentos do loop (≥ {PERF_STALL_MS}ms): **{PERF.stalls}**",
+        color=discord.Color.blue(),
+    )
+    by_kind = {}
+    for kind, name, stats in PERF.summary():
+        by_kind.setdefault(kind, []).append((name, stats))
+    for kind, rows in by_kind.items():
+        lines = []
+        for name, stats in rows[:8]:
+            p50, p95, p99 = stats.percentiles(50, 95, 99)
+            lines.append(f"`{name}` ×{stats.count}: {format_latency(p50)} / {format_latency(p95)} / "
+                         f"{format_latency(p99)} • máx {format_latency(stats.max)}")
+        embed.add_field(name=f"{kind} (p50 / p95 / p99)", value="\n".join(lines)[:1024], inline=False)
+
+    slow = PERF.top_slow(8)
+    if slow:
+        lines = []
+        for op in slow:
+            detail = f" — {op.detail[:80]}" if op.detail else ""
+            lines.append(f"`{format_latency(op.seconds)}` {op.kind}/{op.name} <t:{int(op.at)}:R>{detail}")
+        embed.add_field(name="🐢 Operações mais lentas", value="\n".join(lines)[:1024], inline=False)
+    embed.set_footer(text=f"Percentis das últimas {PERF.window} amostras por operação • !perf profile [s]")
+    await ctx.send(embed=embed)
+
+@bot.command(aliases=['servidores'])
+async def servers(ctx):
+    """Lists the managed servers from their cached status (never waits on a container)."""
+    embed = discord.Embed(title="🗂️ Servidores", color=discord.Color.blue())
+    for srv in SERVERS.values():
+        state = srv.status
+        if state.snapshot is None:
+            line = "⏳ Aguardando o primeiro status"
+        elif state.snapshot.running:
+            line = f"🟢 Online • 👥 {state.snapshot.players} • 🌍 {state.server_info['world']}"
+        else:
+            line = f"🔴 Offline • 🌍 {state.server_info['world']}"
+        if state.updated_at and time.monotonic() - state.updated_at > 3 * STATUS_REFRESH_SECONDS:
+            line += f" • ⚠️ sem resposta há {int(time.monotonic() - state.updated_at)}s"
+        if srv.log_channel_id:
+            line += f"\n└ Canal <#{srv.log_channel_id}>"
+        ct = f" (CT {srv.ct_id})" if srv.ct_id else ""
+        embed.add_field(name=f"{srv.name}{ct}", value=line, inline=False)
+    if len(SERVERS) > 1:
+        embed.set_footer(text=f"Use {COMMAND_PREFIX}<servidor> <comando>, ex.: {COMMAND_PREFIX}{next(iter(SERVERS))} status")
+    await ctx.send(embed=embed)
+
+# Registry last: server names are checked against the command names above
+SERVERS.update((srv.name, srv) for srv in load_servers())
+EXPORTER = MetricsExporter(SERVERS.values, host=METRICS_HOST, port=METRICS_PORT)
 
 if __name__ == "__main__":
     if not TOKEN:
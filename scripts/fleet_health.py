@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""Terraria fleet health monitor (run on the Proxmox host).
+
+Checks many containers concurrently. Each container costs one `pct exec`:
+the exec-channel agent returns every metric (/proc files, server process,
+disk usage, serverconfig.txt) as one JSON reply; containers without python3
+get the equivalent single shell probe. Alert anti-spam state for the whole
+fleet lives in one JSON state file instead of /tmp lock files.
+
+Usage:
+  ./fleet_health.py --alert [--threshold 90] CT_ID [CT_ID ...]
+  ./fleet_health.py --report --all
+  ./fleet_health.py --json --all
+"""
+import argparse
+import asyncio
+import contextlib
+import fcntl
+import json
+import os
+import sys
+import time
+
+from bot_config import parse_config
+from bot_exec import ExecChannel, ExecUnavailable
+from bot_metrics import (PROC_FILES, SERVER_PATTERN, DISK_PATH, build_snapshot,
+                         shell_probe_script, parse_shell_probe)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+CONFIG_FILE = "/opt/terraria/serverconfig.txt"
+DEFAULT_STATE_FILE = os.path.join(PROJECT_DIR, "state", "fleet_health.json")
+ALERT_COOLDOWN = 3600 # Seconds between repeated alerts of the same kind
+DISK_THRESHOLD = 90
+
+
+async def run(*argv, timeout=None):
+    proc = await asyncio.create_subprocess_exec(
+        *argv, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    try:
+        out, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    return proc.returncode, out.decode(errors='replace')
+
+
+async def container_states():
+    """{ct_id: status} for every container, from a single `pct list`."""
+    rc, out = await run('pct', 'list', timeout=30)
+    states = {}
+    for line in out.splitlines()[1:] if rc == 0 else []:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].isdigit():
+            states[parts[0]] = parts[1]
+    return states
+
+
+def human_mb(mb):
+    for unit, size in (("T", 1024 * 1024), ("G", 1024)):
+        if mb >= size:
+            return f"{mb / size:.1f}{unit}"
+    return f"{mb}M"
+
+
+async def probe_container(ct_id, timeout):
+    """Returns the container's metrics as a dict (one exec round trip)."""
+    paths = PROC_FILES + (CONFIG_FILE,)
+    channel = ExecChannel(ct_id, spawn_timeout=timeout)
+    try:
+        try:
+            files, pids = await channel.probe(paths, SERVER_PATTERN, procstat=True,
+                                              statvfs=(DISK_PATH,), timeout=timeout)
+        except ExecUnavailable:
+            # No python3 in the container: same probe as one shell command
+            rc, out = await run('pct', 'exec', ct_id, '--', 'bash', '-c',
+                                shell_probe_script(paths, SERVER_PATTERN), timeout=timeout)
+            if rc != 0:
+                raise RuntimeError(f"pct exec failed with exit code {rc}")
+            files, pids = parse_shell_probe(out, paths)
+    finally:
+        await channel.close()
+
+    config = parse_config(files.get(CONFIG_FILE))
+    snapshot = build_snapshot(files, pids, config.port)
+    return {
+        'ct_id': ct_id,
+        'status': 'running',
+        'world': config.world_name,
+        'port': config.port,
+        'configured': files.get(CONFIG_FILE) is not None,
+        'server_running': snapshot.running,
+        'players': snapshot.players,
+        'mem_used_mb': snapshot.mem_used_mb,
+        'mem_total_mb': snapshot.mem_total_mb,
+        'mem_percent': snapshot.mem_percent,
+        'load_avg': list(snapshot.load_avg),
+        'disk_used_mb': snapshot.disk_used_mb,
+        'disk_total_mb': snapshot.disk_total_mb,
+        'disk_percent': snapshot.disk_percent,
+        'uptime': snapshot.uptime_text,
+        'server_rss_mb': snapshot.server_rss_mb,
+    }
+
+
+async def check(ct_id, states, sem, timeout):
+    async with sem:
+        status = states.get(ct_id, 'unknown')
+        if status != 'running':
+            return {'ct_id': ct_id, 'status': status}
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(probe_container(ct_id, timeout), timeout)
+        except Exception as e:
+            reason = "timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+            return {'ct_id': ct_id, 'status': 'error', 'error': reason}
+        result['elapsed_ms'] = round((time.monotonic() - started) * 1000)
+        return result
+
+
+async def sweep(ct_ids, workers, timeout, all_running=False):
+    states = await container_states()
+    if all_running:
+        ct_ids = sorted((ct for ct, st in states.items() if st == 'running'), key=int)
+    sem = asyncio.Semaphore(workers)
+    results = await asyncio.gather(*(check(ct, states, sem, timeout) for ct in ct_ids))
+    if all_running:
+        # Only containers that actually host a Terraria server
+        results = [r for r in results if r.get('configured', True)]
+    return results
+
+
+@contextlib.contextmanager
+def locked_state(path):
+    """Loads the fleet state under an exclusive lock and saves it atomically."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        yield state
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(state, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+
+
+def webhook_args(result, mode, threshold, state, now):
+    """Returns the discord_webhook.sh argument lists to send for one container."""
+    ct_id = result['ct_id']
+    messages = []
+    if mode == 'report':
+        if result['status'] != 'running':
+            messages.append(["--title", "Server Status", "--desc", f"Container {ct_id} is offline.",
+                             "--status", "error"])
+        elif 'error' not in result:
+            disk_free = human_mb(result['disk_total_mb'] - result['disk_used_mb'])
+            messages.append([
+                "--title", "📊 Server Status Report", "--status", "info",
+                "--desc", f"Current performance metrics for Terraria CT {ct_id}",
+                "--field", f"Players Online:{result['players']}",
+                "--field", f"Uptime:{result['uptime']}",
+                "--field", f"RAM Usage:{result['mem_percent']}% ({result['mem_used_mb']}MB)",
+                "--field", f"CPU Load:{result['load_avg'][0]}",
+                "--field", f"Disk Usage:{result['disk_percent']}% (Free: {disk_free})",
+            ])
+        return messages
+
+    if result['status'] != 'running' or 'error' in result:
+        return messages
+    ct_state = state.setdefault(str(ct_id), {})
+
+    if result['mem_percent'] >= threshold:
+        if now - ct_state.get('ram_alert_at', 0) > ALERT_COOLDOWN:
+            ct_state['ram_alert_at'] = now
+            messages.append([
+                "--title", "⚠️ High Resource Usage", "--status", "warn",
+                "--desc", "Terraria Server is under heavy load.",
+                "--field", f"RAM:{result['mem_percent']}% ({result['mem_used_mb']}MB)",
+                "--field", f"CPU Load:{result['load_avg'][0]}",
+                "--field", f"Players:{result['players']}",
+            ])
+    else:
+        ct_state.pop('ram_alert_at', None)
+
+    if result['disk_percent'] >= DISK_THRESHOLD:
+        if now - ct_state.get('disk_alert_at', 0) > ALERT_COOLDOWN:
+            ct_state['disk_alert_at'] = now
+            messages.append([
+                "--title", "💾 Low Disk Space", "--status", "error",
+                "--desc", "Container disk is almost full!",
+                "--field", f"Usage:{result['disk_percent']}%",
+                "--field", f"Free:{human_mb(result['disk_total_mb'] - result['disk_used_mb'])}",
+            ])
+    else:
+        ct_state.pop('disk_alert_at', None)
+
+    if not ct_state:
+        state.pop(str(ct_id), None)
+    return messages
+
+
+async def send_all(messages, concurrency=4):
+    webhook = os.path.join(SCRIPT_DIR, "notify.sh") # Queued on the resident notifier
+    if not os.access(webhook, os.X_OK):
+        return
+    sem = asyncio.Semaphore(concurrency)
+
+    async def send(args):
+        async with sem:
+            try:
+                await run(webhook, *args, timeout=30)
+            except Exception as e:
+                print(f"Webhook failed: {e}", file=sys.stderr)
+
+    await asyncio.gather(*(send(args) for args in messages))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrent health check for Terraria containers.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--alert', dest='mode', action='store_const', const='alert', help="alert only on problems (default)")
+    mode.add_argument('--report', dest='mode', action='store_const', const='report', help="send a full status report")
+    mode.add_argument('--json', dest='mode', action='store_const', const='json', help="print metrics as JSON, no notifications")
+    parser.add_argument('--threshold', type=int, default=90, help="RAM alert threshold in percent (default: 90)")
+    parser.add_argument('--workers', type=int, default=16, help="containers checked in parallel (default: 16)")
+    parser.add_argument('--timeout', type=float, default=10, help="per-container timeout in seconds (default: 10)")
+    parser.add_argument('--state', default=os.getenv('FLEET_STATE_FILE', DEFAULT_STATE_FILE), help="alert state file")
+    parser.add_argument('--all', action='store_true', help="check every running container with a serverconfig.txt")
+    parser.add_argument('ct_ids', nargs='*', metavar='CT_ID')
+    args = parser.parse_args()
+    args.mode = args.mode or 'alert'
+    if not args.ct_ids and not args.all:
+        parser.error("give at least one CT_ID or --all")
+
+    # Progress messages (exec channel) stay off stdout so --json output is clean
+    with contextlib.redirect_stdout(sys.stderr):
+        results = await sweep(args.ct_ids, max(1, args.workers), args.timeout, all_running=args.all)
+
+    if args.mode == 'json':
+        json.dump(results, sys.stdout, indent=1)
+        print()
+        return
+
+    now = int(time.time())
+    messages = []
+    if args.mode == 'alert':
+        with locked_state(args.state) as state:
+            for result in results:
+                messages += webhook_args(result, 'alert', args.threshold, state, now)
+    else:
+        for result in results:
+            messages += webhook_args(result, 'report', args.threshold, None, now)
+
+    for result in results:
+        if 'error' in result:
+            print(f"CT {result['ct_id']}: {result['error']}", file=sys.stderr)
+    await send_all(messages)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,10 @@
+#!/bin/bash
+# Thin client for the resident webhook notifier (bot_notify.py): same arguments
+# as discord_webhook.sh. The event is queued on the daemon's Unix socket (one is
+# started if needed); if that fails, discord_webhook.sh sends it directly.
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
+if command -v python3 >/dev/null 2>&1 && python3 "$SCRIPT_DIR/bot_notify.py" send "$@" 2>/dev/null; then
+  exit 0
+fi
+exec "$SCRIPT_DIR/discord_webhook.sh" "$@"
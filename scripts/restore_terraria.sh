@@ -2,9 +2,27 @@
 set -euo pipefail
 
 # Enhanced Restore Script for Terraria Proxmox LXC
+# Accepts a snapshot from the backup repository (backups/snapshots/*.json.gz,
+# or just its name), `latest`, a date/time such as 2026-04-01T12:00 (newest
+# snapshot at or before it, looked up in the catalog), or a legacy .tar.gz archive.
+#
+# --world NAME (repeatable) restores just that world from a snapshot: only its
+# chunks are read, and the rest of the container is left untouched.
+# Ownership comes from the backup itself (tar applies it while extracting).
 
-CT_ID=${1:?Usage: $0 CT_ID backup-file.tar.gz}
-BACKUP_FILE=${2:?Usage: $0 CT_ID backup-file.tar.gz}
+USAGE="Usage: $0 CT_ID <snapshot | latest | date | backup-file.tar.gz> [repo_dir] [--world NAME ...]"
+CT_ID=${1:?$USAGE}
+BACKUP_FILE=${2:?$USAGE}
+shift 2
+REPO_DIR=./backups
+ONLY=()
+while [ $# -gt 0 ]; do
+  case "$1" in
+    --world) ONLY+=(--only "${2:?--world needs a name}"); shift 2 ;;
+    *) REPO_DIR="$1"; shift ;;
+  esac
+done
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
 # Helper for notifications
 notify_restore() {
@@ -12,10 +30,8 @@ notify_restore() {
   local title="$2"
   local msg="$3"
   
-  local script_dir
-  script_dir="$(dirname "$0")"
-  if [ -x "$script_dir/discord_webhook.sh" ]; then
-    "$script_dir/discord_webhook.sh" \
+  if [ -x "$SCRIPT_DIR/notify.sh" ]; then
+    "$SCRIPT_DIR/notify.sh" \
       --title "$title" \
       --desc "$msg" \
       --status "$status" \
@@ -31,11 +47,39 @@ if ! command -v pct >/dev/null 2>&1; then
   exit 1
 fi
 
+SNAPSHOT=""
+case "$BACKUP_FILE" in
+  *.tar.gz|*.tgz) ;;
+  latest|[0-9][0-9][0-9][0-9]-*)
+    FIND_ARGS=(--ct "$CT_ID")
+    if [ "$BACKUP_FILE" != "latest" ]; then
+      FIND_ARGS+=(--before "$BACKUP_FILE")
+    fi
+    SNAPSHOT=$(python3 "$SCRIPT_DIR/backup_repo.py" find "$REPO_DIR" "${FIND_ARGS[@]}")
+    BACKUP_FILE="$REPO_DIR/snapshots/$SNAPSHOT.json.gz"
+    ;;
+  *.json.gz)
+    # Path to a manifest: the repository is two levels up (REPO/snapshots/NAME.json.gz)
+    REPO_DIR="$(dirname "$(dirname "$BACKUP_FILE")")"
+    SNAPSHOT="$(basename "$BACKUP_FILE" .json.gz)"
+    BACKUP_FILE="$REPO_DIR/snapshots/$SNAPSHOT.json.gz"
+    ;;
+  *)
+    SNAPSHOT="$BACKUP_FILE"
+    BACKUP_FILE="$REPO_DIR/snapshots/$SNAPSHOT.json.gz"
+    ;;
+esac
+
 if [ ! -f "$BACKUP_FILE" ]; then
   echo "Backup file not found: $BACKUP_FILE" >&2
   exit 1
 fi
 
+if [ ${#ONLY[@]} -gt 0 ] && [ -z "$SNAPSHOT" ]; then
+  echo "--world needs a snapshot from the backup repository (a .tar.gz can only be restored whole)" >&2
+  exit 1
+fi
+
 echo "--- Restoring Backup to Container $CT_ID ---"
 echo "Backup File: $BACKUP_FILE"
 
@@ -44,17 +88,18 @@ echo "Stopping service..."
 pct exec "$CT_ID" -- bash -c "systemctl stop terraria || supervisorctl stop terraria || rc-service terraria stop || true"
 
 # 2. Extract Archive
-# The backup now contains absolute paths /opt/terraria and /home/terraria.
-# We extract them to root /.
+# The backup contains absolute paths /opt/terraria and /home/terraria.
+# We extract them to root /. tar runs as root in the container, so it restores
+# each file's recorded owner as it writes it (no recursive chown afterwards).
+# Snapshots stream straight from the repository and are verified in place.
 echo "Extracting files..."
-cat "$BACKUP_FILE" | pct exec "$CT_ID" -- tar -xzf - -C /
-
-# 3. Fix Permissions
-# Ensure user terraria owns everything restored
-echo "Fixing permissions..."
-pct exec "$CT_ID" -- chown -R terraria:terraria /opt/terraria /home/terraria
+if [ -n "$SNAPSHOT" ]; then
+  python3 "$SCRIPT_DIR/backup_repo.py" restore "$REPO_DIR" "$SNAPSHOT" "$CT_ID" "${ONLY[@]}"
+else
+  pct exec "$CT_ID" -- tar -xzf - -C / < "$BACKUP_FILE"
+fi
 
-# 4. Start Service
+# 3. Start Service
 echo "Starting service..."
 pct exec "$CT_ID" -- bash -c "systemctl start terraria || supervisorctl start terraria || rc-service terraria start || true"
 
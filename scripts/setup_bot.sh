@@ -11,6 +11,7 @@ ARG_USER_ID=${3:-""}
 PROJECT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 BOT_SCRIPT="$PROJECT_DIR/scripts/discord_bot.py"
 VENV_DIR="$PROJECT_DIR/.venv"
+STATE_DIR="$PROJECT_DIR/state/$CT_ID"
 
 echo "--- Setting up Discord Bot for CT $CT_ID ---"
 
@@ -54,6 +55,9 @@ else
     read -rp "Enter YOUR User ID: " USER_ID
 fi
 
+# Bot state (monitor channel, log offset, ...) lives on the host
+mkdir -p "$STATE_DIR"
+
 # 5. Create Systemd Service
 SERVICE_FILE="/etc/systemd/system/terraria-bot.service"
 echo "Creating systemd service at $SERVICE_FILE..."
@@ -70,6 +74,8 @@ WorkingDirectory=$PROJECT_DIR
 Environment="DISCORD_BOT_TOKEN=$BOT_TOKEN"
 Environment="DISCORD_USER_ID=$USER_ID"
 Environment="CT_ID=$CT_ID"
+Environment="BOT_STATE_DIR=$STATE_DIR"
+Environment="BOT_SERVERS_FILE=$PROJECT_DIR/state/servers.json"
 Environment="PYTHONIOENCODING=utf-8"
 Environment="LANG=C.UTF-8"
 Environment="LC_ALL=C.UTF-8"
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Incremental log shipping from a Terraria container (run on the Proxmox host).
+
+Only what was written since the last run is shipped. Per-source cursors
+(inode + offset for files, journalctl's cursor for the journal) are kept on
+the host, and a single `pct exec` runs the container half of the shipper
+(bot_logstore.py ship, fed to the container's python3 on stdin, so nothing
+has to be installed there). That half streams the new bytes straight out:
+no staging copy, no re-reading of old data. A file rotated between runs
+(server_output.log segments, logrotate) is drained first.
+
+Each source gets one archive in DEST/terraria-<CT>/, and every run appends
+one gzip member to it (`zcat` reads them as a single log). Cursors and
+archive sizes are committed together after each pass; an interrupted run
+leaves a partial member that the next run truncates away, so every byte is
+shipped exactly once.
+
+Usage:
+  ./ship_logs.py CT_ID [DEST] [--follow [SECONDS]]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import zlib
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGSTORE = os.path.join(SCRIPT_DIR, "bot_logstore.py")
+STATE_FILE = "cursors.json"
+
+
+def archive_name(source):
+    """journal:terraria -> journal-terraria.log.gz, /opt/terraria/x.log -> opt_terraria_x.log.gz"""
+    if source.startswith("journal:"):
+        return f"journal-{source[8:]}.log.gz"
+    return source.strip("/").replace("/", "_") + ".gz"
+
+
+class LogArchive:
+    """Per-source gzip archives plus the cursor state that goes with them."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.state_path = os.path.join(directory, STATE_FILE)
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        self.cursors = state.get('cursors', {})
+        self.sizes = state.get('sizes', {})
+        self.members = {} # archive name -> (file, compressor) for the pass in progress
+        self.pending = {}
+        self.shipped = 0
+        self._repair()
+
+    def _repair(self):
+        # Drop whatever an interrupted run appended after the last commit
+        for name in os.listdir(self.directory):
+            if name.endswith(".gz"):
+                path = os.path.join(self.directory, name)
+                committed = self.sizes.get(name, 0)
+                if os.path.getsize(path) > committed:
+                    with open(path, 'r+b') as f:
+                        f.truncate(committed)
+
+    def write(self, source, data):
+        name = archive_name(source)
+        if name not in self.members:
+            self.members[name] = (open(os.path.join(self.directory, name), 'ab'),
+                                  zlib.compressobj(6, zlib.DEFLATED, 31)) # 31: gzip framing
+        f, compressor = self.members[name]
+        f.write(compressor.compress(data))
+        self.shipped += len(data)
+
+    def cursor(self, source, state):
+        self.pending[source] = state
+
+    def commit(self):
+        """Ends this pass's gzip members and records the cursors that match them."""
+        for name, (f, compressor) in self.members.items():
+            f.write(compressor.flush())
+            f.flush()
+            os.fsync(f.fileno())
+            self.sizes[name] = f.tell()
+            f.close()
+        self.members = {}
+        self.cursors.update(self.pending)
+        self.pending = {}
+        tmp = self.state_path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'cursors': self.cursors, 'sizes': self.sizes}, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_path)
+
+
+def read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise EOFError("shipper output ended mid-frame")
+    return data
+
+
+def ship(ct_id, dest, follow=None, files=None, unit=None):
+    archive = LogArchive(os.path.join(dest, f"terraria-{ct_id}"))
+    argv = ["pct", "exec", str(ct_id), "--", "python3", "-", "ship", "--cursors", json.dumps(archive.cursors)]
+    if follow:
+        argv += ["--follow", str(follow)]
+    if files:
+        argv += ["--files", *files]
+    if unit is not None:
+        argv += ["--unit", unit]
+    with open(LOGSTORE, 'rb') as code:
+        proc = subprocess.Popen(argv, stdin=code, stdout=subprocess.PIPE)
+    try:
+        while True:
+            line = proc.stdout.readline()
+            if not line:
+                break
+            header = json.loads(line)
+            if 'source' in header:
+                archive.write(header['source'], read_exact(proc.stdout, header['len']))
+            elif 'cursor' in header:
+                archive.cursor(header['cursor'], header['state'])
+            elif 'pass' in header:
+                archive.commit()
+                if archive.shipped:
+                    print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} shipped {archive.shipped} bytes "
+                          f"to {archive.directory}", flush=True)
+                archive.shipped = 0
+    except KeyboardInterrupt:
+        proc.terminate()
+    finally:
+        proc.stdout.close()
+    return proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ship new Terraria container logs to the host.")
+    parser.add_argument('ct_id', metavar='CT_ID')
+    parser.add_argument('dest', nargs='?', default='./logs')
+    parser.add_argument('--follow', nargs='?', type=float, const=10, metavar='SECONDS',
+                        help="keep shipping every SECONDS (default: 10)")
+    parser.add_argument('--files', nargs='+', metavar='GLOB', help="log files to ship (container paths)")
+    parser.add_argument('--unit', help="systemd unit whose journal is shipped ('' for none)")
+    args = parser.parse_args()
+    rc = ship(args.ct_id, args.dest, args.follow, args.files, args.unit)
+    if rc not in (0, -2, -15): # Stopped by Ctrl-C / SIGTERM in --follow mode
+        sys.exit(f"Log shipper in CT {args.ct_id} exited with code {rc}")
+
+
+if __name__ == '__main__':
+    main()
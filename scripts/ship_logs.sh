@@ -1,29 +1,20 @@
 #!/bin/bash
 set -euo pipefail
 
-CT_ID=${1:?Usage: $0 CT_ID [dest_dir]}
-DEST_DIR=${2:-./logs}
-
-mkdir -p "$DEST_DIR"
-TS=$(date +%Y%m%dT%H%M%S)
-OUT="$DEST_DIR/terraria-logs-${CT_ID}-${TS}.tar.gz"
-
-echo "Collecting logs from CT $CT_ID..."
-
-# Create a temporary directory inside the container
-pct exec "$CT_ID" -- mkdir -p /tmp/terrlogs
-
-# 1. Collect File Logs (Supervisor or internal)
-pct exec "$CT_ID" -- sh -c 'cp -a /var/log/terraria* /tmp/terrlogs 2>/dev/null || true'
-pct exec "$CT_ID" -- sh -c 'cp -a /opt/terraria/*.log /tmp/terrlogs 2>/dev/null || true'
-
-# 2. Collect Systemd Journal
-pct exec "$CT_ID" -- sh -c 'journalctl -u terraria --no-pager > /tmp/terrlogs/systemd-terraria.log 2>/dev/null || true'
-
-# 3. Compress and Stream out
-pct exec "$CT_ID" -- tar -C /tmp -czf - terrlogs > "$OUT"
-
-# 4. Cleanup
-pct exec "$CT_ID" -- rm -rf /tmp/terrlogs
-
-echo "Logs archived: $OUT"
\ No newline at end of file
+# Incremental log shipping: only what the container's logs (and the terraria
+# journal) gained since the last run is streamed out, straight into per-log
+# gzip archives in DEST/terraria-<CT_ID>/. Cursors live next to the archives.
+# --follow keeps one shipper running and ships every SECONDS (default: 10).
+
+CT_ID=${1:?Usage: $0 CT_ID [dest_dir] [--follow [SECONDS]]}
+shift
+DEST_DIR=./logs
+if [ $# -gt 0 ] && [ "${1#--}" = "$1" ]; then
+  DEST_DIR="$1"
+  shift
+fi
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
+echo "Shipping new logs from CT $CT_ID..."
+python3 "$SCRIPT_DIR/ship_logs.py" "$CT_ID" "$DEST_DIR" "$@"
+echo "Logs archived under: $DEST_DIR/terraria-$CT_ID"
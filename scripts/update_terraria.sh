@@ -15,8 +15,8 @@ notify_update() {
   
   local script_dir
   script_dir="$(dirname "$0")"
-  if [ -x "$script_dir/discord_webhook.sh" ]; then
-    "$script_dir/discord_webhook.sh" \
+  if [ -x "$script_dir/notify.sh" ]; then
+    "$script_dir/notify.sh" \
       --title "$title" \
       --desc "$msg" \
       --status "$status" \